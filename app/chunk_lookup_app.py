@@ -6,9 +6,16 @@ Given a text excerpt, finds the chunk_id and retrieves the corresponding
 aligned text from the validation results.
 """
 
-import json
+import sys
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Sequence
+
+# Make the bertalign package importable when run from this directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bertalign.beads import chunk_ids, iter_alignments
+from bertalign.jsonl import load_table
+from bertalign.store import open_store
 
 
 class ChunkLookupApp:
@@ -18,22 +25,19 @@ class ChunkLookupApp:
 
         Args:
             chunks_file: Path to melancolia_della_resistenza.jsonl
-            alignments_file: Path to alignment_results.validated.jsonl
+            alignments_file: Path to alignment_results.validated.jsonl, or to
+                an alignment store built from it (see bertalign.store)
         """
         self.chunks_file = Path(chunks_file)
         self.alignments_file = Path(alignments_file)
+        self.store = open_store(self.alignments_file)
 
         # Load chunks into memory (assumes file is not too large)
         self.chunks = self._load_chunks()
 
-    def _load_chunks(self) -> List[Dict[str, Any]]:
-        """Load all chunks from the JSONL file."""
-        chunks = []
-        with open(self.chunks_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    chunks.append(json.loads(line))
-        return chunks
+    def _load_chunks(self) -> Sequence[Dict[str, Any]]:
+        """Load all chunks from the JSONL file (or its columnar cache), decoded on access."""
+        return load_table(self.chunks_file).rows()
 
     def find_chunk_by_text(self, text_excerpt: str) -> Optional[Dict[str, Any]]:
         """
@@ -48,11 +52,7 @@ class ChunkLookupApp:
         # Normalize for comparison
         excerpt_normalized = text_excerpt.strip().lower()
 
-        for chunk in self.chunks:
-            if excerpt_normalized in chunk['text'].lower():
-                return chunk
-
-        return None
+        return self.chunks.find('text', excerpt_normalized)
 
     def find_alignment_by_chunk_id(
         self,
@@ -71,37 +71,32 @@ class ChunkLookupApp:
             the first alignment with chunk_id < provided chunk_id with
             validation_success=true
         """
-        field_to_search = 'src_chunks' if language == 'en' else 'tgt_chunks'
+        if self.store is not None:
+            return self._find_in_store(chunk_id, 'src' if language == 'en' else 'tgt')
+
+        side = 'src' if language == 'en' else 'tgt'
 
         # First pass: look for exact chunk_id with validation_success
         exact_match = None
         fallback_candidates = []
 
-        with open(self.alignments_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if not line.strip():
-                    continue
-
-                alignment = json.loads(line)
-
-                # Check if validation_success is true
-                validation_success = alignment.get('validation', {}).get('validation_success', False)
-
-                # Search in the appropriate chunks field
-                chunks = alignment.get(field_to_search, [])
-
-                for chunk in chunks:
-                    if chunk['chunk_id'] == chunk_id:
-                        if validation_success:
-                            return alignment
-                        else:
-                            exact_match = alignment  # Keep track but don't return yet
-                    elif chunk['chunk_id'] < chunk_id and validation_success:
-                        # Potential fallback candidate
-                        fallback_candidates.append({
-                            'chunk_id': chunk['chunk_id'],
-                            'alignment': alignment
-                        })
+        for alignment in iter_alignments(self.alignments_file, self.chunks_file):
+            # Check if validation_success is true
+            validation_success = alignment.get('validation', {}).get('validation_success', False)
+
+            # Search in the chunk_ids of the appropriate side
+            for bead_chunk_id in chunk_ids(alignment, side):
+                if bead_chunk_id == chunk_id:
+                    if validation_success:
+                        return alignment
+                    else:
+                        exact_match = alignment  # Keep track but don't return yet
+                elif bead_chunk_id < chunk_id and validation_success:
+                    # Potential fallback candidate
+                    fallback_candidates.append({
+                        'chunk_id': bead_chunk_id,
+                        'alignment': alignment
+                    })
 
         # If exact match exists but validation_success was false,
         # find the largest chunk_id < provided chunk_id with validation_success
@@ -113,6 +108,13 @@ class ChunkLookupApp:
 
         return None
 
+    def _find_in_store(self, chunk_id: int, side: str) -> Optional[Dict[str, Any]]:
+        """find_alignment_by_chunk_id with direct chunk_id -> bead lookups."""
+        # The store precomputes, for each chunk_id, the bead of the highest
+        # chunk_id at or below it on this side that passed validation
+        bead = self.store.validated_bead_at_or_below(chunk_id, side)
+        return self.store.bead(bead) if bead is not None else None
+
     def lookup(self, text_excerpt: str) -> Optional[Dict[str, Any]]:
         """
         Main lookup function.
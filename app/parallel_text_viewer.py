@@ -4,11 +4,19 @@ Parallel Text Viewer for Melancolia della Resistenza
 Displays aligned English and Italian texts side by side with synchronized scrolling.
 """
 
-import json
+import sys
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Make the bertalign package importable when run from this directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bertalign.beads import chunk_ids, iter_alignments
+from bertalign.jsonl import load_table
 
 
 class ParallelTextViewer:
@@ -27,7 +35,7 @@ class ParallelTextViewer:
         print(f"Loaded {len(self.alignments)} alignments")
 
         # Create chunk index for faster lookup
-        self.chunk_index = {chunk['chunk_id']: chunk for chunk in self.chunks}
+        self.chunk_index = self.chunks.index_by('chunk_id')
 
         # Build the UI
         self.root = tk.Tk()
@@ -37,26 +45,16 @@ class ParallelTextViewer:
         self._setup_ui()
         self._populate_texts()
 
-    def _load_chunks(self) -> List[Dict[str, Any]]:
-        """Load all chunks from JSONL file."""
-        chunks = []
-        with open(self.chunks_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    chunks.append(json.loads(line))
-        return sorted(chunks, key=lambda x: x['chunk_id'])
+    def _load_chunks(self) -> Sequence[Dict[str, Any]]:
+        """Load all chunks from JSONL file, in chunk_id order and decoded on access."""
+        table = load_table(self.chunks_file)
+        return table.rows(np.argsort(table.ints('chunk_id'), kind='stable'))
 
     def _load_alignments(self) -> List[Dict[str, Any]]:
         """Load all validated alignments."""
-        alignments = []
-        with open(self.alignments_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    alignment = json.loads(line)
-                    # Only load validated alignments
-                    if alignment.get('validation', {}).get('validation_success', False):
-                        alignments.append(alignment)
-        return alignments
+        # Only load validated alignments
+        return [alignment for alignment in iter_alignments(self.alignments_file, self.chunks_file)
+                if alignment.get('validation', {}).get('validation_success', False)]
 
     def _setup_ui(self):
         """Setup the user interface."""
@@ -148,8 +146,6 @@ class ParallelTextViewer:
             part = alignment.get('part', '')
             src_text = alignment.get('src_text', '')
             tgt_text = alignment.get('tgt_text', '')
-            src_chunks = alignment.get('src_chunks', [])
-            tgt_chunks = alignment.get('tgt_chunks', [])
             confidence = alignment.get('validation', {}).get('confidence', 0)
 
             # Insert into English text
@@ -201,11 +197,7 @@ class ParallelTextViewer:
         self.clear_highlights()
 
         # Search in chunks first to get language
-        found_chunk = None
-        for chunk in self.chunks:
-            if search_text in chunk['text'].lower():
-                found_chunk = chunk
-                break
+        found_chunk = self.chunks.find('text', search_text)
 
         if not found_chunk:
             self.status_var.set(f"❌ Text '{search_text}' not found in chunks")
@@ -218,18 +210,11 @@ class ParallelTextViewer:
 
         # Find alignment containing this chunk
         found_alignment = None
-        field_to_search = 'src_chunks' if language == 'en' else 'tgt_chunks'
+        side = 'src' if language == 'en' else 'tgt'
 
         for pos_info in self.alignment_positions:
-            alignment = pos_info['alignment']
-            chunks = alignment.get(field_to_search, [])
-
-            for chunk in chunks:
-                if chunk['chunk_id'] == chunk_id:
-                    found_alignment = pos_info
-                    break
-
-            if found_alignment:
+            if chunk_id in chunk_ids(pos_info['alignment'], side):
+                found_alignment = pos_info
                 break
 
         if not found_alignment:
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Check the alignment store lookups of chunk_lookup_app against the JSONL scan."""
+
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from chunk_lookup_app import ChunkLookupApp
+from bertalign.store import build_store
+
+
+def _write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _make_alignments(rng, num_beads=60):
+    """Full records with 0-2 chunks a side, chunk_id gaps and mixed validation."""
+    chunks, records = [], []
+    next_id = 5  # no chunk below 5: lookups below the first bead
+    src_index = tgt_index = 0
+    for bead in range(num_beads):
+        sides = {}
+        for side, language in (('src', 'en'), ('tgt', 'it')):
+            side_chunks = []
+            for _ in range(rng.choice([0, 1, 1, 1, 2]) if bead else 1):
+                next_id += rng.choice([1, 1, 2, 4])
+                side_chunks.append({'chunk_id': next_id, 'part': '001', 'language': language,
+                                    'text': "{} chunk {}".format(language, next_id)})
+            sides[side] = side_chunks
+            chunks.extend(side_chunks)
+        src_indices = list(range(src_index, src_index + len(sides['src'])))
+        tgt_indices = list(range(tgt_index, tgt_index + len(sides['tgt'])))
+        src_index, tgt_index = src_index + len(src_indices), tgt_index + len(tgt_indices)
+        records.append({
+            'part': '001',
+            'src_indices': src_indices,
+            'tgt_indices': tgt_indices,
+            'src_text': ' '.join(chunk['text'] for chunk in sides['src']),
+            'tgt_text': ' '.join(chunk['text'] for chunk in sides['tgt']),
+            'src_chunks': sides['src'],
+            'tgt_chunks': sides['tgt'],
+            'alignment_type': "{}-{}".format(len(src_indices), len(tgt_indices)),
+            # the first beads fail, so that some ids have no validated bead below
+            'validation': {'validation_success': bead >= 3 and rng.random() < 0.6,
+                           'confidence': round(rng.random(), 3)},
+        })
+    return chunks, records, next_id
+
+
+def test_store_lookup_matches_scan():
+    rng = random.Random(0)
+    chunks, records, max_id = _make_alignments(rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        chunks_file, alignments_file = Path(tmp) / "chunks.jsonl", Path(tmp) / "alignments.jsonl"
+        _write_jsonl(chunks_file, chunks)
+        _write_jsonl(alignments_file, records)
+        store = build_store(alignments_file)
+        scan_app = ChunkLookupApp(chunks_file, alignments_file)
+        store_app = ChunkLookupApp(chunks_file, store.path)
+        assert scan_app.store is None and store_app.store is not None
+        assert [store.validated(bead) for bead in range(len(records))] == \
+            [record['validation']['validation_success'] for record in records]
+        found = 0
+        for language in ('en', 'it'):
+            for chunk_id in range(-2, max_id + 5):
+                expected = scan_app.find_alignment_by_chunk_id(chunk_id, language)
+                assert store_app.find_alignment_by_chunk_id(chunk_id, language) == expected, \
+                    (chunk_id, language)
+                found += expected is not None
+        assert 0 < found < 2 * (max_id + 7)
+
+
+if __name__ == "__main__":
+    test_store_lookup_matches_scan()
+    print("OK")
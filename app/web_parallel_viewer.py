@@ -5,10 +5,18 @@ Displays aligned English and Italian texts side by side with synchronized scroll
 """
 
 import json
+import sys
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
+import numpy as np
 from flask import Flask, render_template, request, jsonify
 
+# Make the bertalign package importable when run from this directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bertalign.beads import chunk_ids, iter_alignments
+from bertalign.jsonl import load_table
+
 
 class ParallelTextData:
     def __init__(self, chunks_file: str, alignments_file: str):
@@ -25,68 +33,56 @@ class ParallelTextData:
         print(f"Loaded {len(self.alignments)} validated alignments")
 
         # Create chunk index
-        self.chunk_index = {chunk['chunk_id']: chunk for chunk in self.chunks}
+        self.chunk_index = self.chunks.index_by('chunk_id')
 
-    def _load_chunks(self) -> List[Dict[str, Any]]:
-        """Load all chunks."""
-        chunks = []
-        with open(self.chunks_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    chunks.append(json.loads(line))
-        return sorted(chunks, key=lambda x: x['chunk_id'])
+    def _load_chunks(self) -> Sequence[Dict[str, Any]]:
+        """Load all chunks, in chunk_id order and decoded on access."""
+        table = load_table(self.chunks_file)
+        return table.rows(np.argsort(table.ints('chunk_id'), kind='stable'))
 
     def _load_alignments(self) -> List[Dict[str, Any]]:
         """Load validated alignments."""
-        alignments = []
-        with open(self.alignments_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    alignment = json.loads(line)
-                    if alignment.get('validation', {}).get('validation_success', False):
-                        alignments.append(alignment)
-        return alignments
+        return [alignment for alignment in iter_alignments(self.alignments_file, self.chunks_file)
+                if alignment.get('validation', {}).get('validation_success', False)]
 
     def search_text(self, query: str) -> Dict[str, Any]:
         """Search for text and return alignment info."""
         query = query.strip().lower()
 
         # Find chunk
-        found_chunk = None
-        for chunk in self.chunks:
-            if query in chunk['text'].lower():
-                found_chunk = chunk
-                break
+        found_chunk = self.chunks.find('text', query)
 
         if not found_chunk:
             return {'error': 'Text not found in chunks'}
 
         chunk_id = found_chunk['chunk_id']
         language = found_chunk['language']
-        field_to_search = 'src_chunks' if language == 'en' else 'tgt_chunks'
+        side = 'src' if language == 'en' else 'tgt'
 
         # Find alignment
         for idx, alignment in enumerate(self.alignments):
-            chunks = alignment.get(field_to_search, [])
-            for chunk in chunks:
-                if chunk['chunk_id'] == chunk_id:
-                    return {
-                        'found': True,
-                        'alignment_index': idx,
-                        'chunk_id': chunk_id,
-                        'language': language,
-                        'src_text': alignment['src_text'],
-                        'tgt_text': alignment['tgt_text'],
-                        'part': alignment.get('part'),
-                        'confidence': alignment.get('validation', {}).get('confidence'),
-                        'alignment_type': alignment.get('alignment_type')
-                    }
+            if chunk_id in chunk_ids(alignment, side):
+                return {
+                    'found': True,
+                    'alignment_index': idx,
+                    'chunk_id': chunk_id,
+                    'language': language,
+                    'src_text': alignment['src_text'],
+                    'tgt_text': alignment['tgt_text'],
+                    'part': alignment.get('part'),
+                    'confidence': alignment.get('validation', {}).get('confidence'),
+                    'alignment_type': alignment.get('alignment_type')
+                }
 
         return {'error': 'No validated alignment found'}
 
     def get_alignments(self) -> List[Dict[str, Any]]:
-        """Get all alignments."""
-        return self.alignments
+        """Get all alignments, with the fields the page shows."""
+        return [{'part': alignment.get('part'),
+                 'src_text': alignment['src_text'],
+                 'tgt_text': alignment['tgt_text'],
+                 'alignment_type': alignment.get('alignment_type')}
+                for alignment in self.alignments]
 
 
 # Initialize Flask app
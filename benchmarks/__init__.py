@@ -0,0 +1,6 @@
+"""
+Benchmarks and evaluation tools for Bertalign.
+
+The tools in this package measure speed/quality trade-offs of the
+alignment modes on the Text+Berg gold standard and on synthetic data.
+"""
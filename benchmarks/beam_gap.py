@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare beam-search second-pass alignment against the exact DP on Text+Berg.
+
+For every beam width, reports the DP score gap to the exact solution,
+F1 against the gold alignments and the second-pass time, so that a beam
+width can be chosen for latency-sensitive interactive alignment.
+
+Usage:
+    python -m benchmarks.beam_gap --beam-sizes 4 8 16 32
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from bertalign import Bertalign
+from bertalign.corelib import *
+from bertalign.eval import score_multiple
+from benchmarks.textberg import DEFAULT_DATA_DIR, load_textberg
+
+
+def run_second_pass(aligner, first_alignment, search, beam_size):
+    """Run the second pass only, returning (alignment, elapsed seconds)."""
+    align_types = get_alignment_types(aligner.max_align)
+    w, path = find_second_search_path(list(first_alignment), aligner.win, aligner.src_num, aligner.tgt_num)
+    start = time.perf_counter()
+    pointers = second_pass_align(aligner.src_vecs, aligner.tgt_vecs, aligner.src_lens, aligner.tgt_lens,
+                                 w, path, align_types, aligner.char_ratio, aligner.skip,
+                                 margin=aligner.margin, len_penalty=aligner.len_penalty,
+                                 search=search, beam_size=beam_size)
+    elapsed = time.perf_counter() - start
+    alignment = second_back_track(aligner.src_num, aligner.tgt_num, pointers, path, align_types)
+    return alignment, elapsed
+
+
+def alignment_score(aligner, alignment):
+    return get_alignment_score(alignment, aligner.src_vecs, aligner.tgt_vecs,
+                               aligner.src_lens, aligner.tgt_lens,
+                               aligner.char_ratio, aligner.skip,
+                               margin=aligner.margin, len_penalty=aligner.len_penalty)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score gap of beam search vs. exact second-pass DP on Text+Berg")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Text+Berg directory")
+    parser.add_argument("--beam-sizes", type=int, nargs="+", default=[2, 4, 8, 16, 32],
+                        help="Beam widths to evaluate (default: 2 4 8 16 32)")
+    parser.add_argument("--max-align", type=int, default=5, help="Bertalign max_align (default: 5)")
+    parser.add_argument("--win", type=int, default=5, help="Bertalign second-pass window (default: 5)")
+    parser.add_argument("-o", "--output", type=Path, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    docs = load_textberg(args.data_dir)
+    modes = [("full", 0)] + [("beam", size) for size in args.beam_sizes]
+    results = {mode: {"score": 0.0, "time": 0.0, "alignments": []} for mode in modes}
+    gold_list = []
+
+    for name, src, tgt, gold in docs:
+        print(f"Aligning {name} ...", file=sys.stderr)
+        aligner = Bertalign(src, tgt, is_split=True, max_align=args.max_align, win=args.win)
+        first_alignment = aligner.first_pass()
+        if not gold_list:
+            # Warm up the JIT so compilation is not timed.
+            for search, beam_size in modes:
+                run_second_pass(aligner, first_alignment, search, max(beam_size, 1))
+        gold_list.append(gold)
+        for search, beam_size in modes:
+            alignment, elapsed = run_second_pass(aligner, first_alignment, search, max(beam_size, 1))
+            results[(search, beam_size)]["score"] += alignment_score(aligner, alignment)
+            results[(search, beam_size)]["time"] += elapsed
+            results[(search, beam_size)]["alignments"].append(alignment)
+
+    exact = results[("full", 0)]
+    report = []
+    for search, beam_size in modes:
+        res = results[(search, beam_size)]
+        scores = score_multiple(gold_list=gold_list, test_list=res["alignments"])
+        gap = exact["score"] - res["score"]
+        report.append({
+            "search": search,
+            "beam_size": beam_size,
+            "score": res["score"],
+            "score_gap": gap,
+            "relative_gap": gap / abs(exact["score"]) if exact["score"] else 0.0,
+            "second_pass_time": res["time"],
+            "speedup": exact["time"] / res["time"] if res["time"] else 0.0,
+            "f1_strict": scores["f1_strict"],
+            "f1_lax": scores["f1_lax"],
+        })
+
+    print(f"{'mode':>10} | {'score gap':>10} | {'rel. gap':>8} | {'F1 strict':>9} | {'F1 lax':>7} | {'DP time':>8} | {'speedup':>7}")
+    for row in report:
+        mode = "full" if row["search"] == "full" else f"beam={row['beam_size']}"
+        print(f"{mode:>10} | {row['score_gap']:>10.4f} | {row['relative_gap']:>8.2%} | "
+              f"{row['f1_strict']:>9.3f} | {row['f1_lax']:>7.3f} | {row['second_pass_time']:>7.3f}s | {row['speedup']:>6.1f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+On-disk cache of overlap embeddings, shared by the evaluation tools.
+
+CachedEncoder wraps an encoder and stores what transform() returns in an
+.npz file keyed by the model name and the sentences, so evaluating many
+configurations, or rerunning an evaluation, encodes each document once:
+
+    encoder = CachedEncoder(bertalign.model)
+    aligner = Bertalign(src, tgt, is_split=True, encoder=encoder)
+
+Overlap levels do not depend on each other, so embeddings cached for a
+larger max_align serve smaller ones. Without a wrapped encoder, the cache
+is read-only, which lets worker processes align without loading a model.
+"""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".embedding_cache"
+
+
+class CachedEncoder:
+    """
+    Encoder that serves overlap embeddings from cache_dir, computing
+    missing ones with encoder.
+    Args:
+        encoder: object with model_name and transform(sents, num_overlaps),
+                 or None to only read the cache.
+        cache_dir: str or Path.
+        model_name: str. Name of the cached model (default: encoder's).
+    """
+    def __init__(self, encoder=None, cache_dir=DEFAULT_CACHE_DIR, model_name=None):
+        if encoder is None and model_name is None:
+            raise ValueError("A read-only cache needs a model_name")
+        self.encoder = encoder
+        self.model_name = model_name or encoder.model_name
+        self.cache_dir = Path(cache_dir)
+        # Encoding time of the sentences of the last transform() call,
+        # as measured when they were first encoded.
+        self.last_seconds = None
+
+    def path(self, sents):
+        digest = hashlib.sha1(self.model_name.encode('utf-8'))
+        digest.update(str(len(sents)).encode('utf-8'))
+        for sent in sents:
+            digest.update(b"\0" + sent.encode('utf-8'))
+        return self.cache_dir / (digest.hexdigest() + ".npz")
+
+    def transform(self, sents, num_overlaps):
+        path = self.path(sents)
+        if path.exists():
+            with np.load(path) as npz:
+                if npz["vecs"].shape[0] >= num_overlaps:
+                    self.last_seconds = float(npz["seconds"])
+                    return npz["vecs"][:num_overlaps], npz["lens"][:num_overlaps]
+        if self.encoder is None:
+            raise KeyError("No cached {} embeddings with {} overlaps for these {} sentences in {}".format(
+                self.model_name, num_overlaps, len(sents), self.cache_dir))
+
+        start = time.perf_counter()
+        vecs, lens = self.encoder.transform(sents, num_overlaps)
+        self.last_seconds = time.perf_counter() - start
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".{}.tmp.npz".format(os.getpid()))
+        np.savez(tmp_path, vecs=vecs, lens=lens, seconds=self.last_seconds)
+        os.replace(tmp_path, path)
+        return vecs, lens
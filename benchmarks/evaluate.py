@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Evaluate alignment configurations on Text+Berg, in parallel.
+
+Every document is encoded once, in this process, into an embedding cache
+(benchmarks.embedding_cache). The documents are then aligned under every
+configuration in a pool of worker processes that read the cache instead
+of loading the model, one fresh process per alignment so that its peak
+RSS is its own. The report gives, per document and configuration, F1
+strict and lax (bertalign.eval.score_multiple), encoding time, DP time
+and peak memory, plus the totals of each configuration.
+
+Usage:
+    python -m benchmarks.evaluate --modes default beam adaptive hierarchical
+    python -m benchmarks.evaluate --config 'win3={"win": 3}' --config 'topk5={"top_k": 5}'
+    python -m benchmarks.evaluate --encoder mock   # offline, F1 is not meaningful
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+from pathlib import Path
+
+from bertalign.eval import score_multiple
+from bertalign.instrument import MB, peak_rss
+from bertalign.preprocess import preprocess
+from benchmarks.embedding_cache import DEFAULT_CACHE_DIR, CachedEncoder
+from benchmarks.textberg import DEFAULT_DATA_DIR, load_textberg
+from benchmarks.throughput import MODES, align, make_corpus, make_encoder
+
+# Stages that make up the DP time (encoding and splitting excluded).
+DP_STAGES = ("top_k", "first_pass", "first_back_track", "band_scores", "second_pass", "back_track")
+
+
+def parse_config(spec):
+    """NAME=JSON, e.g. 'win3={"win": 3}', into (name, Bertalign kwargs)."""
+    name, _, kwargs = spec.partition("=")
+    if not name or not kwargs:
+        raise argparse.ArgumentTypeError("Expected NAME=JSON, got {!r}".format(spec))
+    return name, json.loads(kwargs)
+
+
+def encode_documents(docs, encoder, max_align, src_lang, tgt_lang):
+    """
+    Fill the cache with the embeddings of every document, split as
+    Bertalign(is_split=True) splits them. Returns the encoding seconds of
+    each document, measured when it was first encoded.
+    """
+    seconds = {}
+    for name, src, tgt, _ in docs:
+        src_sents, tgt_sents, _, _ = preprocess(src, tgt, is_split=True, src_lang=src_lang, tgt_lang=tgt_lang)
+        total = 0.0
+        for sents in (src_sents, tgt_sents):
+            encoder.transform(sents, max_align - 1)
+            total += encoder.last_seconds
+        seconds[name] = total
+        print(f"Encoded {name}: {total:.2f}s", file=sys.stderr)
+    return seconds
+
+
+def align_document(task):
+    """Worker: align one document under one configuration from cached embeddings."""
+    from bertalign import Bertalign
+    config, kwargs, name, src, tgt, gold, cache_dir, model_name, src_lang, tgt_lang = task
+    # Load the compiled kernels before timing, as a long-lived process would have.
+    warm_src, warm_tgt, _ = make_corpus(100)
+    align(warm_src, warm_tgt, "default", make_encoder("mock", dim=8), kwargs)
+
+    encoder = CachedEncoder(cache_dir=cache_dir, model_name=model_name)
+    with redirect_stdout(io.StringIO()):
+        aligner = Bertalign(src, tgt, is_split=True, src_lang=src_lang, tgt_lang=tgt_lang,
+                            encoder=encoder, **kwargs)
+        aligner.align_sents()
+    scores = score_multiple(gold_list=[gold], test_list=[aligner.result])
+    stages = aligner.stage_stats
+    peak = peak_rss()
+    return {
+        "config": config,
+        "doc": name,
+        "f1_strict": scores["f1_strict"],
+        "f1_lax": scores["f1_lax"],
+        "dp_seconds": sum(stage["seconds"] for stage_name, stage in stages.items() if stage_name in DP_STAGES),
+        "band_area": aligner.band_stats["band_area"],
+        "peak_rss_mb": round(peak / MB, 1) if peak is not None else None,
+        "stages": stages,
+        "result": aligner.result,
+    }
+
+
+def evaluate(docs, configs, encoder, cache_dir=DEFAULT_CACHE_DIR, workers=None,
+             src_lang="de", tgt_lang="fr"):
+    """
+    Align every document under every configuration and score them.
+    Args:
+        docs: list of (name, src_text, tgt_text, gold) as load_textberg gives.
+        configs: dict of configuration name -> Bertalign kwargs.
+        encoder: encoder for the documents not cached yet.
+    Returns:
+        rows: list of per-document dicts, then one "all" row per configuration.
+    """
+    cached = CachedEncoder(encoder, cache_dir)
+    max_align = max(kwargs.get("max_align", 5) for kwargs in configs.values())
+    encode_seconds = encode_documents(docs, cached, max_align, src_lang, tgt_lang)
+
+    tasks = [(config, kwargs, name, src, tgt, gold, cache_dir, cached.model_name, src_lang, tgt_lang)
+             for config, kwargs in configs.items() for name, src, tgt, gold in docs]
+    workers = workers or os.cpu_count() or 1
+    with get_context("spawn").Pool(min(workers, len(tasks)), maxtasksperchild=1) as pool:
+        results = {(r["config"], r["doc"]): r for r in pool.imap_unordered(align_document, tasks)}
+
+    rows = []
+    for config in configs:
+        config_rows = []
+        for name, _, _, _ in docs:
+            result = results[(config, name)]
+            config_rows.append(dict(result, encode_seconds=encode_seconds[name]))
+        scores = score_multiple(gold_list=[gold for _, _, _, gold in docs],
+                                test_list=[row["result"] for row in config_rows])
+        peaks = [row["peak_rss_mb"] for row in config_rows if row["peak_rss_mb"] is not None]
+        total = {
+            "config": config,
+            "doc": "all",
+            "f1_strict": scores["f1_strict"],
+            "f1_lax": scores["f1_lax"],
+            "encode_seconds": sum(row["encode_seconds"] for row in config_rows),
+            "dp_seconds": sum(row["dp_seconds"] for row in config_rows),
+            "band_area": sum(row["band_area"] for row in config_rows),
+            "peak_rss_mb": max(peaks) if peaks else None,
+        }
+        rows.extend(config_rows)
+        rows.append(total)
+    for row in rows:
+        row.pop("result", None)
+    return rows
+
+
+def print_rows(rows):
+    print(f"{'config':>14} | {'doc':>5} | {'F1 strict':>9} | {'F1 lax':>7} | {'encode':>8} | "
+          f"{'DP':>8} | {'band':>9} | {'peak RSS':>9}")
+    for row in rows:
+        peak = f"{row['peak_rss_mb']:>6.0f} MB" if row["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(f"{row['config']:>14} | {row['doc']:>5} | {row['f1_strict']:>9.3f} | {row['f1_lax']:>7.3f} | "
+              f"{row['encode_seconds']:>7.2f}s | {row['dp_seconds']:>7.3f}s | {row['band_area']:>9} | {peak}")
+        if row["doc"] == "all":
+            print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate alignment configurations on Text+Berg in parallel")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Text+Berg directory")
+    parser.add_argument("--modes", nargs="*", choices=sorted(MODES), default=["default"],
+                        help="Alignment modes to evaluate (default: default)")
+    parser.add_argument("--config", type=parse_config, action="append", default=[], metavar="NAME=JSON",
+                        help="Extra configuration as Bertalign kwargs, repeatable")
+    parser.add_argument("--encoder", choices=["labse", "mock"], default="labse",
+                        help="Sentence encoder (default: labse)")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                        help="Embedding cache directory (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="Alignment processes (default: CPU count)")
+    parser.add_argument("--src-lang", default="de", help="Source language (default: de)")
+    parser.add_argument("--tgt-lang", default="fr", help="Target language (default: fr)")
+    parser.add_argument("-o", "--output", type=Path, help="Write the rows as JSON to this file")
+    args = parser.parse_args()
+
+    configs = {mode: MODES[mode] for mode in args.modes}
+    configs.update(args.config)
+    if not configs:
+        parser.error("No configuration to evaluate")
+
+    docs = load_textberg(args.data_dir, args.src_lang, args.tgt_lang)
+    rows = evaluate(docs, configs, make_encoder(args.encoder, dim=64), cache_dir=args.cache_dir,
+                    workers=args.workers, src_lang=args.src_lang, tgt_lang=args.tgt_lang)
+    print_rows(rows)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Rows written to: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
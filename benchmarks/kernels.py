@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks and differential tests of the bertalign.corelib kernels.
+
+Every kernel (find_top_k_sents, first_pass_align, first_back_track,
+second_pass_align, second_back_track) is run on randomized synthetic
+documents (benchmarks.synthetic) and timed. Alternative implementations,
+registered with register_alternative() or given as --alt KERNEL=MODULE:FUNCTION,
+take the reference's arguments and are checked against its output on the
+same inputs:
+
+    find_top_k_sents      same similarities; indices may differ only on ties
+    first_pass_align      same pointers in the band, or the same anchors,
+    second_pass_align     or a score within --tolerance of the reference's
+    *_back_track          identical beads
+
+The report gives, per kernel and implementation, the cases that failed,
+the largest score difference and the speed-up over the reference. The
+command exits with status 1 if any alternative failed, for use in CI.
+
+Usage:
+    python -m benchmarks.kernels --sizes 1000 10000 --cases 3
+    python -m benchmarks.kernels --kernels second_pass_align \\
+        --alt second_pass_align=my_kernels:second_pass_align
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bertalign.corelib import *
+from benchmarks.synthetic import generate
+
+# Score differences below this are rounding, not a different solution.
+DEFAULT_TOLERANCE = 1e-4
+
+
+def make_case(size, seed, dim=32, max_align=5, top_k=3, win=5):
+    """
+    Inputs of every kernel for one random synthetic document, computed with
+    the reference kernels so that each kernel gets realistic inputs.
+    """
+    rng = np.random.default_rng(seed)
+    doc = generate(size, dim=dim, max_align=max_align, noise=rng.uniform(0.1, 0.8),
+                   drift=rng.uniform(0, 0.02), len_ratio=rng.uniform(0.8, 1.3), seed=seed)
+    case = {"size": size, "seed": seed, "doc": doc, "top_k": top_k,
+            "first_types": get_alignment_types(2), "second_types": get_alignment_types(max_align)}
+    case["D"], case["I"] = find_top_k_sents(doc.src_vecs[0], doc.tgt_vecs[0], k=top_k)
+    case["first_w"], case["first_path"] = find_first_search_path(doc.src_num, doc.tgt_num)
+    case["first_pointers"] = first_pass_align(doc.src_num, doc.tgt_num, case["first_w"], case["first_path"],
+                                              case["first_types"], case["D"], case["I"])
+    anchors = first_back_track(doc.src_num, doc.tgt_num, case["first_pointers"], case["first_path"],
+                               case["first_types"])
+    case["w"], case["path"] = find_second_search_path(anchors, win, doc.src_num, doc.tgt_num)
+    case["pointers"] = second_pass_align(*_second_pass_args(case), margin=True, len_penalty=True)
+    return case
+
+
+def _second_pass_args(case):
+    doc = case["doc"]
+    return (doc.src_vecs, doc.tgt_vecs, doc.src_lens, doc.tgt_lens, case["w"], case["path"],
+            case["second_types"], doc.char_ratio, -0.1)
+
+
+def _band_equal(a, b, path):
+    """Whether two DP tables agree on every cell inside the search path."""
+    widths = path[:, 1] - path[:, 0] + 1
+    return all(np.array_equal(a[i, :widths[i]], b[i, :widths[i]]) for i in range(len(path)))
+
+
+def _first_pass_score(anchors, D, I):
+    """Sum of the top-k similarities of a first-pass alignment's 1-1 anchors."""
+    score = 0.0
+    for i, j in anchors:
+        hits = np.flatnonzero(I[i - 1] == j - 1)
+        score += float(D[i - 1][hits].sum())
+    return score
+
+
+def _second_pass_score(case, alignment):
+    doc = case["doc"]
+    return get_alignment_score(alignment, doc.src_vecs, doc.tgt_vecs, doc.src_lens, doc.tgt_lens,
+                               doc.char_ratio, -0.1, margin=True, len_penalty=True)
+
+
+def _compare_top_k(case, ref, alt, tolerance):
+    (D_ref, I_ref), (D_alt, I_alt) = ref, alt
+    diff = float(np.max(np.abs(D_ref - D_alt))) if D_ref.size else 0.0
+    if D_ref.shape != D_alt.shape or diff > tolerance:
+        return False, diff
+    # Different indices are fine where they are as similar (a tie).
+    src_vecs, tgt_vecs = case["doc"].src_vecs[0], case["doc"].tgt_vecs[0]
+    for i, k in zip(*np.nonzero(I_ref != I_alt)):
+        if len(set(I_alt[i].tolist())) != len(I_alt[i]):
+            return False, diff
+        if abs(float(src_vecs[i] @ tgt_vecs[I_alt[i][k]]) - D_ref[i][k]) > tolerance:
+            return False, diff
+    return True, diff
+
+
+def _compare_first_pass(case, ref, alt, tolerance):
+    doc = case["doc"]
+    if _band_equal(ref, alt, case["first_path"]):
+        return True, 0.0
+    anchors = [first_back_track(doc.src_num, doc.tgt_num, pointers, case["first_path"], case["first_types"])
+               for pointers in (ref, alt)]
+    diff = abs(_first_pass_score(anchors[0], case["D"], case["I"]) -
+               _first_pass_score(anchors[1], case["D"], case["I"]))
+    return anchors[0] == anchors[1] or diff <= tolerance, diff
+
+
+def _compare_second_pass(case, ref, alt, tolerance):
+    doc = case["doc"]
+    if _band_equal(ref, alt, case["path"]):
+        return True, 0.0
+    beads = [second_back_track(doc.src_num, doc.tgt_num, pointers, case["path"], case["second_types"])
+             for pointers in (ref, alt)]
+    diff = abs(_second_pass_score(case, beads[0]) - _second_pass_score(case, beads[1]))
+    return beads[0] == beads[1] or diff <= tolerance, diff
+
+
+def _compare_beads(case, ref, alt, tolerance):
+    return ref == alt, 0.0
+
+
+class Kernel:
+    """
+    A benchmarked kernel: its reference implementation, how to get its
+    arguments from a case, and how to compare two outputs.
+    """
+    def __init__(self, reference, arguments, compare):
+        self.reference = reference
+        self.arguments = arguments
+        self.compare = compare
+
+
+KERNELS = {
+    "find_top_k_sents": Kernel(
+        find_top_k_sents,
+        lambda c: ((c["doc"].src_vecs[0], c["doc"].tgt_vecs[0]), {"k": c["top_k"]}),
+        _compare_top_k),
+    "first_pass_align": Kernel(
+        first_pass_align,
+        lambda c: ((c["doc"].src_num, c["doc"].tgt_num, c["first_w"], c["first_path"], c["first_types"],
+                    c["D"], c["I"]), {}),
+        _compare_first_pass),
+    "first_back_track": Kernel(
+        first_back_track,
+        lambda c: ((c["doc"].src_num, c["doc"].tgt_num, c["first_pointers"], c["first_path"],
+                    c["first_types"]), {}),
+        _compare_beads),
+    "second_pass_align": Kernel(
+        second_pass_align,
+        lambda c: (_second_pass_args(c), {"margin": True, "len_penalty": True}),
+        _compare_second_pass),
+    "second_back_track": Kernel(
+        second_back_track,
+        lambda c: ((c["doc"].src_num, c["doc"].tgt_num, c["pointers"], c["path"], c["second_types"]), {}),
+        _compare_beads),
+}
+
+
+def _top_k_numpy(src_vecs, tgt_vecs, k=3):
+    """Exact top-k by a dense matrix product, without FAISS."""
+    sims = src_vecs @ tgt_vecs.T
+    I = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    D = np.take_along_axis(sims, I, axis=1)
+    order = np.argsort(-D, axis=1, kind='stable')
+    return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1).astype(np.int64)
+
+
+def _with_workspace(kernel):
+    workspace = Workspace()
+    return lambda *args, **kwargs: kernel(*args, workspace=workspace, **kwargs)
+
+
+def _second_pass_scored(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                        char_ratio, skip, margin=False, len_penalty=False):
+    sims, penalties = second_pass_scores(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                                         char_ratio, margin=margin)
+    return second_pass_align_scored(sims, penalties, w, search_path, align_types, skip,
+                                    len_penalty=len_penalty)
+
+
+def _second_pass_wide_beam(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                           char_ratio, skip, margin=False, len_penalty=False):
+    # A beam as wide as the band keeps every cell.
+    return second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                             char_ratio, skip, margin=margin, len_penalty=len_penalty,
+                             search="beam", beam_size=w)
+
+
+# Alternatives of each kernel that ship with bertalign, checked by default.
+ALTERNATIVES = {
+    "find_top_k_sents": {"workspace": _with_workspace(find_top_k_sents), "numpy": _top_k_numpy},
+    "first_pass_align": {"workspace": _with_workspace(first_pass_align)},
+    "second_pass_align": {"workspace": _with_workspace(second_pass_align),
+                          "scored": _second_pass_scored,
+                          "wide_beam": _second_pass_wide_beam},
+}
+
+
+def register_alternative(kernel, name, function):
+    """Check function against the reference kernel in later runs."""
+    if kernel not in KERNELS:
+        raise ValueError("Unknown kernel {!r}, expected one of {}".format(kernel, sorted(KERNELS)))
+    ALTERNATIVES.setdefault(kernel, {})[name] = function
+
+
+def load_alternative(spec):
+    """Register an alternative given as KERNEL=MODULE:FUNCTION."""
+    kernel, _, target = spec.partition("=")
+    module_name, _, function_name = target.partition(":")
+    if not (kernel and module_name and function_name):
+        raise ValueError("Expected KERNEL=MODULE:FUNCTION, got {!r}".format(spec))
+    function = getattr(importlib.import_module(module_name), function_name)
+    register_alternative(kernel, target, function)
+
+
+def _copy(output):
+    """Detach an output from workspace buffers that the next call reuses."""
+    if isinstance(output, np.ndarray):
+        return output.copy()
+    if isinstance(output, tuple):
+        return tuple(_copy(item) for item in output)
+    return output
+
+
+def _time(function, args, kwargs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, _copy(output)
+
+
+def run(cases, kernels=None, repeat=3, tolerance=DEFAULT_TOLERANCE):
+    """
+    Time every kernel and its alternatives on the cases and check the
+    alternatives' outputs against the reference's.
+    Returns:
+        report: list of dicts, one per kernel and implementation, with
+                cases, failures, max_score_diff, seconds and speedup.
+    """
+    report = []
+    for name in kernels or list(KERNELS):
+        kernel = KERNELS[name]
+        implementations = {"reference": kernel.reference, **ALTERNATIVES.get(name, {})}
+        rows = {impl: {"kernel": name, "implementation": impl, "cases": 0, "failures": 0,
+                       "max_score_diff": 0.0, "seconds": 0.0}
+                for impl in implementations}
+        for case_num, case in enumerate(cases):
+            args, kwargs = kernel.arguments(case)
+            if case_num == 0:
+                for function in implementations.values():
+                    function(*args, **kwargs)  # compile before timing
+            ref_seconds, ref_output = _time(kernel.reference, args, kwargs, repeat)
+            rows["reference"]["cases"] += 1
+            rows["reference"]["seconds"] += ref_seconds
+            for impl, function in implementations.items():
+                if impl == "reference":
+                    continue
+                seconds, output = _time(function, args, kwargs, repeat)
+                ok, diff = kernel.compare(case, ref_output, output, tolerance)
+                row = rows[impl]
+                row["cases"] += 1
+                row["seconds"] += seconds
+                row["failures"] += not ok
+                row["max_score_diff"] = max(row["max_score_diff"], diff)
+                if not ok:
+                    print(f"  {name}/{impl} differs on size {case['size']}, seed {case['seed']} "
+                          f"(score diff {diff:.3g})", file=sys.stderr)
+        ref_total = rows["reference"]["seconds"]
+        for row in rows.values():
+            row["speedup"] = ref_total / row["seconds"] if row["seconds"] else 0.0
+            report.append(row)
+    return report
+
+
+def print_report(report):
+    print(f"{'kernel':>18} | {'implementation':>24} | {'cases':>5} | {'failed':>6} | "
+          f"{'score diff':>10} | {'time':>9} | {'speedup':>7}")
+    for row in report:
+        print(f"{row['kernel']:>18} | {row['implementation']:>24} | {row['cases']:>5} | {row['failures']:>6} | "
+              f"{row['max_score_diff']:>10.2g} | {row['seconds'] * 1000:>7.1f}ms | {row['speedup']:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark corelib kernels and check alternative implementations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000],
+                        help="Source sentences of the random documents (default: 1000 5000)")
+    parser.add_argument("--cases", type=int, default=3, help="Random documents per size (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first document (default: 0)")
+    parser.add_argument("--kernels", nargs="+", choices=sorted(KERNELS), help="Kernels to run (default: all)")
+    parser.add_argument("--alt", action="append", default=[], metavar="KERNEL=MODULE:FUNCTION",
+                        help="Alternative implementation to check, repeatable")
+    parser.add_argument("--only-alt", action="store_true",
+                        help="Check only the --alt implementations, not the built-in ones")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per case, fastest kept (default: 3)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed score difference when outputs differ (default: %(default)s)")
+    parser.add_argument("--dim", type=int, default=32, help="Embedding dimension (default: 32)")
+    parser.add_argument("-o", "--output", type=Path, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.only_alt:
+        ALTERNATIVES.clear()
+    for spec in args.alt:
+        load_alternative(spec)
+
+    cases = []
+    for size in args.sizes:
+        for n in range(args.cases):
+            seed = args.seed + len(cases)
+            print(f"Generating document {seed} ({size} sentences) ...", file=sys.stderr)
+            cases.append(make_case(size, seed, dim=args.dim))
+
+    report = run(cases, kernels=args.kernels, repeat=args.repeat, tolerance=args.tolerance)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to: {args.output}", file=sys.stderr)
+
+    if any(row["failures"] for row in report):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
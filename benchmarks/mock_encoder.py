@@ -0,0 +1,93 @@
+"""
+Deterministic stand-in for the LaBSE encoder, for offline benchmarks.
+
+MockEncoder embeds every overlap string as a normalized bag of hashed
+tokens, so sentences sharing words get similar vectors and the aligner
+finds the same beads a real encoder would on synthetic parallel text
+(see benchmarks.throughput.make_corpus). It needs no model download or
+GPU, and its cost grows linearly with the text, so the measured time
+goes to the aligner.
+
+    aligner = Bertalign(src_sents, tgt_sents, encoder=MockEncoder())
+"""
+
+import zlib
+
+import numpy as np
+
+from bertalign.utils import yield_overlaps
+
+
+class MockEncoder:
+    """
+    Hashed bag-of-words encoder with the interface of bertalign.encoder.Encoder.
+    Args:
+        dim: int. Embedding dimension.
+    """
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.model_name = "mock-{}".format(dim)
+        self._buckets = {}
+
+    def _bucket(self, token):
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            bucket = self._buckets[token] = zlib.crc32(token.encode('utf-8')) % self.dim
+        return bucket
+
+    def _counts(self, lines):
+        """Token counts of each line, hashed into dim buckets."""
+        rows, buckets = [], []
+        for row, line in enumerate(lines):
+            for token in line.lower().split():
+                rows.append(row)
+                buckets.append(self._bucket(token))
+        flat = np.array(rows, dtype=np.int64) * self.dim + np.array(buckets, dtype=np.int64)
+        counts = np.bincount(flat, minlength=len(lines) * self.dim)
+        return counts.reshape(len(lines), self.dim).astype(np.float64)
+
+    def transform(self, sents, num_overlaps):
+        """
+        Embeddings and byte lengths of the overlaps of sents, shaped as
+        those of Encoder.transform: (num_overlaps, len(sents), dim) and
+        (num_overlaps, len(sents)).
+
+        The bag of words of an overlap is the sum of those of its
+        sentences, so the overlaps are summed from prefix sums instead
+        of being joined and hashed one by one.
+        """
+        lines = [line.strip() or 'BLANK_LINE' for line in sents]
+        num_sents = len(lines)
+        prefix = np.zeros((num_sents + 1, self.dim))
+        np.cumsum(self._counts(lines), axis=0, out=prefix[1:])
+        pad = self._counts(['PAD'])[0]
+
+        line_lens = np.array([len(line.encode('utf-8')) for line in lines], dtype=np.int64)
+        len_prefix = np.zeros(num_sents + 1, dtype=np.int64)
+        np.cumsum(line_lens, out=len_prefix[1:])
+
+        vecs = np.empty((num_overlaps, num_sents, self.dim), dtype=np.float32)
+        lens = np.empty((num_overlaps, num_sents), dtype=np.int64)
+        for level in range(num_overlaps):
+            size = level + 1
+            num_pad = min(level, num_sents)
+            vecs[level, :num_pad] = pad
+            lens[level, :num_pad] = len('PAD')
+            if num_pad == num_sents:
+                continue
+            vecs[level, num_pad:] = prefix[size:] - prefix[:num_sents + 1 - size]
+            # joined with one space between sentences, truncated as in yield_overlaps
+            lens[level, num_pad:] = np.minimum(len_prefix[size:] - len_prefix[:num_sents + 1 - size] + level,
+                                               10000)
+        norms = np.linalg.norm(vecs, axis=2, keepdims=True)
+        np.divide(vecs, norms, out=vecs, where=norms > 0)
+        return vecs, lens
+
+    def transform_reference(self, sents, num_overlaps):
+        """transform() computed from the joined overlap strings, for checks."""
+        overlaps = list(yield_overlaps(sents, num_overlaps))
+        vecs = self._counts(overlaps).astype(np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        np.divide(vecs, norms, out=vecs, where=norms > 0)
+        lens = np.array([len(line.encode('utf-8')) for line in overlaps], dtype=np.int64)
+        return vecs.reshape(num_overlaps, len(sents), self.dim), lens.reshape(num_overlaps, len(sents))
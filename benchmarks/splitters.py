@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Throughput and accuracy of the sentence splitter backends on Text+Berg.
+
+The Text+Berg documents have one gold sentence per line. They are joined
+into paragraphs of --para-size sentences, split again by every backend,
+and the predicted sentence boundaries are scored against the gold ones.
+
+Usage:
+    python -m benchmarks.splitters --splitters sentence_splitter regex
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from bertalign.splitters import SPLITTERS, split_text
+from benchmarks.textberg import DEFAULT_DATA_DIR, load_textberg
+
+
+def make_paragraphs(sents, para_size):
+    """Join gold sentences into paragraphs of para_size sentences."""
+    return "\n".join(" ".join(sents[i:i + para_size]) for i in range(0, len(sents), para_size))
+
+
+def sentence_boundaries(sents):
+    """Sentence end offsets, counted in non-whitespace characters."""
+    boundaries = set()
+    offset = 0
+    for sent in sents:
+        offset += len("".join(sent.split()))
+        boundaries.add(offset)
+    return boundaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentence splitter backends on Text+Berg")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Text+Berg directory")
+    parser.add_argument("--splitters", nargs="+", default=sorted(SPLITTERS),
+                        help="Backends to compare (default: all registered)")
+    parser.add_argument("--para-size", type=int, default=10,
+                        help="Gold sentences joined into one paragraph (default: 10)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per backend (default: 3)")
+    parser.add_argument("-o", "--output", type=Path, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    texts = []
+    for name, src, tgt, _ in load_textberg(args.data_dir):
+        for text, lang in ((src, "de"), (tgt, "fr")):
+            sents = [line.strip() for line in text.splitlines() if line.strip()]
+            texts.append((make_paragraphs(sents, args.para_size), lang, sentence_boundaries(sents)))
+    num_chars = sum(len(text) for text, _, _ in texts)
+    print(f"{len(texts)} texts, {num_chars} characters", file=sys.stderr)
+
+    report = []
+    for splitter in args.splitters:
+        split_text(texts[0][0], texts[0][1], splitter)  # load models and caches
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs = [split_text(text, lang, splitter) for text, lang, _ in texts]
+            best = min(best, time.perf_counter() - start)
+
+        true_pos = pred_total = gold_total = 0
+        for sents, (_, _, gold) in zip(outputs, texts):
+            pred = sentence_boundaries(sents)
+            true_pos += len(pred & gold)
+            pred_total += len(pred)
+            gold_total += len(gold)
+        precision = true_pos / pred_total if pred_total else 0.0
+        recall = true_pos / gold_total if gold_total else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report.append({
+            "splitter": splitter,
+            "seconds": best,
+            "chars_per_second": num_chars / best if best else 0.0,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+        })
+
+    print(f"{'splitter':>18} | {'time':>8} | {'chars/s':>10} | {'P':>6} | {'R':>6} | {'F1':>6}")
+    for row in report:
+        print(f"{row['splitter']:>18} | {row['seconds']:>7.3f}s | {row['chars_per_second']:>10.0f} | "
+              f"{row['precision']:>6.3f} | {row['recall']:>6.3f} | {row['f1']:>6.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
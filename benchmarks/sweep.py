@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Speed/quality sweep over the aligner parameters, with its Pareto frontier.
+
+Runs a grid, or a random sample of it, over max_align, top_k, win,
+percent and min_win_size on a gold set (Text+Berg by default). Every
+document is encoded once (through the embedding cache) for the largest
+max_align; each point then reruns only the DP through
+Bertalign.second_pass, whose first-pass anchors are memoized per
+(top_k, min_win_size, percent). A point's DP time is its first pass plus
+its second pass, each the best of --repeat timed runs after an untimed
+warm-up of the document.
+
+The report lists every point with F1 (bertalign.eval), DP time and band
+area, marks the Pareto frontier (no other point is both cheaper and
+better) and names the cheapest point that reaches --min-f1, ready to be
+copied into a bert_config.
+
+Usage:
+    python -m benchmarks.sweep --win 3 5 7 --top-k 3 5 --min-f1 0.93
+    python -m benchmarks.sweep --random 20 --cost band_area -o sweep.json
+"""
+
+import argparse
+import gc
+import io
+import itertools
+import json
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from bertalign.eval import score_multiple
+from benchmarks.embedding_cache import DEFAULT_CACHE_DIR, CachedEncoder
+from benchmarks.textberg import DEFAULT_DATA_DIR, load_textberg
+from benchmarks.throughput import make_encoder
+
+PARAMS = ("max_align", "top_k", "win", "percent", "min_win_size")
+FIRST_PASS_PARAMS = ("top_k", "min_win_size", "percent")
+
+
+def grid_points(values, sample=None, seed=0):
+    """
+    Points of the grid over values (param -> list), or a random sample of
+    sample distinct points of it.
+    """
+    points = [dict(zip(PARAMS, combo)) for combo in itertools.product(*(values[p] for p in PARAMS))]
+    if sample is not None and sample < len(points):
+        points = random.Random(seed).sample(points, sample)
+    return points
+
+
+class DocSweep:
+    """
+    One document's aligner, rerun at every sweep point. Keeps the time of
+    each first pass so that points sharing it are charged for it too.
+
+    The first run only warms the aligner up (compiled kernels, workspace
+    buffers) and is not timed. Each pass is then timed repeat times with
+    the garbage collector off, and its best time is kept, so a point's
+    cost does not depend on the points that ran before it.
+    """
+    def __init__(self, aligner, repeat=3):
+        self.aligner = aligner
+        self.repeat = repeat
+        self.first_pass_seconds = {}
+        self.warm = False
+
+    def _best_time(self, run, prepare):
+        best = float("inf")
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(self.repeat):
+                prepare()
+                start = time.perf_counter()
+                result = run()
+                best = min(best, time.perf_counter() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return result, best
+
+    def run(self, point):
+        first_key = tuple(point[p] for p in FIRST_PASS_PARAMS)
+        first_args = dict(zip(FIRST_PASS_PARAMS, first_key))
+        with redirect_stdout(io.StringIO()):
+            if not self.warm:
+                self.aligner.second_pass(max_align=point["max_align"], win=point["win"], **first_args)
+                self.warm = True
+            if first_key not in self.first_pass_seconds:
+                _, self.first_pass_seconds[first_key] = self._best_time(
+                    lambda: self.aligner.first_pass(**first_args), self.aligner.clear_caches)
+            # Untimed if its anchors were dropped since, to time the second pass alone
+            self.aligner.first_pass(**first_args)
+            alignment, seconds = self._best_time(
+                lambda: self.aligner.second_pass(max_align=point["max_align"], win=point["win"], **first_args),
+                lambda: self.aligner.clear_caches(first_pass=False))
+        return alignment, self.first_pass_seconds[first_key] + seconds, self.aligner.band_stats["band_area"]
+
+
+def sweep(docs, points, encoder, cache_dir=DEFAULT_CACHE_DIR, src_lang="de", tgt_lang="fr", repeat=3):
+    """
+    Score every point on the documents.
+    Args:
+        docs: list of (name, src_text, tgt_text, gold) as load_textberg gives.
+        points: list of dicts with a value for each of PARAMS.
+        encoder: encoder for the documents not cached yet.
+        repeat: int. Timed runs of each pass, of which the best is kept.
+    Returns:
+        rows: list of dicts, one per point: its parameters, f1_strict,
+              f1_lax, dp_seconds and band_area over all documents.
+    """
+    from bertalign import Bertalign
+    cached = CachedEncoder(encoder, cache_dir)
+    max_align = max(point["max_align"] for point in points)
+    doc_sweeps = []
+    for name, src, tgt, _ in docs:
+        print(f"Encoding {name} ...", file=sys.stderr)
+        with redirect_stdout(io.StringIO()):
+            aligner = Bertalign(src, tgt, is_split=True, max_align=max_align, src_lang=src_lang,
+                                tgt_lang=tgt_lang, encoder=cached)
+        doc_sweeps.append(DocSweep(aligner, repeat))
+
+    gold_list = [gold for _, _, _, gold in docs]
+    rows = []
+    for num, point in enumerate(points, 1):
+        alignments, seconds, area = [], 0.0, 0
+        for doc_sweep in doc_sweeps:
+            alignment, doc_seconds, doc_area = doc_sweep.run(point)
+            alignments.append(alignment)
+            seconds += doc_seconds
+            area += doc_area
+        scores = score_multiple(gold_list=gold_list, test_list=alignments)
+        rows.append(dict(point, f1_strict=scores["f1_strict"], f1_lax=scores["f1_lax"],
+                         dp_seconds=seconds, band_area=area))
+        print(f"[{num}/{len(points)}] {point}: F1 {scores['f1_strict']:.3f}, {seconds:.3f}s", file=sys.stderr)
+    return rows
+
+
+def pareto_frontier(rows, metric="f1_strict", cost="dp_seconds"):
+    """Rows no other row beats on both cost and metric, from cheapest to best."""
+    frontier = []
+    for row in sorted(rows, key=lambda r: (r[cost], -r[metric])):
+        if not frontier or row[metric] > frontier[-1][metric]:
+            frontier.append(row)
+    return frontier
+
+
+def cheapest(rows, min_score, metric="f1_strict", cost="dp_seconds"):
+    """Cheapest row whose metric reaches min_score, or None."""
+    good = [row for row in rows if row[metric] >= min_score]
+    return min(good, key=lambda r: (r[cost], -r[metric])) if good else None
+
+
+def print_rows(rows, frontier, metric, cost):
+    on_frontier = {id(row) for row in frontier}
+    print(f"  {'max_align':>9} {'top_k':>5} {'win':>4} {'percent':>7} {'min_win':>7} | "
+          f"{'F1 strict':>9} {'F1 lax':>7} | {'DP time':>8} {'band':>10}")
+    for row in sorted(rows, key=lambda r: (r[cost], -r[metric])):
+        mark = "*" if id(row) in on_frontier else " "
+        print(f"{mark} {row['max_align']:>9} {row['top_k']:>5} {row['win']:>4} {row['percent']:>7} "
+              f"{row['min_win_size']:>7} | {row['f1_strict']:>9.3f} {row['f1_lax']:>7.3f} | "
+              f"{row['dp_seconds']:>7.3f}s {row['band_area']:>10}")
+    print(f"\n* Pareto frontier of {metric} against {cost} ({len(frontier)} of {len(rows)} points)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto sweep of aligner parameters on a gold set")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Text+Berg style gold set")
+    parser.add_argument("--src-lang", default="de", help="Source language folder and code (default: de)")
+    parser.add_argument("--tgt-lang", default="fr", help="Target language folder and code (default: fr)")
+    parser.add_argument("--max-align", type=int, nargs="+", default=[5], help="max_align values (default: 5)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3], help="top_k values (default: 3)")
+    parser.add_argument("--win", type=int, nargs="+", default=[3, 5, 7], help="win values (default: 3 5 7)")
+    parser.add_argument("--percent", type=float, nargs="+", default=[0.06], help="percent values (default: 0.06)")
+    parser.add_argument("--min-win-size", type=int, nargs="+", default=[250],
+                        help="min_win_size values (default: 250)")
+    parser.add_argument("--random", type=int, metavar="N", help="Sample N points of the grid instead of all")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of --random (default: 0)")
+    parser.add_argument("--metric", choices=["f1_strict", "f1_lax"], default="f1_strict",
+                        help="Quality metric (default: f1_strict)")
+    parser.add_argument("--cost", choices=["dp_seconds", "band_area"], default="dp_seconds",
+                        help="Cost metric (default: dp_seconds)")
+    parser.add_argument("--min-f1", type=float, help="Quality bar: report the cheapest point reaching it")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs of each pass per point, the best is kept (default: 3)")
+    parser.add_argument("--encoder", choices=["labse", "mock"], default="labse",
+                        help="Sentence encoder (default: labse)")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                        help="Embedding cache directory (default: %(default)s)")
+    parser.add_argument("-o", "--output", type=Path, help="Write all points and the frontier as JSON")
+    args = parser.parse_args()
+
+    values = {"max_align": args.max_align, "top_k": args.top_k, "win": args.win,
+              "percent": args.percent, "min_win_size": args.min_win_size}
+    points = grid_points(values, args.random, args.seed)
+    docs = load_textberg(args.data_dir, args.src_lang, args.tgt_lang)
+    rows = sweep(docs, points, make_encoder(args.encoder, dim=64), cache_dir=args.cache_dir,
+                 src_lang=args.src_lang, tgt_lang=args.tgt_lang, repeat=args.repeat)
+
+    frontier = pareto_frontier(rows, args.metric, args.cost)
+    print_rows(rows, frontier, args.metric, args.cost)
+    best = None
+    if args.min_f1 is not None:
+        best = cheapest(rows, args.min_f1, args.metric, args.cost)
+        if best is None:
+            print(f"No point reaches {args.metric} >= {args.min_f1}")
+        else:
+            print(f"Cheapest point with {args.metric} >= {args.min_f1}: "
+                  + json.dumps({p: best[p] for p in PARAMS}))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"points": rows, "frontier": frontier, "cheapest": best}, f, indent=2)
+        print(f"Sweep written to: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
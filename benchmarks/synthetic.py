@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Synthetic parallel documents, generated directly as embeddings and lengths.
+
+generate() plants beads of known types (1-1, 1-2, 2-1, deletions...) and
+builds the overlap embeddings and byte lengths the aligner would get from
+an encoder, so the DP kernels can be run and checked at million-sentence
+scale without LaBSE or any text:
+
+    doc = generate(1000000, dim=64, noise=0.3, drift=0.01)
+    aligner = align(doc, max_align=5, win=5)
+    scores = score_multiple([doc.gold], [aligner.result])
+
+Each bead is the sum of max(s, t) random clause vectors. Its s source and
+t target sentences each take a contiguous share of the clauses, plus
+Gaussian noise, so a 1-2 bead's source sentence lies close to the sum of
+its two target sentences. Drift adds a random walk to the target
+embeddings, as a slow change of domain or translation style would. The
+gold beads are written in the read_alignments format of bertalign.eval.
+
+Usage:
+    python -m benchmarks.synthetic --sents 1000000 -o synthetic_1m
+    python -m benchmarks.synthetic --sents 100000 --align --score
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bertalign.eval import read_alignments, score_multiple
+
+# (source sentences, target sentences) of each bead type, and its probability.
+DEFAULT_BEAD_TYPES = {
+    (1, 1): 0.85,
+    (1, 2): 0.05,
+    (2, 1): 0.05,
+    (1, 0): 0.025,
+    (0, 1): 0.025,
+}
+
+PAD_LEN = len('PAD')
+
+
+class SyntheticDoc:
+    """
+    A generated document: the overlap embeddings and lengths of both sides,
+    shaped as Encoder.transform returns them, and the planted beads.
+    """
+    def __init__(self, src_vecs, tgt_vecs, src_lens, tgt_lens, gold, config=None):
+        self.src_vecs = src_vecs
+        self.tgt_vecs = tgt_vecs
+        self.src_lens = src_lens
+        self.tgt_lens = tgt_lens
+        self.gold = gold
+        self.config = config or {}
+
+    @property
+    def src_num(self):
+        return self.src_vecs.shape[1]
+
+    @property
+    def tgt_num(self):
+        return self.tgt_vecs.shape[1]
+
+    @property
+    def char_ratio(self):
+        return np.sum(self.src_lens[0]) / np.sum(self.tgt_lens[0])
+
+    def encoder(self):
+        """Encoder returning this document's embeddings, see align()."""
+        return _DocEncoder(self)
+
+    def save(self, path):
+        """Write embeddings.npz, gold.txt and config.json into directory path."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(path / "embeddings.npz", src_vecs=self.src_vecs, tgt_vecs=self.tgt_vecs,
+                 src_lens=self.src_lens, tgt_lens=self.tgt_lens)
+        write_alignments(self.gold, path / "gold.txt")
+        with open(path / "config.json", 'w', encoding='utf-8') as f:
+            json.dump(self.config, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with np.load(path / "embeddings.npz") as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        config_path = path / "config.json"
+        config = json.loads(config_path.read_text(encoding='utf-8')) if config_path.exists() else {}
+        return cls(gold=read_alignments(str(path / "gold.txt")), config=config, **arrays)
+
+
+class _DocEncoder:
+    """Serves a SyntheticDoc's embeddings to Bertalign in place of a model."""
+    def __init__(self, doc):
+        self.doc = doc
+        self.model_name = "synthetic"
+
+    def transform(self, sents, num_overlaps):
+        if len(sents) and sents[0].startswith("src"):
+            vecs, lens = self.doc.src_vecs, self.doc.src_lens
+        else:
+            vecs, lens = self.doc.tgt_vecs, self.doc.tgt_lens
+        if num_overlaps > vecs.shape[0]:
+            raise ValueError("The document was generated for max_align={}".format(vecs.shape[0] + 1))
+        return vecs[:num_overlaps], lens[:num_overlaps]
+
+
+def write_alignments(beads, path):
+    """Write beads as read_alignments reads them, one "[src]:[tgt]" per line."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for src, tgt in beads:
+            f.write("{}:{}\n".format(list(src), list(tgt)))
+
+
+def _sentence_clauses(bead_types, bead_sizes, clause_offsets, side):
+    """
+    First clause of every sentence of one side, in document order.
+    Sentence i of an n-sentence bead over k clauses starts at clause i*k//n.
+    """
+    num_sents = bead_sizes[:, side]
+    sent_offsets = np.concatenate([[0], np.cumsum(num_sents)])
+    starts = np.empty(sent_offsets[-1], dtype=np.int64)
+    for type_id, bead_type in enumerate(bead_types):
+        n, k = bead_type[side], max(bead_type)
+        if n == 0:
+            continue
+        beads = np.flatnonzero(bead_sizes[:, 2] == type_id)
+        rel = np.arange(n) * k // n
+        positions = sent_offsets[beads][:, None] + np.arange(n)
+        starts[positions] = clause_offsets[beads][:, None] + rel
+    return starts
+
+
+def _overlaps(sent_vecs, sent_lens, num_overlaps, pad_vec):
+    """Normalized overlap embeddings and lengths, laid out as yield_overlaps does."""
+    num_sents, dim = sent_vecs.shape
+    vecs = np.empty((num_overlaps, num_sents, dim), dtype=np.float32)
+    lens = np.empty((num_overlaps, num_sents), dtype=np.int64)
+    window = np.zeros_like(sent_vecs)
+    window_lens = np.zeros_like(sent_lens)
+    for level in range(num_overlaps):
+        # window holds the sum of the level + 1 sentences ending at each row
+        window[level:] += sent_vecs[:num_sents - level]
+        window_lens[level:] += sent_lens[:num_sents - level]
+        num_pad = min(level, num_sents)
+        vecs[level, :num_pad] = pad_vec
+        vecs[level, num_pad:] = window[num_pad:]
+        lens[level, :num_pad] = PAD_LEN
+        lens[level, num_pad:] = window_lens[num_pad:] + level  # joined with spaces
+    norms = np.linalg.norm(vecs, axis=2, keepdims=True)
+    np.divide(vecs, norms, out=vecs, where=norms > 0)
+    return vecs, lens
+
+
+def generate(num_sents, dim=64, max_align=5, bead_types=None, noise=0.3, drift=0.0,
+             len_ratio=1.1, len_noise=0.1, seed=0):
+    """
+    Generate a synthetic parallel document.
+    Args:
+        num_sents: int. Source sentences (the last bead may add one more).
+        dim: int. Embedding dimension.
+        max_align: int. Bertalign max_align the overlaps are built for.
+        bead_types: dict of (s, t) -> probability (default: DEFAULT_BEAD_TYPES).
+        noise: float. Standard deviation of the sentence embedding noise,
+               relative to the norm of a clause.
+        drift: float. Step of the random walk added to target embeddings,
+               per target sentence, relative to the norm of a clause.
+        len_ratio: float. Target to source length ratio.
+        len_noise: float. Log-normal noise of target clause lengths.
+        seed: int.
+    Returns:
+        doc: SyntheticDoc.
+    """
+    bead_types = dict(DEFAULT_BEAD_TYPES if bead_types is None else bead_types)
+    types = list(bead_types)
+    if any(s < 0 or t < 0 or s + t == 0 for s, t in types):
+        raise ValueError("Bead types need at least one sentence")
+    probs = np.array([bead_types[t] for t in types], dtype=np.float64)
+    probs /= probs.sum()
+    rng = np.random.default_rng(seed)
+
+    # Enough beads to cover num_sents source sentences, then cut.
+    mean_src = sum(p * s for p, (s, _) in zip(probs, types))
+    if mean_src == 0:
+        raise ValueError("Bead types need source sentences")
+    num_beads = int(num_sents / mean_src * 1.05) + 16
+    while True:
+        type_ids = rng.choice(len(types), size=num_beads, p=probs)
+        src_sizes = np.array([s for s, _ in types])[type_ids]
+        covered = np.cumsum(src_sizes)
+        if covered[-1] >= num_sents:
+            type_ids = type_ids[:np.searchsorted(covered, num_sents) + 1]
+            break
+        num_beads *= 2
+    sizes = np.array(types, dtype=np.int64)[type_ids]
+    bead_sizes = np.column_stack([sizes, type_ids])
+    num_clauses = sizes.max(axis=1)
+    clause_offsets = np.concatenate([[0], np.cumsum(num_clauses)[:-1]])
+    total_clauses = int(num_clauses.sum())
+
+    clause_vecs = rng.standard_normal((total_clauses, dim), dtype=np.float32)
+    clause_vecs /= np.sqrt(dim)
+    src_clause_lens = np.maximum(rng.lognormal(np.log(60), 0.5, total_clauses), 1)
+    tgt_clause_lens = np.maximum(src_clause_lens * len_ratio * rng.lognormal(0, len_noise, total_clauses), 1)
+
+    sides = []
+    for side, clause_lens in ((0, src_clause_lens), (1, tgt_clause_lens)):
+        # The sentences of a side cover all the clauses of its beads, so
+        # once the clauses of beads without sentences on this side are
+        # dropped, each sentence runs up to the start of the next one.
+        used = np.repeat(sizes[:, side] > 0, num_clauses)
+        starts = _sentence_clauses(types, bead_sizes, clause_offsets, side)
+        starts -= np.cumsum(~used)[starts]
+        if len(starts):
+            sent_vecs = np.add.reduceat(clause_vecs[used], starts, axis=0)
+            sent_lens = np.add.reduceat(clause_lens[used], starts).round().astype(np.int64)
+        else:
+            sent_vecs, sent_lens = clause_vecs[:0].copy(), np.zeros(0, dtype=np.int64)
+        sent_vecs += rng.standard_normal(sent_vecs.shape, dtype=np.float32) * (noise / np.sqrt(dim))
+        if side == 1 and drift > 0:
+            steps = rng.standard_normal(sent_vecs.shape, dtype=np.float32) * (drift / np.sqrt(dim))
+            sent_vecs += np.cumsum(steps, axis=0, dtype=np.float32)
+        sides.append((sent_vecs, sent_lens))
+
+    pad_vec = rng.standard_normal(dim).astype(np.float32)
+    pad_vec /= np.linalg.norm(pad_vec)
+    src_vecs, src_lens = _overlaps(*sides[0], max_align - 1, pad_vec)
+    tgt_vecs, tgt_lens = _overlaps(*sides[1], max_align - 1, pad_vec)
+
+    src_offsets = np.concatenate([[0], np.cumsum(sizes[:, 0])]).tolist()
+    tgt_offsets = np.concatenate([[0], np.cumsum(sizes[:, 1])]).tolist()
+    gold = [(list(range(src_offsets[b], src_offsets[b + 1])), list(range(tgt_offsets[b], tgt_offsets[b + 1])))
+            for b in range(len(sizes))]
+    config = {"num_sents": num_sents, "dim": dim, "max_align": max_align, "noise": noise, "drift": drift,
+              "len_ratio": len_ratio, "len_noise": len_noise, "seed": seed,
+              "bead_types": {"{}-{}".format(s, t): p for (s, t), p in bead_types.items()}}
+    return SyntheticDoc(src_vecs, tgt_vecs, src_lens, tgt_lens, gold, config)
+
+
+def align(doc, **bert_kwargs):
+    """
+    Align a SyntheticDoc with Bertalign, which takes its embeddings instead
+    of encoding text. Returns the aligner, whose stage_stats time the kernels.
+    """
+    from bertalign import Bertalign
+    src = ["src{}".format(i) for i in range(doc.src_num)]
+    tgt = ["tgt{}".format(i) for i in range(doc.tgt_num)]
+    bert_kwargs.setdefault("max_align", doc.src_vecs.shape[0] + 1)
+    aligner = Bertalign(src, tgt, src_lang="en", tgt_lang="fr", encoder=doc.encoder(), **bert_kwargs)
+    aligner.align_sents()
+    return aligner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic parallel embeddings with gold beads")
+    parser.add_argument("--sents", type=int, default=100000, help="Source sentences (default: 100000)")
+    parser.add_argument("--dim", type=int, default=64, help="Embedding dimension (default: 64)")
+    parser.add_argument("--max-align", type=int, default=5, help="Bertalign max_align (default: 5)")
+    parser.add_argument("--noise", type=float, default=0.3, help="Embedding noise (default: 0.3)")
+    parser.add_argument("--drift", type=float, default=0.0, help="Target embedding drift per sentence (default: 0)")
+    parser.add_argument("--len-ratio", type=float, default=1.1, help="Target/source length ratio (default: 1.1)")
+    parser.add_argument("--bead-types", type=json.loads,
+                        help='Bead type probabilities as JSON, e.g. \'{"1-1": 0.9, "1-2": 0.1}\'')
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("-o", "--output", type=Path, help="Save the document into this directory")
+    parser.add_argument("--align", action="store_true", help="Align the document and report the stage times")
+    parser.add_argument("--score", action="store_true", help="With --align, score F1 against the gold beads")
+    parser.add_argument("--win", type=int, default=5, help="Bertalign second-pass window (default: 5)")
+    parser.add_argument("--top-k", type=int, default=3, help="Bertalign top_k (default: 3)")
+    args = parser.parse_args()
+
+    bead_types = None
+    if args.bead_types:
+        bead_types = {tuple(int(n) for n in name.split("-")): p for name, p in args.bead_types.items()}
+    start = time.perf_counter()
+    doc = generate(args.sents, dim=args.dim, max_align=args.max_align, bead_types=bead_types,
+                   noise=args.noise, drift=args.drift, len_ratio=args.len_ratio, seed=args.seed)
+    print(f"Generated {doc.src_num} source and {doc.tgt_num} target sentences, {len(doc.gold)} beads "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if args.output:
+        doc.save(args.output)
+        print(f"Saved to: {args.output}", file=sys.stderr)
+
+    if args.align:
+        aligner = align(doc, win=args.win, top_k=args.top_k)
+        for name, stage in aligner.stage_stats.items():
+            print(f"{name:>16}: {stage['seconds']:>8.3f}s  {stage['cells']:>12} cells")
+        if args.score:
+            scores = score_multiple(gold_list=[doc.gold], test_list=[aligner.result])
+            print(f"F1 strict {scores['f1_strict']:.4f}, lax {scores['f1_lax']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Loader for the Text+Berg German-French gold standard.
+"""
+
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+from bertalign.eval import read_alignments
+
+DEFAULT_DATA_DIR = Path(__file__).parent.parent / "text+berg"
+
+
+def load_textberg(data_dir: Path = DEFAULT_DATA_DIR,
+                  src_lang: str = "de",
+                  tgt_lang: str = "fr") -> List[Tuple[str, str, str, list]]:
+    """
+    Load the Text+Berg documents and their gold alignments.
+
+    Args:
+        data_dir: Directory containing the src_lang, tgt_lang and gold folders
+        src_lang: Name of the source folder
+        tgt_lang: Name of the target folder
+
+    Returns:
+        List of (name, src_text, tgt_text, gold_alignment) tuples, sorted by name
+    """
+    data_dir = Path(data_dir)
+    docs = []
+    for name in sorted(os.listdir(data_dir / src_lang)):
+        src = (data_dir / src_lang / name).read_text(encoding="utf-8")
+        tgt = (data_dir / tgt_lang / name).read_text(encoding="utf-8")
+        gold = read_alignments(str(data_dir / "gold" / name))
+        docs.append((name, src, tgt, gold))
+    return docs
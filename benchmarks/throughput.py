@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Alignment throughput, per-stage latency and peak memory at several corpus sizes.
+
+Runs offline: the parallel corpus is synthetic (make_corpus) and is
+embedded by benchmarks.mock_encoder.MockEncoder unless --encoder labse
+is given. Every (size, mode) case runs in a fresh process, so its peak
+RSS is its own, after a warm-up alignment that compiles the kernels.
+
+Results are written as JSON. Passing an earlier result file as
+--baseline flags every case whose throughput, peak RSS or stage time got
+worse by more than --threshold, and exits with status 1 if any did.
+
+Usage:
+    python -m benchmarks.throughput --sizes 1000 10000 100000 -o bench.json
+    python -m benchmarks.throughput --sizes 1000 10000 --baseline bench.json
+    python -m benchmarks.throughput --compare old.json new.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from bertalign.eval import score_multiple
+from bertalign.instrument import MB, peak_rss
+
+# Bertalign keyword arguments of each benchmarked mode.
+MODES = {
+    "default": {},
+    "beam": {"search": "beam"},
+    "adaptive": {"adaptive_win": True},
+    "hierarchical": {"hierarchical": True},
+    "linear_memory": {"linear_memory": True},
+}
+DEFAULT_MODES = ["default", "beam", "adaptive", "hierarchical"]
+
+# Stages faster than this in the baseline are too noisy to flag.
+MIN_STAGE_SECONDS = 0.05
+
+
+def make_corpus(num_sents, seed=0, vocab_size=5000, noise=0.1):
+    """
+    Synthetic parallel corpus of about num_sents sentences per side.
+
+    Source sentences draw 5 to 25 words from a Zipf-like vocabulary. Each
+    bead copies its source words into the target with a fraction noise of
+    them replaced, as 1-1 (80%), 1-2 (10%) or 2-1 (10%) sentences.
+    Returns:
+        src_sents: list of str.
+        tgt_sents: list of str.
+        gold: list of (src_ids, tgt_ids) beads, as read_alignments gives.
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    words = np.array(["w{}".format(i) for i in range(vocab_size)], dtype=object)
+
+    def sentence():
+        return list(words[rng.choice(vocab_size, size=rng.integers(5, 26), p=weights)])
+
+    def translate(tokens):
+        tokens = list(tokens)
+        for i in np.flatnonzero(rng.random(len(tokens)) < noise):
+            tokens[i] = words[rng.integers(vocab_size)]
+        return tokens
+
+    src_sents, tgt_sents, gold = [], [], []
+    while len(src_sents) < num_sents:
+        kind = rng.random()
+        src_start, tgt_start = len(src_sents), len(tgt_sents)
+        if kind < 0.8:
+            tokens = sentence()
+            src_sents.append(tokens)
+            tgt_sents.append(translate(tokens))
+        elif kind < 0.9:
+            tokens = sentence()
+            cut = len(tokens) // 2
+            src_sents.append(tokens)
+            tgt_sents.extend([translate(tokens[:cut]), translate(tokens[cut:])])
+        else:
+            first, second = sentence(), sentence()
+            src_sents.extend([first, second])
+            tgt_sents.append(translate(first + second))
+        gold.append((list(range(src_start, len(src_sents))), list(range(tgt_start, len(tgt_sents)))))
+    join = lambda sents: [" ".join(tokens) + "." for tokens in sents]
+    return join(src_sents), join(tgt_sents), gold
+
+
+def make_encoder(name, dim):
+    if name == "mock":
+        from benchmarks.mock_encoder import MockEncoder
+        return MockEncoder(dim)
+    import bertalign
+    return bertalign.model
+
+
+def _rss_mb():
+    import psutil
+    return psutil.Process(os.getpid()).memory_info().rss / MB
+
+
+def align(src_sents, tgt_sents, mode, encoder, bert_kwargs):
+    """Align once, with the aligner's output silenced. Returns the aligner."""
+    from bertalign import Bertalign
+    with redirect_stdout(io.StringIO()):
+        aligner = Bertalign(src_sents, tgt_sents, src_lang="en", tgt_lang="fr",
+                            encoder=encoder, **MODES[mode], **bert_kwargs)
+        aligner.align_sents()
+    return aligner
+
+
+def run_case(size, mode, seed=0, repeat=1, encoder="mock", dim=64, score=False, bert_kwargs=None):
+    """
+    Benchmark one corpus size and mode in this process (run_suite gives
+    each case a fresh one). The fastest of repeat runs is reported.
+    """
+    bert_kwargs = bert_kwargs or {}
+    model = make_encoder(encoder, dim)
+    warm_src, warm_tgt, _ = make_corpus(200, seed=seed + 1)
+    align(warm_src, warm_tgt, mode, model, bert_kwargs)
+
+    src_sents, tgt_sents, gold = make_corpus(size, seed=seed)
+    baseline_rss = _rss_mb()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        aligner = align(src_sents, tgt_sents, mode, model, bert_kwargs)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, aligner.stage_stats, aligner.result)
+        del aligner
+    seconds, stages, result = best
+    peak = peak_rss()
+
+    record = {
+        "size": size,
+        "mode": mode,
+        "src_sents": len(src_sents),
+        "tgt_sents": len(tgt_sents),
+        "beads": len(result),
+        "seconds": round(seconds, 4),
+        "sents_per_sec": round((len(src_sents) + len(tgt_sents)) / seconds, 1),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak / MB, 1) if peak is not None else None,
+        "stages": {name: {"seconds": stage["seconds"], "cells": stage["cells"]}
+                   for name, stage in stages.items()},
+    }
+    if score:
+        scores = score_multiple(gold_list=[gold], test_list=[result])
+        record["f1_strict"] = round(scores["f1_strict"], 4)
+        record["f1_lax"] = round(scores["f1_lax"], 4)
+    return record
+
+
+def run_suite(sizes, modes, isolate=True, **case_kwargs):
+    """Run every (size, mode) case, each in a fresh process unless isolate is False."""
+    results = []
+    for size in sizes:
+        for mode in modes:
+            print(f"Benchmarking {mode} on {size} sentences ...", file=sys.stderr)
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    record = pool.submit(run_case, size, mode, **case_kwargs).result()
+            else:
+                record = run_case(size, mode, **case_kwargs)
+            results.append(record)
+            print(f"  {record['sents_per_sec']:.0f} sents/s, peak RSS {record['peak_rss_mb']} MB",
+                  file=sys.stderr)
+    return results
+
+
+def environment():
+    """Machine and code version the results were measured on."""
+    import numba
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__,
+    }
+
+
+def compare(baseline, current, threshold=0.1, min_stage_seconds=MIN_STAGE_SECONDS):
+    """
+    Cases of current that got worse than in baseline by more than
+    threshold (a fraction): lower throughput, higher peak RSS or slower
+    stages. Cases missing from either side are ignored.
+    Returns:
+        regressions: list of dicts with size, mode, metric, baseline,
+                     current and change (relative).
+    """
+    base = {(r["size"], r["mode"]): r for r in baseline["results"]}
+    regressions = []
+
+    def check(record, metric, old, new, higher_is_better=False):
+        if old is None or new is None or old <= 0:
+            return
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append({"size": record["size"], "mode": record["mode"], "metric": metric,
+                                "baseline": old, "current": new, "change": round(change, 4)})
+
+    for record in current["results"]:
+        old = base.get((record["size"], record["mode"]))
+        if old is None:
+            continue
+        check(record, "sents_per_sec", old["sents_per_sec"], record["sents_per_sec"], higher_is_better=True)
+        check(record, "peak_rss_mb", old["peak_rss_mb"], record["peak_rss_mb"])
+        for name, stage in record["stages"].items():
+            old_stage = old["stages"].get(name)
+            if old_stage and old_stage["seconds"] >= min_stage_seconds:
+                check(record, "stages.{}.seconds".format(name), old_stage["seconds"], stage["seconds"])
+    return regressions
+
+
+def print_results(results):
+    stage_names = list(dict.fromkeys(name for r in results for name in r["stages"]))
+    print(f"{'size':>8} | {'mode':>13} | {'sents/s':>9} | {'peak RSS':>9} | "
+          + " | ".join(f"{name:>10}" for name in stage_names))
+    for r in results:
+        stages = " | ".join(f"{r['stages'][name]['seconds']:>9.3f}s" if name in r["stages"] else f"{'-':>10}"
+                            for name in stage_names)
+        peak = f"{r['peak_rss_mb']:>6.0f} MB" if r["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(f"{r['size']:>8} | {r['mode']:>13} | {r['sents_per_sec']:>9.0f} | {peak} | {stages}")
+
+
+def print_regressions(regressions, threshold):
+    if not regressions:
+        print(f"\nNo regressions above {threshold:.0%}.")
+        return
+    print(f"\n{len(regressions)} regressions above {threshold:.0%}:")
+    for r in regressions:
+        print(f"  {r['size']:>8} {r['mode']:>13} {r['metric']}: {r['baseline']} -> {r['current']} "
+              f"({r['change']:+.1%})")
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alignment throughput, stage latency and peak memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Source sentences per synthetic corpus, up to 1000000 (default: 1000 10000)")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=DEFAULT_MODES,
+                        help="Alignment modes to compare (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per case, fastest kept (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0)")
+    parser.add_argument("--encoder", choices=["mock", "labse"], default="mock",
+                        help="Sentence encoder (default: mock, runs offline)")
+    parser.add_argument("--dim", type=int, default=64, help="Mock encoder dimension (default: 64)")
+    parser.add_argument("--max-align", type=int, default=5, help="Bertalign max_align (default: 5)")
+    parser.add_argument("--top-k", type=int, default=3, help="Bertalign top_k (default: 3)")
+    parser.add_argument("--win", type=int, default=5, help="Bertalign second-pass window (default: 5)")
+    parser.add_argument("--score", action="store_true", help="Also score F1 against the planted beads")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="Run every case in this process (peak RSS is then cumulative)")
+    parser.add_argument("-o", "--output", type=Path, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="Earlier results to check for regressions")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change flagged as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (load_results(path) for path in args.compare)
+        print_results(current["results"])
+        regressions = compare(baseline, current, args.threshold)
+        print_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    bert_kwargs = {"max_align": args.max_align, "top_k": args.top_k, "win": args.win}
+    results = run_suite(args.sizes, args.modes, isolate=not args.no_isolate, seed=args.seed,
+                        repeat=args.repeat, encoder=args.encoder, dim=args.dim, score=args.score,
+                        bert_kwargs=bert_kwargs)
+    report = {
+        "environment": environment(),
+        "config": {"encoder": args.encoder, "dim": args.dim, "seed": args.seed, "repeat": args.repeat,
+                   **bert_kwargs},
+        "results": results,
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to: {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        regressions = compare(load_results(args.baseline), report, args.threshold)
+        print_regressions(regressions, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
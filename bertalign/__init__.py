@@ -5,12 +5,20 @@ Bertalign initialization
 __author__ = "Jason (bfsujason@163.com)"
 __version__ = "1.1.0"
 
-from bertalign.encoder import Encoder
-
 # See other cross-lingual embedding models at
 # https://www.sbert.net/docs/pretrained_models.html
 
 model_name = "LaBSE"
-model = Encoder(model_name)
 
-from bertalign.aligner import Bertalign
+# The encoder and the aligner (which needs it) are loaded on first access,
+# so that tools using only the utilities (e.g. bertalign.jsonl) start fast.
+def __getattr__(name):
+    global model, Bertalign
+    if name == "model":
+        from bertalign.encoder import Encoder
+        model = Encoder(model_name)
+        return model
+    if name == "Bertalign":
+        from bertalign.aligner import Bertalign
+        return Bertalign
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -1,7 +1,8 @@
 import numpy as np
 
-from bertalign import model
 from bertalign.corelib import *
+from bertalign.instrument import StageStats
+from bertalign.preprocess import preprocess
 from bertalign.utils import *
 
 class Bertalign:
@@ -16,7 +17,21 @@ class Bertalign:
                  len_penalty=True,
                  is_split=False,
                  min_win_size=250,
-                 percent=0.06
+                 percent=0.06,
+                 hierarchical=False,
+                 unit_size=20,
+                 src_units=None,
+                 tgt_units=None,
+                 linear_memory=False,
+                 search="full",
+                 beam_size=32,
+                 adaptive_win=False,
+                 split_workers=None,
+                 splitter="auto",
+                 src_lang=None,
+                 tgt_lang=None,
+                 workspace=None,
+                 encoder=None,
                ):
 
         self.max_align = max_align
@@ -27,18 +42,25 @@ class Bertalign:
         self.len_penalty = len_penalty
         self.min_win_size = min_win_size
         self.percent = percent
-        
-        src = clean_text(src)
-        tgt = clean_text(tgt)
-        src_lang = detect_lang(src)
-        tgt_lang = detect_lang(tgt)
-        
-        if is_split:
-            src_sents = src.splitlines()
-            tgt_sents = tgt.splitlines()
-        else:
-            src_sents = split_sents(src, src_lang)
-            tgt_sents = split_sents(tgt, tgt_lang)
+        self.hierarchical = hierarchical
+        self.unit_size = unit_size
+        self.linear_memory = linear_memory
+        self.search = search
+        self.beam_size = beam_size
+        self.adaptive_win = adaptive_win
+        if linear_memory and search != "full":
+            raise ValueError("linear_memory only supports search='full'")
+
+        # Time, cells and memory of each stage, see stage_stats.
+        self._stats = StageStats()
+
+        with self._stats.stage("split", cat="preprocess") as counters:
+            src_sents, tgt_sents, src_lang, tgt_lang = preprocess(src, tgt, is_split=is_split,
+                                                                  workers=split_workers,
+                                                                  splitter=splitter,
+                                                                  src_lang=src_lang,
+                                                                  tgt_lang=tgt_lang)
+            counters["cells"] = len(src_sents) + len(tgt_sents)
  
         src_num = len(src_sents)
         tgt_num = len(tgt_sents)
@@ -49,9 +71,16 @@ class Bertalign:
         print("Source language: {}, Number of sentences: {}".format(src_lang, src_num))
         print("Target language: {}, Number of sentences: {}".format(tgt_lang, tgt_num))
 
-        print("Embedding source and target text using {} ...".format(model.model_name))
-        src_vecs, src_lens = model.transform(src_sents, max_align - 1)
-        tgt_vecs, tgt_lens = model.transform(tgt_sents, max_align - 1)
+        # Any object with model_name and transform(sents, num_overlaps)
+        # can stand in for the LaBSE encoder (e.g. a mock in benchmarks).
+        if encoder is None:
+            from bertalign import model as encoder
+        print("Embedding source and target text using {} ...".format(encoder.model_name))
+        # Cells: overlap strings encoded, one per sentence and overlap level
+        with self._stats.stage("encode_src", cells=src_num * (max_align - 1), cat="encoder"):
+            src_vecs, src_lens = encoder.transform(src_sents, max_align - 1)
+        with self._stats.stage("encode_tgt", cells=tgt_num * (max_align - 1), cat="encoder"):
+            tgt_vecs, tgt_lens = encoder.transform(tgt_sents, max_align - 1)
 
         char_ratio = np.sum(src_lens[0,]) / np.sum(tgt_lens[0,])
 
@@ -66,17 +95,167 @@ class Bertalign:
         self.char_ratio = char_ratio
         self.src_vecs = src_vecs
         self.tgt_vecs = tgt_vecs
+
+        # Memoized first-pass anchors and second-pass band scores,
+        # reused when the second pass is rerun with other parameters.
+        self._first_pass_cache = {}
+        self._band_cache = None
+
+        # DP and top-k buffers, shared with other aligners when a workspace
+        # is passed in (e.g. one per process for all the parts of a book).
+        self.workspace = workspace if workspace is not None else Workspace()
+
+        # Size of the last second-pass band, next to the size a fixed
+        # window of self.win would have given (see adaptive_win).
+        self.band_stats = None
+
+        # Coarse units (paragraphs, pages, ...) for hierarchical alignment.
+        if hierarchical:
+            self.src_bounds = find_unit_bounds(src_num, unit_size, src_units)
+            self.tgt_bounds = find_unit_bounds(tgt_num, unit_size, tgt_units)
         
     def align_sents(self):
 
-        print("Performing first-step alignment ...")
-        D, I = find_top_k_sents(self.src_vecs[0,:], self.tgt_vecs[0,:], k=self.top_k)
+        if self.hierarchical:
+            print("Performing unit-level alignment ...")
+        else:
+            print("Performing first-step alignment ...")
+        first_alignment, margins = self._get_first_pass()
+
+        print("Performing second-step alignment ...")
+        second_alignment = self._second_pass(self.src_vecs, self.tgt_vecs,
+                                             self.src_lens, self.tgt_lens,
+                                             first_alignment, self.max_align, self.win,
+                                             self.skip, self.margin, self.len_penalty,
+                                             margins=margins,
+                                             min_windows=self._unit_windows(first_alignment, self.win))
+        if self.adaptive_win:
+            print("Second-pass band: {} cells ({} with a fixed window)".format(
+                self.band_stats["band_area"], self.band_stats["fixed_band_area"]))
+
+        print("Finished! Successfully aligning {} {} sentences to {} {} sentences\n".format(self.src_num, self.src_lang, self.tgt_num, self.tgt_lang))
+        self.result = second_alignment
+
+    @property
+    def stage_stats(self):
+        """
+        Per-stage statistics of this aligner: split, encode_src, encode_tgt,
+        top_k, first_pass, first_back_track, band_scores (sweeps),
+        second_pass and back_track. See bertalign.instrument.StageStats.
+        Cells are sentences for split, overlap strings for encoding,
+        similarities for top_k, DP cells for the passes and beads for
+        the back-tracks.
+        """
+        return self._stats.as_dict()
+
+    def first_pass(self, top_k=None, min_win_size=None, percent=None):
+        """
+        Get the first-pass anchors (unit-level anchors in hierarchical mode).
+        They only depend on top_k, min_win_size and percent, so they are
+        computed once per combination and reused by later second passes.
+        Parameters left as None take the aligner's values.
+        """
+        return self._get_first_pass(top_k, min_win_size, percent)[0]
+
+    def _get_first_pass(self, top_k=None, min_win_size=None, percent=None):
+        top_k = self.top_k if top_k is None else top_k
+        min_win_size = self.min_win_size if min_win_size is None else min_win_size
+        percent = self.percent if percent is None else percent
+
+        key = (top_k, min_win_size, percent)
+        if key not in self._first_pass_cache:
+            if self.hierarchical:
+                anchors, margins = self._align_units(top_k, min_win_size, percent), None
+            else:
+                anchors, margins = self._first_pass(self.src_vecs, self.tgt_vecs, top_k, min_win_size, percent)
+            self._first_pass_cache[key] = (anchors, margins)
+        anchors, margins = self._first_pass_cache[key]
+        # find_second_search_path adjusts the anchors in place.
+        return list(anchors), margins
+
+    def second_pass(self, max_align=None, win=None, skip=None, margin=None, len_penalty=None, **first_pass_args):
+        """
+        Rerun the second pass with other parameters on the memoized
+        first-pass anchors, e.g. for a parameter sweep. The band similarity
+        scores are memoized as well, keyed by (max_align, win, margin), so
+        changing only skip or len_penalty just reruns the DP recursion.
+        The memoized scores are two float32 arrays of shape
+        (src_num + 1, w, num_align_types): 8 * num_align_types bytes per
+        cell of the band table, 2 * num_align_types times the DP cost
+        table (about 150 MB for 100k sentences, win 5 and max_align 5).
+        They stay alive until the next band or clear_caches().
+        Parameters left as None take the aligner's values; first_pass_args
+        (top_k, min_win_size, percent) select the first-pass anchors.
+        Returns:
+            alignment: list of beads, like self.result.
+        """
+        max_align = self.max_align if max_align is None else max_align
+        win = self.win if win is None else win
+        skip = self.skip if skip is None else skip
+        margin = self.margin if margin is None else margin
+        len_penalty = self.len_penalty if len_penalty is None else len_penalty
+        if max_align > self.max_align:
+            raise ValueError("max_align cannot exceed the value used for encoding ({})".format(self.max_align))
+
+        first_alignment, margins = self._get_first_pass(**first_pass_args)
+        min_windows = self._unit_windows(first_alignment, win)
+        src_vecs = self.src_vecs[:max_align - 1]
+        tgt_vecs = self.tgt_vecs[:max_align - 1]
+        src_lens = self.src_lens[:max_align - 1]
+        tgt_lens = self.tgt_lens[:max_align - 1]
+        if self.linear_memory or self.search != "full":
+            return self._second_pass(src_vecs, tgt_vecs, src_lens, tgt_lens, first_alignment,
+                                     max_align, win, skip, margin, len_penalty, margins=margins,
+                                     min_windows=min_windows)
+
+        align_types = get_alignment_types(max_align)
+        w, path = self._search_path(first_alignment, margins, win, self.src_num, self.tgt_num,
+                                    min_windows=min_windows)
+        band_key = (path.tobytes(), max_align, margin)
+        area = self.band_stats["band_area"]
+        if self._band_cache is None or self._band_cache[0] != band_key:
+            self._band_cache = None  # release the old scores before computing new ones
+            with self._stats.stage("band_scores", cells=area, cat="dp"):
+                sims, penalties = second_pass_scores(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                                     w, path, align_types, self.char_ratio, margin=margin)
+            self._band_cache = (band_key, sims, penalties)
+        _, sims, penalties = self._band_cache
+        with self._stats.stage("second_pass", cells=area, cat="dp"):
+            pointers = second_pass_align_scored(sims, penalties, w, path, align_types, skip,
+                                                len_penalty=len_penalty, workspace=self.workspace)
+        with self._stats.stage("back_track", cat="dp") as counters:
+            alignment = second_back_track(self.src_num, self.tgt_num, pointers, path, align_types)
+            counters["cells"] = len(alignment)
+        return alignment
+
+    def clear_caches(self, first_pass=True):
+        """
+        Drop the band scores memoized by second_pass and, unless first_pass
+        is False, the memoized first-pass anchors: to free their memory
+        once a sweep is done, or to time them again.
+        """
+        self._band_cache = None
+        if first_pass:
+            self._first_pass_cache = {}
+
+    def _first_pass(self, src_vecs, tgt_vecs, top_k, min_win_size, percent):
+        src_num = src_vecs.shape[1]
+        tgt_num = tgt_vecs.shape[1]
+        with self._stats.stage("top_k", cells=src_num * tgt_num, cat="faiss"):
+            D, I = find_top_k_sents(src_vecs[0,:], tgt_vecs[0,:], k=top_k, workspace=self.workspace)
         first_alignment_types = get_alignment_types(2) # 0-1, 1-0, 1-1
-        first_w, first_path = find_first_search_path(self.src_num, self.tgt_num,
-                                                      min_win_size=self.min_win_size,
-                                                      percent=self.percent)
-        first_pointers = first_pass_align(self.src_num, self.tgt_num, first_w, first_path, first_alignment_types, D, I)
-        first_alignment = first_back_track(self.src_num, self.tgt_num, first_pointers, first_path, first_alignment_types)
+        with self._stats.stage("first_pass", cat="dp") as counters:
+            first_w, first_path = find_first_search_path(src_num, tgt_num,
+                                                          min_win_size=min_win_size,
+                                                          percent=percent,
+                                                          workspace=self.workspace)
+            counters["cells"] = get_band_area(first_path)
+            first_pointers = first_pass_align(src_num, tgt_num, first_w, first_path, first_alignment_types, D, I,
+                                              workspace=self.workspace)
+        with self._stats.stage("first_back_track", cat="dp") as counters:
+            first_alignment = first_back_track(src_num, tgt_num, first_pointers, first_path, first_alignment_types)
+            margins = find_anchor_margins(first_alignment, D, I)
+            counters["cells"] = len(first_alignment)
 
         # Handle empty first alignment
         # if not first_alignment:
@@ -87,17 +266,87 @@ class Bertalign:
         #     # Add final bead to cover all sentences
         #     first_alignment.append((self.src_num, self.tgt_num))
 
-        print("Performing second-step alignment ...")
-        second_alignment_types = get_alignment_types(self.max_align)
-        second_w, second_path = find_second_search_path(first_alignment, self.win, self.src_num, self.tgt_num)
-        second_pointers = second_pass_align(self.src_vecs, self.tgt_vecs, self.src_lens, self.tgt_lens,
-                                            second_w, second_path, second_alignment_types,
-                                            self.char_ratio, self.skip, margin=self.margin, len_penalty=self.len_penalty)
-        second_alignment = second_back_track(self.src_num, self.tgt_num, second_pointers, second_path, second_alignment_types)
+        return first_alignment, margins
+
+    def _second_pass(self, src_vecs, tgt_vecs, src_lens, tgt_lens, first_alignment,
+                     max_align, win, skip, margin, len_penalty, margins=None, min_windows=None):
+        src_num = src_vecs.shape[1]
+        tgt_num = tgt_vecs.shape[1]
+        second_alignment_types = get_alignment_types(max_align)
+        second_w, second_path = self._search_path(first_alignment, margins, win, src_num, tgt_num,
+                                                  min_windows=min_windows)
+        area = self.band_stats["band_area"]
+        if self.linear_memory:
+            # Back-tracking is interleaved with the divide and conquer.
+            with self._stats.stage("second_pass", cells=area, cat="dp"):
+                return second_pass_align_linear(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                                second_w, second_path, second_alignment_types,
+                                                self.char_ratio, skip, margin=margin, len_penalty=len_penalty)
+        with self._stats.stage("second_pass", cells=area, cat="dp"):
+            second_pointers = second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                                second_w, second_path, second_alignment_types,
+                                                self.char_ratio, skip, margin=margin, len_penalty=len_penalty,
+                                                search=self.search, beam_size=self.beam_size,
+                                                workspace=self.workspace)
+        with self._stats.stage("back_track", cat="dp") as counters:
+            second_alignment = second_back_track(src_num, tgt_num, second_pointers, second_path,
+                                                 second_alignment_types)
+            counters["cells"] = len(second_alignment)
+        return second_alignment
+
+    def _search_path(self, first_alignment, margins, win, src_num, tgt_num, min_windows=None):
+        """
+        Build the second-pass search path around the first-pass anchors,
+        with one window per anchor if adaptive_win is set or min_windows
+        (one lower bound per anchor) is given, and record the band size in
+        self.band_stats.
+        """
+        if not self.adaptive_win and min_windows is None:
+            w, path = find_second_search_path(first_alignment, win, src_num, tgt_num)
+            area = get_band_area(path)
+            self.band_stats = {"band_area": area, "fixed_band_area": area}
+            return w, path
+        if self.adaptive_win:
+            windows = find_adaptive_windows(first_alignment, margins, win)
+        else:
+            windows = [win] * len(first_alignment)
+        if min_windows is not None:
+            windows = np.maximum(windows, min_windows).tolist()
+        _, fixed_path = find_second_search_path(list(first_alignment), win, src_num, tgt_num)
+        w, path = find_second_search_path(first_alignment, windows, src_num, tgt_num)
+        self.band_stats = {"band_area": get_band_area(path),
+                           "fixed_band_area": get_band_area(fixed_path)}
+        return w, path
+
+    def _unit_windows(self, first_alignment, win):
+        """
+        In hierarchical mode, the smallest second-pass window of each unit
+        anchor (see find_unit_windows), else None.
+        """
+        if not self.hierarchical:
+            return None
+        return find_unit_windows(first_alignment, self.tgt_bounds, win)
+
+    def _align_units(self, top_k, min_win_size, percent):
+        """
+        Align pooled unit embeddings and turn the unit beads into
+        sentence-level anchors that constrain the second pass.
+        """
+        num_overlaps = self.max_align - 1
+        src_unit_vecs, src_unit_lens = pool_unit_vecs(self.src_vecs, self.src_lens, self.src_bounds, num_overlaps)
+        tgt_unit_vecs, tgt_unit_lens = pool_unit_vecs(self.tgt_vecs, self.tgt_lens, self.tgt_bounds, num_overlaps)
+        print("Source units: {}, Target units: {}".format(src_unit_vecs.shape[1], tgt_unit_vecs.shape[1]))
+
+        unit_first_alignment, unit_margins = self._first_pass(src_unit_vecs, tgt_unit_vecs, top_k, min_win_size, percent)
+        if not unit_first_alignment:
+            unit_first_alignment, unit_margins = [(src_unit_vecs.shape[1], tgt_unit_vecs.shape[1])], None
+        unit_alignment = self._second_pass(src_unit_vecs, tgt_unit_vecs,
+                                           src_unit_lens, tgt_unit_lens,
+                                           unit_first_alignment, self.max_align, self.win,
+                                           self.skip, self.margin, self.len_penalty,
+                                           margins=unit_margins)
+        return find_unit_anchors(unit_alignment, self.src_bounds, self.tgt_bounds)
 
-        print("Finished! Successfully aligning {} {} sentences to {} {} sentences\n".format(self.src_num, self.src_lang, self.tgt_num, self.tgt_lang))
-        self.result = second_alignment
-    
     def print_sents(self):
         for bead in (self.result):
             src_line = self._get_line(bead[0], self.src_sents)
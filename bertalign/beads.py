@@ -0,0 +1,205 @@
+"""
+Compact alignment records.
+
+A full record, main.py's default output, holds a copy of every chunk of
+the bead and the joined source and target texts. A compact record keeps
+only the bead's index arrays and the chunk_ids of its chunks:
+
+    {"part", "src_indices", "tgt_indices", "src_ids", "tgt_ids", "alignment_type"}
+
+BeadJoiner looks the chunks up in the input chunks file to rebuild texts
+or full records on demand. iter_alignments reads either format, or a
+binary store (see bertalign.store), and always yields records with the
+keys of a full one, so tools do not need to know which one they got.
+Compact records come as LazyRecord views, which only join the texts and
+chunk dicts that are read; chunk_ids gives the chunk_ids of a side of
+any record without decoding its chunks.
+"""
+
+import json
+from collections.abc import Mapping
+from pathlib import Path
+
+from bertalign.jsonl import INT, iter_jsonl, load_table
+
+COMPACT, FULL = "compact", "full"
+
+
+def compact_bead(part, src_indices, tgt_indices, src_data, tgt_data):
+    """Compact record of a bead, whose indices point into src_data / tgt_data."""
+    return {
+        'part': part,
+        'src_indices': list(src_indices),
+        'tgt_indices': list(tgt_indices),
+        'src_ids': [src_data[idx]['chunk_id'] for idx in src_indices],
+        'tgt_ids': [tgt_data[idx]['chunk_id'] for idx in tgt_indices],
+        'alignment_type': f"{len(src_indices)}-{len(tgt_indices)}",
+    }
+
+
+def is_compact(record):
+    return 'src_ids' in record and 'src_text' not in record
+
+
+def chunk_ids(record, side):
+    """chunk_ids of the 'src' or 'tgt' side of a full, compact or lazy record."""
+    if isinstance(record, LazyRecord):
+        return record.compact[side + '_ids']
+    if side + '_ids' in record:
+        return record[side + '_ids']
+    return [chunk['chunk_id'] for chunk in record.get(side + '_chunks', [])]
+
+
+class BeadJoiner:
+    """
+    Resolves the chunk_ids of compact records against a chunks file.
+
+    The chunks are held as a columnar table (see bertalign.jsonl), so a
+    text or chunk dict is only decoded when it is asked for.
+    Args:
+        chunks_path: str or Path. JSONL file with one chunk per line,
+                     each with a unique integer chunk_id, as main.py
+                     and compact_bead expect.
+    """
+    def __init__(self, chunks_path):
+        self._table = load_table(chunks_path)
+        if self._table.kinds.get('chunk_id') != INT or not self._table.present('chunk_id').all():
+            raise ValueError("Every chunk in {} needs an integer chunk_id".format(chunks_path))
+        ids = self._table.ints('chunk_id').tolist()
+        self._rows = dict(zip(ids, range(len(ids))))
+        if len(self._rows) != len(ids):
+            raise ValueError("Duplicate chunk_id in {}".format(chunks_path))
+
+    def row(self, chunk_id):
+        try:
+            return self._rows[chunk_id]
+        except KeyError:
+            raise KeyError("Unknown chunk_id {!r}".format(chunk_id))
+
+    def text(self, chunk_ids):
+        """Texts of the chunks joined with spaces, as in a full record."""
+        return ' '.join(self._table.get('text', self.row(chunk_id)) for chunk_id in chunk_ids)
+
+    def chunks(self, chunk_ids):
+        """Chunk dicts, as stored in the src_chunks / tgt_chunks of a full record."""
+        chunks = []
+        for chunk_id in chunk_ids:
+            row = self.row(chunk_id)
+            chunks.append({name: self._table.get(name, row) for name in self._table.fields
+                           if self._table.present(name)[row]})
+        return chunks
+
+    def join(self, record):
+        """
+        Full record of a compact one. Keys other than the compact ones
+        (e.g. validation results) are kept, after the bead fields.
+        """
+        full = {
+            'part': record['part'],
+            'src_indices': record['src_indices'],
+            'tgt_indices': record['tgt_indices'],
+            'src_text': self.text(record['src_ids']),
+            'tgt_text': self.text(record['tgt_ids']),
+            'src_chunks': self.chunks(record['src_ids']),
+            'tgt_chunks': self.chunks(record['tgt_ids']),
+            'alignment_type': record['alignment_type'],
+        }
+        for key, value in record.items():
+            if key not in full and key not in ('src_ids', 'tgt_ids'):
+                full[key] = value
+        return full
+
+
+_JOINED = {
+    'src_text': lambda joiner, record: joiner.text(record['src_ids']),
+    'tgt_text': lambda joiner, record: joiner.text(record['tgt_ids']),
+    'src_chunks': lambda joiner, record: joiner.chunks(record['src_ids']),
+    'tgt_chunks': lambda joiner, record: joiner.chunks(record['tgt_ids']),
+}
+_FULL_KEYS = ('part', 'src_indices', 'tgt_indices', 'src_text', 'tgt_text',
+              'src_chunks', 'tgt_chunks', 'alignment_type')
+
+
+class LazyRecord(Mapping):
+    """
+    Read-only full record of a compact one, with the keys and key order of
+    BeadJoiner.join. A text or chunk list is joined the first time it is
+    read and then kept, so a tool that only reads, say, the validation
+    and the chunk_ids of a bead never decodes a chunk.
+    Use dict(record) for a plain, JSON-serializable full record.
+    Args:
+        compact: dict. Compact record.
+        joiner: BeadJoiner.
+    """
+    __slots__ = ('compact', '_joiner', '_joined')
+
+    def __init__(self, compact, joiner):
+        self.compact = compact
+        self._joiner = joiner
+        self._joined = {}
+
+    def __getitem__(self, key):
+        if key in _JOINED:
+            if key not in self._joined:
+                self._joined[key] = _JOINED[key](self._joiner, self.compact)
+            return self._joined[key]
+        if key in ('src_ids', 'tgt_ids'):
+            raise KeyError(key)
+        return self.compact[key]
+
+    def __iter__(self):
+        yield from _FULL_KEYS
+        for key in self.compact:
+            if key not in _FULL_KEYS and key not in ('src_ids', 'tgt_ids'):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "LazyRecord({!r})".format(self.compact)
+
+
+def find_chunks_file(alignments_path):
+    """
+    Input chunks file of an experiment, from the metadata.json next to
+    its alignment file, or None if there is none.
+    """
+    metadata_path = Path(alignments_path).with_name("metadata.json")
+    if not metadata_path.exists():
+        return None
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("input_file")
+
+
+def iter_alignments(path, chunks_path=None, on_error=None):
+    """
+    Stream the alignments of a full or compact JSONL file, or of an
+    alignment store, as full records. Compact records are yielded as
+    LazyRecord views, joined field by field as they are read.
+    Args:
+        path: str or Path. Alignment JSONL file or store directory.
+        chunks_path: str or Path. Input chunks file, needed for compact
+                     records (default: found with find_chunks_file).
+        on_error: callable(line_num, error), see iter_jsonl.
+    Yields:
+        record: dict, or LazyRecord for a compact record.
+    """
+    from bertalign.store import open_store  # the store builds on this module
+    store = open_store(path)
+    if store is not None:
+        yield from store
+        return
+
+    joiner = None
+    for record in iter_jsonl(path, on_error=on_error):
+        if is_compact(record):
+            if joiner is None:
+                if chunks_path is None:
+                    chunks_path = find_chunks_file(path)
+                if chunks_path is None:
+                    raise ValueError("{} holds compact records, but no chunks file was given "
+                                     "or found in its metadata.json".format(path))
+                joiner = BeadJoiner(chunks_path)
+            record = LazyRecord(record, joiner)
+        yield record
@@ -4,6 +4,59 @@ import numpy as np
 import numba as nb
 from sys import platform
 
+# Cells scoring below this are unreachable. Compare against it rather than
+# against -inf, which fastmath allows numba to optimize away.
+DEAD_SCORE = -1e30
+
+class Workspace:
+    """
+    Buffers for the DP tables, search paths and top-k outputs, plus the
+    FAISS index, reused across successive alignments (the parts of a book,
+    the points of a sweep). A buffer only grows when a call needs more
+    room than any before, so a long run settles on a fixed set of arrays
+    instead of allocating and freeing large tables for every part.
+    Callers get views of the leading elements, which are not cleared.
+    """
+    def __init__(self):
+        self._buffers = {}
+        self._index = None
+
+    def array(self, name, shape, dtype):
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            # Grow geometrically, so that slowly growing parts do not
+            # reallocate every time.
+            capacity = size
+            if buffer is not None and buffer.dtype == dtype:
+                capacity = max(size, buffer.size + buffer.size // 2)
+            # Free the old buffer before allocating the new one
+            buffer = self._buffers[name] = None
+            buffer = self._buffers[name] = np.empty(capacity, dtype=dtype)
+        return buffer[:size].reshape(shape)
+
+    def flat_index(self, dim):
+        """An empty inner-product FAISS index of dimension dim."""
+        if self._index is None or self._index.d != dim:
+            self._index = faiss.IndexFlatIP(dim)
+        else:
+            self._index.reset()
+        return self._index
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def release(self):
+        self._buffers.clear()
+        self._index = None
+
+def _buffer(workspace, name, shape, dtype):
+    if workspace is None:
+        return np.empty(shape, dtype=dtype)
+    return workspace.array(name, shape, dtype)
+
 def second_back_track(i, j, pointers, search_path, a_types):
     alignment = []
     while ( 1 ):
@@ -21,7 +74,6 @@ def second_back_track(i, j, pointers, search_path, a_types):
         if i == 0 and j == 0:
             return alignment[::-1]
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
 def second_pass_align(src_vecs,
                       tgt_vecs,
                       src_lens,
@@ -32,7 +84,10 @@ def second_pass_align(src_vecs,
                       char_ratio,
                       skip,
                       margin=False,
-                      len_penalty=False):
+                      len_penalty=False,
+                      search="full",
+                      beam_size=32,
+                      workspace=None):
     """
     Perform the second-pass alignment to extract m-n bitext segments.
     Args:
@@ -46,14 +101,61 @@ def second_pass_align(src_vecs,
         char_ratio: float. Source to target length ratio.
         skip: float. Cost for instertion and deletion.
         margin: boolean. True if choosing modified cosine similarity score.
+        search: str. "full" fills the whole banded DP table. "beam" keeps only
+                the best beam_size cells of each row, which is faster but
+                may miss the optimal path.
+        beam_size: int. Number of cells kept per row in beam search.
+        workspace: Workspace. Buffers for the DP tables (default: new arrays).
     Returns:
         pointers: numpy array recording best alignments for each DP cell.
     """
-    # Intialize cost and backpointer matrix
+    if search == "full":
+        beam_size = 0
+    elif search != "beam":
+        raise ValueError("Unknown search mode: {}".format(search))
+    elif beam_size < 1:
+        raise ValueError("beam_size must be >= 1")
+    rows = src_vecs.shape[1] + 1
+    cost = _buffer(workspace, "cost", (rows, w), np.float32)
+    pointers = _buffer(workspace, "pointers", (rows, w), np.uint8)
+    _second_pass_fill(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                      char_ratio, skip, margin, len_penalty, beam_size, cost, pointers)
+    if beam_size > 0:
+        # Fall back to the exact search if the beam lost every path to the end cell.
+        src_len = src_vecs.shape[1]
+        tgt_len = tgt_vecs.shape[1]
+        if pointers[src_len][tgt_len - search_path[src_len][0]] >= align_types.shape[0]:
+            print("Warning: beam search found no complete path, falling back to full search.")
+            _second_pass_fill(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                              char_ratio, skip, margin, len_penalty, 0, cost, pointers)
+    return pointers
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _second_pass_fill(src_vecs,
+                      tgt_vecs,
+                      src_lens,
+                      tgt_lens,
+                      w,
+                      search_path,
+                      align_types,
+                      char_ratio,
+                      skip,
+                      margin,
+                      len_penalty,
+                      beam_size,
+                      cost,
+                      pointers):
+    """
+    Fill the second-pass DP table (see second_pass_align) into cost and
+    pointers, of shape (src_len + 1, w). Only the cells of the band are
+    written, and only those are read.
+    Rows are pruned to their best beam_size cells if beam_size > 0.
+    """
     src_len = src_vecs.shape[1]
     tgt_len = tgt_vecs.shape[1]
-    cost = np.zeros((src_len + 1, w), dtype=nb.float32)
-    pointers = np.zeros((src_len + 1, w), dtype=nb.uint8)
+    cost[0][0] = 0
+    pointers[0][0] = 0
+    max_a2 = np.max(align_types[:, 1])
   
     for i in range(src_len + 1):
         i_start = search_path[i][0]
@@ -77,21 +179,11 @@ def second_pass_align(src_vecs,
                     continue
                 prev_j_offset = prev_j - prev_i_start
                 score = cost[prev_i][prev_j_offset]
-
-                if a_1 == 0 or a_2 == 0:  # deletion or insertion
-                    cur_score = skip
-                else:
-                    cur_score = calculate_similarity_score(src_vecs,
-                                                           tgt_vecs,
-                                                           i, j, a_1, a_2, 
-                                                           src_len, tgt_len,
-                                                           margin=margin)
-                    if len_penalty:
-                        penalty = calculate_length_penalty(src_lens, tgt_lens, i, j,
-                                                           a_1, a_2, char_ratio)
-                        cur_score *= penalty
-        
-                score += cur_score
+                if score < DEAD_SCORE: # unreachable or pruned cell
+                    continue
+                score += calculate_bead_score(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                              i, j, a_1, a_2, src_len, tgt_len,
+                                              char_ratio, skip, margin, len_penalty)
                 if score > best_score:
                     best_score = score
                     best_a = a
@@ -101,10 +193,452 @@ def second_pass_align(src_vecs,
             j_offset = j - i_start
             cost[i][j_offset] = best_score
             pointers[i][j_offset] = best_a
-      
+
+        # Keep only the best cells of the row in beam search. Cells too far
+        # left to reach the next row are dropped first, so that every kept
+        # cell can be extended. The last row is never pruned.
+        if beam_size > 0 and i < src_len:
+            first_live = max(i_start, search_path[i + 1][0] - max_a2)
+            for j in range(i_start, first_live):
+                cost[i][j - i_start] = -np.inf
+            live_start = first_live - i_start
+            num_live = i_end - first_live + 1
+            if num_live > beam_size:
+                row = cost[i, live_start:live_start + num_live]
+                threshold = np.partition(row, num_live - beam_size)[num_live - beam_size]
+                for j_offset in range(live_start, live_start + num_live):
+                    if cost[i][j_offset] < threshold:
+                        cost[i][j_offset] = -np.inf
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def second_pass_scores(src_vecs,
+                       tgt_vecs,
+                       src_lens,
+                       tgt_lens,
+                       w,
+                       search_path,
+                       align_types,
+                       char_ratio,
+                       margin=False):
+    """
+    Precompute the similarity and length penalty of every bead in the
+    second-pass band, so that the DP can be rerun with other skip and
+    len_penalty values without touching the embeddings.
+    Args:
+        See second_pass_align.
+    Returns:
+        sims: numpy array of shape (src_len + 1, w, num_align_types).
+        penalties: numpy array of shape (src_len + 1, w, num_align_types).
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    num_types = align_types.shape[0]
+    sims = np.zeros((src_len + 1, w, num_types), dtype=np.float32)
+    penalties = np.zeros((src_len + 1, w, num_types), dtype=np.float32)
+
+    for i in range(src_len + 1):
+        i_start = search_path[i][0]
+        i_end = search_path[i][1]
+        for j in range(i_start, i_end + 1):
+            j_offset = j - i_start
+            for a in range(num_types):
+                a_1 = align_types[a][0]
+                a_2 = align_types[a][1]
+                if a_1 == 0 or a_2 == 0 or a_1 > i or a_2 > j:
+                    continue
+                sims[i][j_offset][a] = calculate_similarity_score(src_vecs,
+                                                                  tgt_vecs,
+                                                                  i, j, a_1, a_2,
+                                                                  src_len, tgt_len,
+                                                                  margin=margin)
+                penalties[i][j_offset][a] = calculate_length_penalty(src_lens, tgt_lens, i, j,
+                                                                     a_1, a_2, char_ratio)
+    return sims, penalties
+
+def second_pass_align_scored(sims,
+                             penalties,
+                             w,
+                             search_path,
+                             align_types,
+                             skip,
+                             len_penalty=False,
+                             workspace=None):
+    """
+    Perform the second-pass alignment from precomputed bead scores.
+    Gives the same pointers as second_pass_align for the same band.
+    Args:
+        sims, penalties: numpy arrays from second_pass_scores.
+        w, search_path, align_types, skip, len_penalty, workspace: see second_pass_align.
+    Returns:
+        pointers: numpy array recording best alignments for each DP cell.
+    """
+    rows = sims.shape[0]
+    cost = _buffer(workspace, "cost", (rows, w), np.float32)
+    pointers = _buffer(workspace, "pointers", (rows, w), np.uint8)
+    _second_pass_scored_fill(sims, penalties, search_path, align_types, skip, len_penalty, cost, pointers)
     return pointers
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _second_pass_scored_fill(sims,
+                             penalties,
+                             search_path,
+                             align_types,
+                             skip,
+                             len_penalty,
+                             cost,
+                             pointers):
+    src_len = sims.shape[0] - 1
+    cost[0][0] = 0
+    pointers[0][0] = 0
+
+    for i in range(src_len + 1):
+        i_start = search_path[i][0]
+        i_end = search_path[i][1]
+        for j in range(i_start, i_end + 1):
+            if i + j == 0:
+                continue
+            j_offset = j - i_start
+            best_score = -np.inf
+            best_a = -1
+            for a in range(align_types.shape[0]):
+                a_1 = align_types[a][0]
+                a_2 = align_types[a][1]
+                prev_i = i - a_1
+                prev_j = j - a_2
+                if prev_i < 0 or prev_j < 0:
+                    continue
+                prev_i_start = search_path[prev_i][0]
+                prev_i_end = search_path[prev_i][1]
+                if prev_j < prev_i_start or prev_j > prev_i_end:
+                    continue
+                score = cost[prev_i][prev_j - prev_i_start]
+                if score < DEAD_SCORE:
+                    continue
+                if a_1 == 0 or a_2 == 0:
+                    cur_score = skip
+                else:
+                    cur_score = sims[i][j_offset][a]
+                    if len_penalty:
+                        cur_score *= penalties[i][j_offset][a]
+                score += cur_score
+                if score > best_score:
+                    best_score = score
+                    best_a = a
+            cost[i][j_offset] = best_score
+            pointers[i][j_offset] = best_a
+
+def second_pass_align_linear(src_vecs,
+                             tgt_vecs,
+                             src_lens,
+                             tgt_lens,
+                             w,
+                             search_path,
+                             align_types,
+                             char_ratio,
+                             skip,
+                             margin=False,
+                             len_penalty=False,
+                             max_rows=256):
+    """
+    Perform the second-pass alignment with memory linear in the number of rows.
+    Hirschberg-style divide and conquer: a forward and a backward DP meet in
+    the middle row to find one bead of the optimal path, and the two halves
+    are solved recursively. Sub-problems of at most max_rows rows are solved
+    with a backpointer table, so peak memory is O(max_rows * w) instead of
+    O(src_len * w). Each level of recursion recomputes the band once, so the
+    extra compute is about log2(src_len / max_rows) band passes.
+    Args:
+        src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+        char_ratio, skip, margin, len_penalty: see second_pass_align.
+        max_rows: int. Largest sub-problem solved with a backpointer table.
+    Returns:
+        alignment: list of beads, in the same format as second_back_track.
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    ring = int(np.max(align_types[:, 0])) + 1
+    max_rows = max(max_rows, ring)
+    alignment = []
+
+    def solve(r0, c0, r1, c1):
+        if r0 == r1 and c0 == c1:
+            return
+        if r1 - r0 < max_rows:
+            pointers = np.zeros((r1 - r0 + 1, w), dtype=np.uint8)
+            _band_forward(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                          char_ratio, skip, margin, len_penalty, r0, c0, r1, c1, ring, pointers)
+            alignment.extend(_sub_back_track(r0, c0, r1, c1, pointers, search_path, align_types))
+            return
+        mid = (r0 + r1 + 1) // 2
+        forward = _band_forward(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                                char_ratio, skip, margin, len_penalty, r0, c0, mid - 1, c1, ring,
+                                np.zeros((0, 0), dtype=np.uint8))
+        backward = _band_backward(src_vecs, tgt_vecs, src_lens, tgt_lens, w, search_path, align_types,
+                                  char_ratio, skip, margin, len_penalty, mid, c0, r1, c1, ring)
+        p_i, p_j, q_i, q_j, a = _find_crossing(src_vecs, tgt_vecs, src_lens, tgt_lens, search_path, align_types,
+                                               char_ratio, skip, margin, len_penalty,
+                                               forward, backward, r0, c0, mid, r1, c1, ring)
+        if a < 0:
+            raise ValueError("No alignment path found between ({}, {}) and ({}, {})".format(r0, c0, r1, c1))
+        solve(r0, c0, p_i, p_j)
+        alignment.append(_make_bead(q_i, q_j, align_types[a][0], align_types[a][1]))
+        solve(q_i, q_j, r1, c1)
+
+    solve(0, 0, src_len, tgt_len)
+    return alignment
+
+def _make_bead(i, j, s, t):
+    src_range = [i - offset - 1 for offset in range(s)][::-1]
+    tgt_range = [j - offset - 1 for offset in range(t)][::-1]
+    return (src_range, tgt_range)
+
+def _sub_back_track(r0, c0, i, j, pointers, search_path, a_types):
+    alignment = []
+    while i != r0 or j != c0:
+        j_offset = j - search_path[i][0]
+        a = pointers[i - r0][j_offset]
+        s = a_types[a][0]
+        t = a_types[a][1]
+        alignment.append(_make_bead(i, j, s, t))
+        i = i-s
+        j = j-t
+    return alignment[::-1]
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _band_forward(src_vecs,
+                  tgt_vecs,
+                  src_lens,
+                  tgt_lens,
+                  w,
+                  search_path,
+                  align_types,
+                  char_ratio,
+                  skip,
+                  margin,
+                  len_penalty,
+                  r0, c0, r1, c1,
+                  ring,
+                  pointers):
+    """
+    Forward DP from cell (r0, c0) over rows r0..r1 and columns c0..c1.
+    Only the last ring rows of the cost matrix are kept (row i at i % ring).
+    Backpointers are recorded if pointers has room for rows r0..r1.
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    record = pointers.shape[0] > 0
+    cost = np.full((ring, w), -np.inf, dtype=np.float32)
+
+    for i in range(r0, r1 + 1):
+        cost[i % ring, :] = -np.inf
+        i_start = search_path[i][0]
+        j_start = max(i_start, c0)
+        j_end = min(search_path[i][1], c1)
+        for j in range(j_start, j_end + 1):
+            j_offset = j - i_start
+            if i == r0 and j == c0:
+                cost[i % ring][j_offset] = 0
+                continue
+            best_score = -np.inf
+            best_a = -1
+            for a in range(align_types.shape[0]):
+                a_1 = align_types[a][0]
+                a_2 = align_types[a][1]
+                prev_i = i - a_1
+                prev_j = j - a_2
+                if prev_i < r0 or prev_j < c0:
+                    continue
+                prev_i_start = search_path[prev_i][0]
+                prev_i_end = search_path[prev_i][1]
+                if prev_j < prev_i_start or prev_j > prev_i_end:
+                    continue
+                score = cost[prev_i % ring][prev_j - prev_i_start]
+                if score < DEAD_SCORE:
+                    continue
+                score += calculate_bead_score(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                              i, j, a_1, a_2, src_len, tgt_len,
+                                              char_ratio, skip, margin, len_penalty)
+                if score > best_score:
+                    best_score = score
+                    best_a = a
+            cost[i % ring][j_offset] = best_score
+            if record:
+                pointers[i - r0][j_offset] = best_a
+
+    return cost
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _band_backward(src_vecs,
+                   tgt_vecs,
+                   src_lens,
+                   tgt_lens,
+                   w,
+                   search_path,
+                   align_types,
+                   char_ratio,
+                   skip,
+                   margin,
+                   len_penalty,
+                   r0, c0, r1, c1,
+                   ring):
+    """
+    Backward DP towards cell (r1, c1) over rows r1..r0 and columns c1..c0.
+    Only the last ring rows computed (rows r0..r0+ring-1) are kept.
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    cost = np.full((ring, w), -np.inf, dtype=np.float32)
+
+    for i in range(r1, r0 - 1, -1):
+        cost[i % ring, :] = -np.inf
+        i_start = search_path[i][0]
+        j_start = max(i_start, c0)
+        j_end = min(search_path[i][1], c1)
+        for j in range(j_end, j_start - 1, -1):
+            j_offset = j - i_start
+            if i == r1 and j == c1:
+                cost[i % ring][j_offset] = 0
+                continue
+            best_score = -np.inf
+            for a in range(align_types.shape[0]):
+                a_1 = align_types[a][0]
+                a_2 = align_types[a][1]
+                next_i = i + a_1
+                next_j = j + a_2
+                if next_i > r1 or next_j > c1:
+                    continue
+                next_i_start = search_path[next_i][0]
+                next_i_end = search_path[next_i][1]
+                if next_j < next_i_start or next_j > next_i_end:
+                    continue
+                score = cost[next_i % ring][next_j - next_i_start]
+                if score < DEAD_SCORE:
+                    continue
+                score += calculate_bead_score(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                              next_i, next_j, a_1, a_2, src_len, tgt_len,
+                                              char_ratio, skip, margin, len_penalty)
+                if score > best_score:
+                    best_score = score
+            cost[i % ring][j_offset] = best_score
+
+    return cost
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _find_crossing(src_vecs,
+                   tgt_vecs,
+                   src_lens,
+                   tgt_lens,
+                   search_path,
+                   align_types,
+                   char_ratio,
+                   skip,
+                   margin,
+                   len_penalty,
+                   forward,
+                   backward,
+                   r0, c0, mid, r1, c1,
+                   ring):
+    """
+    Find the bead of the optimal path that crosses into row mid,
+    i.e. the segment from a cell above mid to a cell at or below mid.
+    Returns:
+        p_i, p_j, q_i, q_j, a: start cell, end cell and alignment type
+                               (a is -1 if no path exists).
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    best_score = -np.inf
+    best = (0, 0, 0, 0, -1)
+    for q_i in range(mid, min(mid + ring - 1, r1 + 1)):
+        q_i_start = search_path[q_i][0]
+        j_start = max(q_i_start, c0)
+        j_end = min(search_path[q_i][1], c1)
+        for q_j in range(j_start, j_end + 1):
+            tail = backward[q_i % ring][q_j - q_i_start]
+            if tail < DEAD_SCORE:
+                continue
+            for a in range(align_types.shape[0]):
+                a_1 = align_types[a][0]
+                a_2 = align_types[a][1]
+                p_i = q_i - a_1
+                p_j = q_j - a_2
+                if p_i >= mid or p_i < r0 or p_j < c0:
+                    continue
+                p_i_start = search_path[p_i][0]
+                if p_j < p_i_start or p_j > search_path[p_i][1]:
+                    continue
+                score = forward[p_i % ring][p_j - p_i_start] + tail
+                score += calculate_bead_score(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                              q_i, q_j, a_1, a_2, src_len, tgt_len,
+                                              char_ratio, skip, margin, len_penalty)
+                if score > best_score:
+                    best_score = score
+                    best = (p_i, p_j, q_i, q_j, a)
+    return best
+
+def get_alignment_score(alignment,
+                        src_vecs,
+                        tgt_vecs,
+                        src_lens,
+                        tgt_lens,
+                        char_ratio,
+                        skip,
+                        margin=False,
+                        len_penalty=False):
+    """
+    Calculate the second-pass DP score of a complete alignment path.
+    Args:
+        alignment: list of beads, as returned by second_back_track.
+        Other args: see second_pass_align.
+    Returns:
+        score: float. Sum of the bead scores along the path.
+    """
+    src_len = src_vecs.shape[1]
+    tgt_len = tgt_vecs.shape[1]
+    score = 0.0
+    i, j = 0, 0
+    for src_bead, tgt_bead in alignment:
+        i += len(src_bead)
+        j += len(tgt_bead)
+        score += calculate_bead_score(src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                      i, j, len(src_bead), len(tgt_bead), src_len, tgt_len,
+                                      char_ratio, skip, margin, len_penalty)
+    return score
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def calculate_bead_score(src_vecs,
+                         tgt_vecs,
+                         src_lens,
+                         tgt_lens,
+                         src_idx,
+                         tgt_idx,
+                         src_overlap,
+                         tgt_overlap,
+                         src_len,
+                         tgt_len,
+                         char_ratio,
+                         skip,
+                         margin,
+                         len_penalty):
+    """
+    Calculate the score of the bitext segment ending at cell (src_idx, tgt_idx).
+    """
+    if src_overlap == 0 or tgt_overlap == 0:  # deletion or insertion
+        cur_score = skip
+    else:
+        cur_score = calculate_similarity_score(src_vecs,
+                                               tgt_vecs,
+                                               src_idx, tgt_idx,
+                                               src_overlap, tgt_overlap,
+                                               src_len, tgt_len,
+                                               margin=margin)
+        if len_penalty:
+            penalty = calculate_length_penalty(src_lens, tgt_lens, src_idx, tgt_idx,
+                                               src_overlap, tgt_overlap, char_ratio)
+            cur_score *= penalty
+    return cur_score
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
 def calculate_similarity_score(src_vecs,
                                tgt_vecs,
                                src_idx,
@@ -139,7 +673,7 @@ def calculate_similarity_score(src_vecs,
 
     return similarity
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
 def calculate_neighbor_similarity(vec, overlap, sent_idx, sent_len, db):
     left_idx = sent_idx - overlap
     right_idx = sent_idx + 1
@@ -162,7 +696,7 @@ def calculate_neighbor_similarity(vec, overlap, sent_idx, sent_len, db):
     
     return neighbor_ave_sim
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
 def calculate_length_penalty(src_lens,
                              tgt_lens,
                              src_idx,
@@ -191,7 +725,7 @@ def calculate_length_penalty(src_lens,
     length_penalty = np.log2(1 + min_len / max_len)
     return length_penalty
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
 def nb_dot(x, y):
     return np.dot(x,y)
 
@@ -201,12 +735,20 @@ def find_second_search_path(align, w, src_len, tgt_len):
     The indices along X-axis and Y-axis must be consecutive.
     Args:
         align: list of tuples. First-pass alignment results.
-        w: int. Predefined window size for the second path.
+        w: int. Predefined window size for the second path, or a list with
+           one window per bead of align (see find_adaptive_windows).
         src_len: int. Number of source sentences.
         tgt_len: int. Number of target sentences.
     Returns:
         path: numpy array. Search path for the second-pass alignment.
     """
+    if np.isscalar(w):
+        windows = [w] * len(align)
+    else:
+        windows = list(w)
+        if len(windows) != len(align):
+            raise ValueError("Got {} windows for {} beads".format(len(windows), len(align)))
+
     # Ajust the first-alignment result
     # so that the last bead is (src_len, tgt_len).
     last_bead_src = align[-1][0]
@@ -214,7 +756,11 @@ def find_second_search_path(align, w, src_len, tgt_len):
     if last_bead_src != src_len:
         if last_bead_tgt == tgt_len:
             align.pop()
+            end_w = windows.pop()
+        else:
+            end_w = windows[-1]
         align.append((src_len, tgt_len))
+        windows.append(end_w)
     else:
         if last_bead_tgt != tgt_len:
             align.pop()
@@ -226,11 +772,11 @@ def find_second_search_path(align, w, src_len, tgt_len):
     prev_src, prev_tgt = 0, 0
     path = []
     max_w = -np.inf
-    for src, tgt in align:
+    for (src, tgt), bead_w in zip(align, windows):
         # Limit the search path in a rectangle with the width
         # along the Y axis being (upper_bound - lower_bound).
-        lower_bound = max(0, prev_tgt - w)
-        upper_bound = min(tgt_len, tgt + w)
+        lower_bound = max(0, prev_tgt - bead_w)
+        upper_bound = min(tgt_len, tgt + bead_w)
         path.extend([(lower_bound, upper_bound) for id in range(prev_src+1, src+1)])
         prev_src, prev_tgt = src, tgt
         width = upper_bound - lower_bound
@@ -239,6 +785,64 @@ def find_second_search_path(align, w, src_len, tgt_len):
     path = [path[0]] + path # add the search path for row 0
     return max_w + 1, np.array(path)
 
+def find_anchor_margins(align, D, I):
+    """
+    Measure how clearly each first-pass anchor beats the other candidates.
+    Args:
+        align: list of tuples. First-pass alignment results.
+        D: numpy array. Similarity score matrix from find_top_k_sents.
+        I: numpy array. Target index matrix from find_top_k_sents.
+    Returns:
+        margins: numpy array. For each anchor, its similarity minus the best
+                 similarity of another top-k candidate of the same source.
+    """
+    margins = np.zeros(len(align))
+    for k, (src, tgt) in enumerate(align):
+        row_d = D[src - 1]
+        row_i = I[src - 1]
+        hit = row_i == tgt - 1
+        others = row_d[~hit & (row_i >= 0)]
+        score = row_d[hit].max() if hit.any() else 0.0
+        margins[k] = score - (others.max() if len(others) else 0.0)
+    return margins
+
+def find_adaptive_windows(align, margins, win, min_win=None, max_win=None, margin_scale=0.1):
+    """
+    Choose the second-pass window of each first-pass bead from local evidence.
+    Anchors that clearly beat the other candidates and follow closely on the
+    previous anchor get narrow windows. Weak anchors and anchors after long
+    unanchored stretches get wider ones.
+    Args:
+        align: list of tuples. First-pass alignment results.
+        margins: numpy array from find_anchor_margins, or None if unknown.
+        win: int. Window of an anchor with no margin and no gap.
+        min_win: int. Smallest window (default: win // 2, at least 1).
+        max_win: int. Largest window (default: 2 * win).
+        margin_scale: float. Margin at which an anchor is fully trusted.
+    Returns:
+        windows: list of int, one per bead of align.
+    """
+    min_win = max(1, win // 2) if min_win is None else min_win
+    max_win = 2 * win if max_win is None else max_win
+    windows = []
+    prev_src, prev_tgt = 0, 0
+    for k, (src, tgt) in enumerate(align):
+        if margins is None:
+            confidence = 0.5
+        else:
+            confidence = min(max(margins[k] / margin_scale, 0.0), 1.0)
+        gap = max(src - prev_src, tgt - prev_tgt) - 1
+        bead_w = int(np.ceil(min_win + (win - min_win) * (1 - confidence))) + max(gap, 0) // 2
+        windows.append(min(max(bead_w, min_win), max_win))
+        prev_src, prev_tgt = src, tgt
+    return windows
+
+def get_band_area(search_path):
+    """
+    Count the DP cells inside a search path.
+    """
+    return int(np.sum(search_path[:, 1] - search_path[:, 0] + 1))
+
 def first_back_track(i, j, pointers, search_path, a_types):
     """
     Retrieve 1-1 alignments from the first-pass DP table.
@@ -266,14 +870,14 @@ def first_back_track(i, j, pointers, search_path, a_types):
         if i == 0 and j == 0: # if reaching the origin
             return alignment[::-1]
 
-@nb.jit(nopython=True, fastmath=True, cache=True)
 def first_pass_align(src_len,
                      tgt_len,
                      w,
                      search_path,
                      align_types,
                      dist,
-                     index
+                     index,
+                     workspace=None
                      ):
     """
     Perform the first-pass alignment to extract only 1-1 bitext segments.
@@ -285,13 +889,19 @@ def first_pass_align(src_len,
         align_types: numpy array. Alignment types for the first-pass alignment.
         dist: numpy array. Distance matrix for top-k similar vecs.
         index: numpy array. Index matrix for top-k similar vecs.
+        workspace: Workspace. Buffers for the DP tables (default: new arrays).
     Returns:
         pointers: numpy array recording best alignments for each DP cell.
     """
-    # Initialize cost and backpointer matrix.
-    cost = np.zeros((src_len + 1, 2 * w + 1), dtype=nb.float32)
-    pointers = np.zeros((src_len + 1, 2 * w + 1), dtype=nb.uint8)
-  
+    cost = _buffer(workspace, "first_cost", (src_len + 1, 2 * w + 1), np.float32)
+    pointers = _buffer(workspace, "first_pointers", (src_len + 1, 2 * w + 1), np.uint8)
+    _first_pass_fill(src_len, search_path, align_types, dist, index, cost, pointers)
+    return pointers
+
+@nb.jit(nopython=True, nogil=True, fastmath=True, cache=True)
+def _first_pass_fill(src_len, search_path, align_types, dist, index, cost, pointers):
+    cost[0][0] = 0
+    pointers[0][0] = 0
     top_k = index.shape[1]
 
     for i in range(src_len + 1):
@@ -331,12 +941,11 @@ def first_pass_align(src_len,
             cost[i][j_offset] = best_score
             pointers[i][j_offset] = best_a
 
-    return pointers
-
 def find_first_search_path(src_len,
                            tgt_len,
                            min_win_size = 250,
-                           percent=0.06):
+                           percent=0.06,
+                           workspace=None):
     """
     Find the window size and search path for the first-pass alignment.
     Args:
@@ -344,6 +953,7 @@ def find_first_search_path(src_len,
         tgt_len: int. Number of target sentences.
         min_win_size: int. Minimum window size.
         percent. float. Percent of longer sentences.
+        workspace: Workspace. Buffer for the search path (default: a new array).
     Returns:
         win_size: int. Window size along the diagonal of the DP table.
         search_path: numpy array of shape (src_len + 1, 2), containing the start
@@ -352,14 +962,12 @@ def find_first_search_path(src_len,
                      of deletions and omissions.
     """
     win_size = max(min_win_size, int(max(src_len, tgt_len) * percent))
-    search_path = []
     yx_ratio = tgt_len / src_len
-    for i in range(0, src_len + 1):
-        center = int(yx_ratio * i)
-        win_start = max(0, center - win_size)
-        win_end = min(center + win_size, tgt_len)
-        search_path.append([win_start, win_end])
-    return win_size, np.array(search_path)
+    center = (yx_ratio * np.arange(src_len + 1)).astype(np.int64)
+    search_path = _buffer(workspace, "first_path", (src_len + 1, 2), np.int64)
+    np.maximum(center - win_size, 0, out=search_path[:, 0])
+    np.minimum(center + win_size, tgt_len, out=search_path[:, 1])
+    return win_size, search_path
 
 def get_alignment_types(max_alignment_size):
     """
@@ -377,13 +985,14 @@ def get_alignment_types(max_alignment_size):
                 alignment_types.append([x, y])    
     return np.array(alignment_types)
 
-def find_top_k_sents(src_vecs, tgt_vecs, k=3):
+def find_top_k_sents(src_vecs, tgt_vecs, k=3, workspace=None):
     """
     Find the top_k similar vecs in tgt_vecs for each vec in src_vecs.
     Args:
         src_vecs: numpy array of shape (num_src_sents, embedding_size).
         tgt_vecs: numpy array of shape (num_tgt_sents, embedding_size).
         k: int. Number of most similar target sentences.
+        workspace: Workspace. Reused index and output buffers (default: new ones).
     Returns:
         D: numpy array. Similarity score matrix of shape (num_src_sents, k).
         I: numpy array. Target index matrix of shape (num_src_sents, k).
@@ -408,8 +1017,117 @@ def find_top_k_sents(src_vecs, tgt_vecs, k=3):
     #     D, I = index.search(src_vecs, k)
 
     # CPU version (active)
-    index = faiss.IndexFlatIP(embedding_size)
-    index.add(tgt_vecs)
-    D, I = index.search(src_vecs, k)
+    if workspace is None:
+        index = faiss.IndexFlatIP(embedding_size)
+        index.add(tgt_vecs)
+        return index.search(src_vecs, k)
 
+    index = workspace.flat_index(embedding_size)
+    index.add(tgt_vecs)
+    D = workspace.array("top_k_scores", (src_vecs.shape[0], k), np.float32)
+    I = workspace.array("top_k_ids", (src_vecs.shape[0], k), np.int64)
+    try:
+        D, I = index.search(src_vecs, k, D=D, I=I)
+    except TypeError:  # faiss < 1.7.3 always allocates the outputs
+        D, I = index.search(src_vecs, k)
+    index.reset()  # do not keep the target vectors alive
     return D, I
+
+def find_unit_bounds(num_sents, unit_size=20, labels=None):
+    """
+    Group consecutive sentences into coarse units for hierarchical alignment.
+    Args:
+        num_sents: int. Number of sentences.
+        unit_size: int. Number of sentences per unit if no labels are given.
+        labels: sequence of hashable unit labels, one per sentence (e.g. page
+                numbers). A new unit starts whenever the label changes.
+    Returns:
+        bounds: numpy array of shape (num_units + 1,), containing the start
+                index of each unit followed by num_sents.
+    """
+    if labels is not None:
+        if len(labels) != num_sents:
+            raise ValueError("Got {} unit labels for {} sentences".format(len(labels), num_sents))
+        starts = [i for i in range(num_sents) if i == 0 or labels[i] != labels[i - 1]]
+    else:
+        starts = list(range(0, num_sents, max(1, unit_size)))
+    return np.array(starts + [num_sents])
+
+def pool_unit_vecs(vecs, lens, bounds, num_overlaps):
+    """
+    Pool sentence embeddings and lengths into coarse unit embeddings.
+    Args:
+        vecs: numpy array of shape (max_align-1, num_sents, embedding_size).
+        lens: numpy array of shape (max_align-1, num_sents).
+        bounds: numpy array. Unit boundaries from find_unit_bounds.
+        num_overlaps: int. Number of consecutive units to pool for each layer.
+    Returns:
+        unit_vecs: numpy array of shape (num_overlaps, num_units, embedding_size).
+        unit_lens: numpy array of shape (num_overlaps, num_units).
+    """
+    starts = bounds[:-1]
+    num_units = len(starts)
+    vec_sums = np.add.reduceat(vecs[0], starts, axis=0)
+    len_sums = np.add.reduceat(lens[0], starts)
+    vec_csum = np.vstack([np.zeros((1, vecs.shape[2])), np.cumsum(vec_sums, axis=0)])
+    len_csum = np.concatenate([[0], np.cumsum(len_sums)])
+
+    unit_vecs = np.zeros((num_overlaps, num_units, vecs.shape[2]), dtype=np.float32)
+    unit_lens = np.zeros((num_overlaps, num_units), dtype=lens.dtype)
+    for overlap in range(1, num_overlaps + 1):
+        if overlap > num_units:
+            break
+        pooled = vec_csum[overlap:] - vec_csum[:-overlap]
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        unit_vecs[overlap - 1, overlap - 1:] = pooled / norms
+        unit_lens[overlap - 1, overlap - 1:] = len_csum[overlap:] - len_csum[:-overlap]
+    return unit_vecs, unit_lens
+
+def find_unit_anchors(unit_alignment, src_bounds, tgt_bounds):
+    """
+    Convert coarse unit alignments to sentence-level anchor points,
+    which can be fed to find_second_search_path.
+    Args:
+        unit_alignment: list of tuples. Alignment between units.
+        src_bounds: numpy array. Source unit boundaries.
+        tgt_bounds: numpy array. Target unit boundaries.
+    Returns:
+        anchors: list of tuples (num_src_sents, num_tgt_sents) covered
+                 at the end of each unit bead.
+    """
+    anchors = []
+    src_pos, tgt_pos = 0, 0
+    for src_units, tgt_units in unit_alignment:
+        if len(tgt_units) > 0:
+            tgt_pos = int(tgt_bounds[tgt_units[-1] + 1])
+        # Insertions are merged into the following bead,
+        # so that their target sentences stay inside the band.
+        if len(src_units) > 0:
+            src_pos = int(src_bounds[src_units[-1] + 1])
+            anchors.append((src_pos, tgt_pos))
+    if not anchors:
+        anchors.append((int(src_bounds[-1]), int(tgt_bounds[-1])))
+    return anchors
+
+def find_unit_windows(anchors, tgt_bounds, win):
+    """
+    Second-pass windows for the anchors of find_unit_anchors. An anchor
+    sits on a target unit boundary, but unit boundaries are not translation
+    equivalent: the sentence path may cross the anchor's source position
+    anywhere in the target units on either side, up to a whole unit away.
+    Each bead's window covers those units at both of its ends.
+    Args:
+        anchors: list of tuples. Sentence-level anchors from find_unit_anchors.
+        tgt_bounds: numpy array. Target unit boundaries.
+        win: int. Smallest window.
+    Returns:
+        windows: list of int, one per anchor.
+    """
+    # Lengths of the units before and after each boundary
+    unit_lens = np.concatenate(([0], np.diff(tgt_bounds), [0]))
+    units = np.searchsorted(tgt_bounds, [tgt for _, tgt in anchors])
+    reach = np.maximum(unit_lens[units], unit_lens[units + 1])
+    # A bead spans from the previous anchor, or from (0, 0), to its own
+    prev_reach = np.concatenate(([0], reach[:-1]))
+    return np.maximum(np.maximum(reach, prev_reach), win).tolist()
@@ -1,7 +1,7 @@
 import numpy as np
 
 from sentence_transformers import SentenceTransformer
-from bertalign.utils import yield_overlaps
+from bertalign.utils import encode_batches, yield_overlaps
 
 class Encoder:
     def __init__(self, model_name):
@@ -13,7 +13,7 @@ class Encoder:
         for line in yield_overlaps(sents, num_overlaps):
             overlaps.append(line)
 
-        sent_vecs = self.model.encode(overlaps)
+        sent_vecs = encode_batches(self.model, overlaps)
         embedding_dim = sent_vecs.size // (len(sents) * num_overlaps)
         sent_vecs.resize(num_overlaps, len(sents), embedding_dim)
 
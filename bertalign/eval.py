@@ -1,19 +1,31 @@
+import re
 import sys
 import numpy as np
 
 from ast import literal_eval
 from collections import defaultdict
+from itertools import chain
 
 def score_multiple(gold_list, test_list, value_for_div_by_0=0.0):
     # accumulate counts for all gold/test files
     pcounts = np.array([0, 0, 0, 0], dtype=np.int32)
     rcounts = np.array([0, 0, 0, 0], dtype=np.int32)
     for goldalign, testalign in zip(gold_list, test_list):
-        pcounts += _precision(goldalign=goldalign, testalign=testalign)
+        gold = BeadArrays.from_beads(goldalign)
+        test = BeadArrays.from_beads(testalign)
+        if gold is None or test is None:
+            # ids that are not integers: score with the reference loops
+            goldalign = gold.tolist() if gold is not None else goldalign
+            testalign = test.tolist() if test is not None else testalign
+            pcounts += _precision(goldalign=goldalign, testalign=testalign)
+            test_no_del = [(x, y) for x, y in testalign if len(x) and len(y)]
+            gold_no_del = [(x, y) for x, y in goldalign if len(x) and len(y)]
+            rcounts += _precision(goldalign=test_no_del, testalign=gold_no_del)
+            continue
+        pcounts += _precision_arrays(gold=gold, test=test)
         # recall is precision with no insertion/deletion and swap args
-        test_no_del = [(x, y) for x, y in testalign if len(x) and len(y)]
-        gold_no_del = [(x, y) for x, y in goldalign if len(x) and len(y)]
-        rcounts += _precision(goldalign=test_no_del, testalign=gold_no_del)
+        rcounts += _precision_arrays(gold=test.select(test.both_sides()),
+                                     test=gold.select(gold.both_sides()))
 
     # Compute results
     # pcounts: tpstrict,fnstrict,tplax,fnlax
@@ -60,7 +72,8 @@ def score_multiple(gold_list, test_list, value_for_div_by_0=0.0):
     
 def _precision(goldalign, testalign):
     """
-    Computes tpstrict, fpstrict, tplax, fplax for gold/test alignments
+    Computes tpstrict, fpstrict, tplax, fplax for gold/test alignments.
+    Reference implementation of _precision_arrays.
     """
     tpstrict = 0  # true positive strict counter
     tplax = 0     # true positive lax counter
@@ -104,6 +117,158 @@ def _precision(goldalign, testalign):
 
     return np.array([tpstrict, fpstrict, tplax, fplax], dtype=np.int32)
 
+class BeadArrays:
+    """
+    Alignment beads as arrays: the source ids of all beads concatenated,
+    with the start of each bead's ids in src_starts (one more entry than
+    beads), and likewise for the target side.
+    """
+    def __init__(self, src_ids, src_starts, tgt_ids, tgt_starts):
+        self.src_ids = src_ids
+        self.src_starts = src_starts
+        self.tgt_ids = tgt_ids
+        self.tgt_starts = tgt_starts
+
+    @classmethod
+    def from_beads(cls, beads):
+        """
+        Beads from a list of (src_ids, tgt_ids), or None when some id is
+        not an integer.
+        """
+        if isinstance(beads, cls):
+            return beads
+        sides = []
+        for side in (0, 1):
+            ids = [bead[side] for bead in beads]
+            lens = np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+            ids = list(chain.from_iterable(ids))
+            if not all(issubclass(t, (int, np.integer)) for t in set(map(type, ids))):
+                return None
+            try:
+                sides.append(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+            except OverflowError:
+                return None
+            sides.append(np.concatenate(([0], np.cumsum(lens))))
+        return cls(*sides)
+
+    def __len__(self):
+        return len(self.src_starts) - 1
+
+    def src_lens(self):
+        return np.diff(self.src_starts)
+
+    def tgt_lens(self):
+        return np.diff(self.tgt_starts)
+
+    def non_empty(self):
+        """Mask of the beads with ids on either side."""
+        return (self.src_lens() > 0) | (self.tgt_lens() > 0)
+
+    def both_sides(self):
+        """Mask of the beads with ids on both sides (no insertion/deletion)."""
+        return (self.src_lens() > 0) & (self.tgt_lens() > 0)
+
+    def select(self, index):
+        """The beads at index, a mask or an array of bead numbers."""
+        index = np.flatnonzero(index) if index.dtype == bool else index
+        src_ids, src_starts = _select_runs(self.src_ids, self.src_starts, index)
+        tgt_ids, tgt_starts = _select_runs(self.tgt_ids, self.tgt_starts, index)
+        return BeadArrays(src_ids, src_starts, tgt_ids, tgt_starts)
+
+    def bead_of_ids(self):
+        """Bead number of every source id and of every target id."""
+        beads = np.arange(len(self))
+        return np.repeat(beads, self.src_lens()), np.repeat(beads, self.tgt_lens())
+
+    def tolist(self):
+        return [(self.src_ids[a:b].tolist(), self.tgt_ids[c:d].tolist()) for a, b, c, d in
+                zip(self.src_starts[:-1], self.src_starts[1:], self.tgt_starts[:-1], self.tgt_starts[1:])]
+
+def _select_runs(ids, starts, index):
+    lens = starts[1:][index] - starts[:-1][index]
+    new_starts = np.concatenate(([0], np.cumsum(lens)))
+    positions = np.arange(new_starts[-1]) + np.repeat(starts[:-1][index] - new_starts[:-1], lens)
+    return ids[positions], new_starts
+
+def _is_run(ids, starts):
+    """Mask of the beads whose ids on this side are consecutive and increasing."""
+    bead = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+    breaks = (bead[1:] == bead[:-1]) & (ids[1:] - ids[:-1] != 1)
+    is_run = np.ones(len(starts) - 1, dtype=bool)
+    is_run[bead[1:][breaks]] = False
+    return is_run
+
+def _bead_keys(beads, irregular):
+    """
+    One int64 row per bead that is equal for two beads exactly when their
+    id tuples are. Beads made of runs of ids, all of them in practice, are
+    keyed by the start and length of both runs; the others by their index
+    in irregular, a dict of (src tuple, tgt tuple) -> index.
+    """
+    keys = np.zeros((len(beads), 5), dtype=np.int64)
+    for column, ids, starts in ((1, beads.src_ids, beads.src_starts), (3, beads.tgt_ids, beads.tgt_starts)):
+        lens = np.diff(starts)
+        keys[lens > 0, column] = ids[starts[:-1][lens > 0]]
+        keys[:, column + 1] = lens
+    regular = _is_run(beads.src_ids, beads.src_starts) & _is_run(beads.tgt_ids, beads.tgt_starts)
+    for i in np.flatnonzero(~regular):
+        bead = (tuple(beads.src_ids[beads.src_starts[i]:beads.src_starts[i + 1]].tolist()),
+                tuple(beads.tgt_ids[beads.tgt_starts[i]:beads.tgt_starts[i + 1]].tolist()))
+        keys[i] = (1, irregular.setdefault(bead, len(irregular)), 0, 0, 0)
+    return keys
+
+def _key_ids(keys):
+    """Number each distinct row of keys, in lexicographic order."""
+    order = np.lexsort(keys.T[::-1])
+    new = np.ones(len(keys), dtype=bool)
+    new[1:] = (keys[order[1:]] != keys[order[:-1]]).any(axis=1)
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = np.cumsum(new) - 1
+    return ids
+
+def _shared_id_pairs(test_ids, test_beads, gold_ids, gold_beads, num_gold):
+    """
+    Codes test_bead * num_gold + gold_bead of the pairs of test and gold
+    beads that share an id, by a sorted merge of the ids.
+    """
+    order = np.argsort(gold_ids, kind="stable")
+    gold_ids, gold_beads = gold_ids[order], gold_beads[order]
+    lo = np.searchsorted(gold_ids, test_ids, side="left")
+    counts = np.searchsorted(gold_ids, test_ids, side="right") - lo
+    offsets = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) + np.repeat(lo - offsets, counts)
+    return np.repeat(test_beads, counts) * num_gold + gold_beads[positions]
+
+def _precision_arrays(gold, test):
+    """
+    Computes tpstrict, fpstrict, tplax, fplax for gold/test BeadArrays,
+    exactly as _precision does.
+
+    A test bead that is not a strict match is a lax one when some gold
+    bead shares both a source and a target id with it.
+    """
+    gold = gold.select(gold.non_empty())
+    test = test.select(test.non_empty())
+
+    irregular = {}
+    key_ids = _key_ids(np.concatenate((_bead_keys(gold, irregular), _bead_keys(test, irregular))))
+    gold_key_ids, test_key_ids = key_ids[:len(gold)], key_ids[len(gold):]
+    # like _precision, count each distinct test bead once
+    test_key_ids, unique = np.unique(test_key_ids, return_index=True)
+    test = test.select(unique)
+    strict = np.isin(test_key_ids, gold_key_ids)
+
+    num_gold = max(len(gold), 1)
+    gold_src_beads, gold_tgt_beads = gold.bead_of_ids()
+    test_src_beads, test_tgt_beads = test.bead_of_ids()
+    src_pairs = _shared_id_pairs(test.src_ids, test_src_beads, gold.src_ids, gold_src_beads, num_gold)
+    tgt_pairs = _shared_id_pairs(test.tgt_ids, test_tgt_beads, gold.tgt_ids, gold_tgt_beads, num_gold)
+    lax = strict.copy()
+    lax[np.intersect1d(src_pairs, tgt_pairs) // num_gold] = True
+
+    tpstrict, tplax = int(strict.sum()), int(lax.sum())
+    return np.array([tpstrict, len(test) - tpstrict, tplax, len(test) - tplax], dtype=np.int32)
+
 def log_final_scores(res):
     print(' ---------------------------------', file=sys.stderr)
     print('|             |  Strict |    Lax  |', file=sys.stderr)
@@ -112,6 +277,18 @@ def log_final_scores(res):
     print('| F1          |   {f1_strict:.3f} |   {f1_lax:.3f} |'.format(**res), file=sys.stderr)
     print(' ---------------------------------', file=sys.stderr)
     
+def _parse_ids(field):
+    # Lists written by str(), e.g. "[3, 4]", without the cost of literal_eval
+    if field == '[]':
+        return []
+    try:
+        ids = list(map(int, field[1:-1].split(',')))
+    except ValueError:
+        ids = None
+    if ids is not None and str(ids) == field:
+        return ids
+    return literal_eval(field)
+
 def read_alignments(file):
     alignments = []
     with open(file, 'rt', encoding="utf-8") as f:
@@ -120,9 +297,40 @@ def read_alignments(file):
             if len(fields) < 2:
                 raise Exception('Got line "%s", which does not have at least two ":" separated fields' % line.strip())
             try:
-                src = literal_eval(fields[0])
-                tgt = literal_eval(fields[1])
+                src = _parse_ids(fields[0])
+                tgt = _parse_ids(fields[1])
             except:
                 raise Exception('Failed to parse line "%s"' % line.strip())
             alignments.append((src, tgt))
     return alignments
+
+# A bead file as str() writes it: "[3]:[4, 5]" lines, ids that fit in int64.
+_ID = r'-?(?:0|[1-9][0-9]{0,17})'
+_ID_LIST = r'\[(?:{0}(?:, {0})*)?\]'.format(_ID)
+_BEAD_FILE = re.compile(r'(?:{0}:{0}\n)*'.format(_ID_LIST))
+
+def read_bead_arrays(file):
+    """
+    read_alignments as BeadArrays. Files in the format bertalign writes are
+    parsed as a whole with NumPy, others line by line.
+    """
+    with open(file, 'rt', encoding="utf-8") as f:
+        text = f.read()
+    if text and not text.endswith('\n'):
+        text += '\n'
+    if not _BEAD_FILE.fullmatch(text):
+        return BeadArrays.from_beads(read_alignments(file))
+
+    chars = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    opens = np.flatnonzero(chars == ord('['))
+    closes = np.flatnonzero(chars == ord(']'))
+    commas = np.concatenate(([0], np.cumsum(chars == ord(','))))
+    lens = commas[closes] - commas[opens] + (closes > opens + 1)
+    if lens.sum():
+        ids = np.fromstring(text.translate(str.maketrans('[]:,', '    ')), dtype=np.int64, sep=' ')
+    else:
+        ids = np.zeros(0, dtype=np.int64)
+    src_lens, tgt_lens = lens[0::2], lens[1::2]
+    src_mask = np.repeat(np.tile([True, False], len(src_lens)), lens)
+    return BeadArrays(ids[src_mask], np.concatenate(([0], np.cumsum(src_lens))),
+                      ids[~src_mask], np.concatenate(([0], np.cumsum(tgt_lens))))
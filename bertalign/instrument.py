@@ -0,0 +1,98 @@
+"""
+Per-stage instrumentation of an alignment.
+
+StageStats times the named stages of a run and records, for each, the
+cells (or items) it processed and its effect on memory: the process RSS
+after it ran, its RSS growth, how much it raised the RSS high-water mark
+and, while tracemalloc is tracing, its net and peak allocations.
+
+Stages run more than once (the unit and sentence levels of hierarchical
+mode, sweeps over second_pass) accumulate counts, times and growth; the
+peaks keep their maximum. Each call is also a span of the trace when
+bertalign.tracing is enabled. Memory figures are process-wide, so stages
+overlapping in other threads (main.py --pipeline) show up in each other.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psutil
+
+from bertalign import tracing
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 ** 2
+
+
+def peak_rss():
+    """High-water mark of this process's RSS in bytes, or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageStats:
+    """
+    Per-stage counters, filled with the stage() context manager:
+
+        with stats.stage("first_pass") as counters:
+            ...
+            counters["cells"] = band_area
+
+    as_dict() gives, per stage: calls, seconds, cells, rss_mb (after the
+    last call), rss_delta_mb, rss_peak_mb and rss_peak_growth_mb, plus
+    alloc_delta_mb and alloc_peak_mb when tracemalloc was tracing.
+    """
+    def __init__(self):
+        self.stages = {}
+        self._process = psutil.Process(os.getpid())
+
+    @contextmanager
+    def stage(self, name, cells=0, cat="stage"):
+        counters = {"cells": cells}
+        tracing_malloc = tracemalloc.is_tracing()
+        if tracing_malloc:
+            alloc_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_start = self._process.memory_info().rss
+        peak_start = peak_rss()
+        start = time.perf_counter()
+        try:
+            with tracing.span(name, cat=cat) as span_args:
+                yield counters
+                span_args["cells"] = int(counters["cells"])
+        finally:
+            seconds = time.perf_counter() - start
+            rss_end = self._process.memory_info().rss
+            peak_end = peak_rss()
+
+            record = self.stages.setdefault(name, {
+                "calls": 0, "seconds": 0.0, "cells": 0,
+                "rss_mb": 0.0, "rss_delta_mb": 0.0, "rss_peak_mb": 0.0, "rss_peak_growth_mb": 0.0,
+            })
+            record["calls"] += 1
+            record["seconds"] += seconds
+            record["cells"] += int(counters["cells"])
+            record["rss_mb"] = rss_end / MB
+            record["rss_delta_mb"] += (rss_end - rss_start) / MB
+            if peak_end is not None:
+                record["rss_peak_mb"] = max(record["rss_peak_mb"], peak_end / MB)
+                record["rss_peak_growth_mb"] += (peak_end - peak_start) / MB
+            if tracing_malloc and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                record["alloc_delta_mb"] = record.get("alloc_delta_mb", 0.0) + (current - alloc_start) / MB
+                record["alloc_peak_mb"] = max(record.get("alloc_peak_mb", 0.0), (peak - alloc_start) / MB)
+
+    def as_dict(self):
+        """Stage records in the order the stages first ran, rounded for reports."""
+        return {name: {key: round(value, 4) if isinstance(value, float) else value
+                       for key, value in record.items()}
+                for name, record in self.stages.items()}
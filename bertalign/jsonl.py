@@ -0,0 +1,361 @@
+"""
+Fast loading of JSONL chunk and alignment files.
+
+iter_jsonl streams records, parsed with orjson when it is installed, and
+can keep only the fields a caller needs. load_table stores the fields of
+a whole file as columns: integers in int64 arrays, strings as one UTF-8
+buffer plus offsets. The columns are cached next to the file in a .npz
+that is rebuilt whenever the file's size or modification time changes,
+so tools that reopen the same file skip JSON parsing entirely.
+table.rows() gives the records as a lazy sequence of dicts on top of the
+columns, for code written against lists of records.
+"""
+
+import json
+import os
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CACHE_SUFFIX = ".cache.npz"
+CACHE_VERSION = 1
+
+# Column kinds: int64 values, UTF-8 strings, or any other JSON value
+# stored as its JSON text.
+INT, STR, JSON = "int", "str", "json"
+
+
+def loads(line):
+    """Parse one JSON document from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def iter_jsonl(path, fields=None, on_error=None):
+    """
+    Stream the records of a JSONL file.
+    Args:
+        path: str or Path. JSONL file.
+        fields: iterable of str. Keep only these keys (default: all).
+        on_error: callable(line_num, error) for lines that are not valid
+                  JSON. By default they are skipped silently.
+    Yields:
+        record: dict.
+    """
+    fields = None if fields is None else tuple(fields)
+    with open(path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except ValueError as e:  # json and orjson decode errors
+                if on_error is not None:
+                    on_error(line_num, e)
+                continue
+            if fields is not None:
+                record = {key: record[key] for key in fields if key in record}
+            yield record
+
+
+def load_jsonl(path, fields=None, on_error=None):
+    """Load all records of a JSONL file into a list (see iter_jsonl)."""
+    return list(iter_jsonl(path, fields=fields, on_error=on_error))
+
+
+class JsonlTable:
+    """
+    Columnar view of the records of a JSONL file.
+
+    Integer columns are int64 arrays (table.ints), string columns are
+    decoded on demand (table.strings, table.get). Keys missing from a
+    record are tracked per column, so records() gives back the original
+    dicts, restricted to the loaded fields.
+    """
+    def __init__(self, arrays, kinds, num_rows):
+        self._arrays = arrays
+        self.kinds = kinds
+        self.fields = list(kinds)
+        self.num_rows = num_rows
+
+    def __len__(self):
+        return self.num_rows
+
+    @classmethod
+    def from_records(cls, records, fields=None):
+        """Build the columns from a list of dicts."""
+        if fields is None:
+            fields = list(dict.fromkeys(key for record in records for key in record))
+        arrays = {}
+        kinds = {}
+        for name in fields:
+            present = np.fromiter((name in record for record in records), dtype=bool, count=len(records))
+            values = [record.get(name) for record in records]
+            kind = _column_kind(v for v, p in zip(values, present) if p)
+            kinds[name] = kind
+            arrays[name + ".present"] = present
+            if kind == INT:
+                arrays[name] = np.array([v if p else 0 for v, p in zip(values, present)], dtype=np.int64)
+            else:
+                if kind == JSON:
+                    values = [json.dumps(v, ensure_ascii=False) if p else "" for v, p in zip(values, present)]
+                encoded = [v.encode('utf-8') if p else b"" for v, p in zip(values, present)]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(b) for b in encoded], out=offsets[1:])
+                arrays[name + ".offsets"] = offsets
+                arrays[name + ".bytes"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(arrays, kinds, len(records))
+
+    def present(self, name):
+        """Boolean mask of the rows that have the field."""
+        return self._arrays[name + ".present"]
+
+    def ints(self, name):
+        """int64 array of an integer column (0 where the field is missing)."""
+        if self.kinds[name] != INT:
+            raise TypeError("Column {!r} holds {} values, not int".format(name, self.kinds[name]))
+        return self._arrays[name]
+
+    def offsets(self, name):
+        """Start offsets (plus the final end) of each row in a string column's buffer."""
+        return self._arrays[name + ".offsets"]
+
+    def strings(self, name):
+        """Decoded values of a string column (None where the field is missing)."""
+        present = self.present(name).tolist()
+        return [value if p else None for value, p in zip(self._decode_all(name), present)]
+
+    def column(self, name, default=None, rows=None):
+        """
+        Values of any column as a list, default where the field is missing
+        (or for every row if no record has it).
+        Args:
+            rows: int array. Only these rows, in this order (default: all).
+        """
+        num_rows = self.num_rows if rows is None else len(rows)
+        if name not in self.kinds:
+            return [default] * num_rows
+        present = self.present(name) if rows is None else self.present(name)[rows]
+        if self.kinds[name] == INT:
+            values = (self._arrays[name] if rows is None else self._arrays[name][rows]).tolist()
+        else:
+            values = self._decode_all(name, rows)
+        return [value if p else default for value, p in zip(values, present.tolist())]
+
+    def get(self, name, row):
+        """Value of one field of one row, or None if the row lacks it."""
+        if not self.present(name)[row]:
+            return None
+        kind = self.kinds[name]
+        if kind == INT:
+            return int(self._arrays[name][row])
+        offsets = self._arrays[name + ".offsets"]
+        value = self._arrays[name + ".bytes"][offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+        return loads(value) if kind == JSON else value
+
+    def row(self, row):
+        """One row as a dict, decoded on demand."""
+        return {name: self.get(name, row) for name in self.fields if self.present(name)[row]}
+
+    def rows(self, rows=None):
+        """Lazy sequence of row dicts (see TableRows)."""
+        return TableRows(self, rows)
+
+    def records(self):
+        """All rows as dicts."""
+        columns = []
+        for name in self.fields:
+            present = self.present(name).tolist()
+            if self.kinds[name] == INT:
+                values = self._arrays[name].tolist()
+            else:
+                values = self._decode_all(name)
+            columns.append((name, present, values))
+        if all(all(present) for _, present, _ in columns):
+            names = [name for name, _, _ in columns]
+            return [dict(zip(names, row)) for row in zip(*(values for _, _, values in columns))]
+        return [{name: values[i] for name, present, values in columns if present[i]}
+                for i in range(self.num_rows)]
+
+    def _decode_all(self, name, rows=None):
+        offsets = self._arrays[name + ".offsets"].tolist()
+        data = self._arrays[name + ".bytes"].tobytes()
+        rows = range(self.num_rows) if rows is None else rows.tolist()
+        values = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in rows]
+        if self.kinds[name] == JSON:
+            values = [loads(v) if v else None for v in values]
+        return values
+
+    def select(self, fields):
+        """Table restricted to the given fields (which must all be loaded)."""
+        fields = list(fields)
+        arrays = {key: array for key, array in self._arrays.items()
+                  if key.rsplit(".", 1)[0] in fields or key in fields}
+        return JsonlTable(arrays, {name: self.kinds[name] for name in fields}, self.num_rows)
+
+    def take(self, rows):
+        """Table of the given rows, in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        arrays = {}
+        for name, kind in self.kinds.items():
+            arrays[name + ".present"] = self.present(name)[rows]
+            if kind == INT:
+                arrays[name] = self._arrays[name][rows]
+                continue
+            offsets = self._arrays[name + ".offsets"]
+            lens = offsets[rows + 1] - offsets[rows]
+            new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(lens, out=new_offsets[1:])
+            positions = np.arange(new_offsets[-1]) + np.repeat(offsets[rows] - new_offsets[:-1], lens)
+            arrays[name + ".offsets"] = new_offsets
+            arrays[name + ".bytes"] = self._arrays[name + ".bytes"][positions]
+        return JsonlTable(arrays, dict(self.kinds), len(rows))
+
+    def save(self, path, meta):
+        meta = dict(meta, kinds=self.kinds, num_rows=self.num_rows, version=CACHE_VERSION)
+        meta_bytes = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+        tmp_path = str(path) + ".tmp.npz"
+        np.savez(tmp_path, __meta__=meta_bytes, **self._arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, fields=None):
+        """
+        Load a saved table, returning (table, meta). Only the arrays of
+        the requested fields are read from disk.
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(npz["__meta__"].tobytes().decode('utf-8'))
+            kinds = meta["kinds"]
+            if fields is not None:
+                kinds = {name: kinds[name] for name in fields if name in kinds}
+            arrays = {key: npz[key] for key in npz.files
+                      if key.rsplit(".", 1)[0] in kinds or key in kinds}
+        return cls(arrays, kinds, meta["num_rows"]), meta
+
+
+class TableRows(Sequence):
+    """
+    Rows of a JsonlTable as a sequence of dicts, each decoded only when it
+    is accessed, so that tools can group and index a large file from its
+    columns without building every record.
+    Args:
+        table: JsonlTable.
+        rows: int array. Row numbers, in order (default: all rows).
+    A pickled TableRows holds only its own rows, so passing a part of a
+    file to a worker process does not copy the whole table.
+    """
+    def __init__(self, table, rows=None):
+        self.table = table
+        self.rows = np.arange(len(table)) if rows is None else np.asarray(rows, dtype=np.int64)
+        self._lowered = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TableRows(self.table, self.rows[index])
+        return self.table.row(int(self.rows[index]))
+
+    def __iter__(self):
+        for row in self.rows.tolist():
+            yield self.table.row(row)
+
+    def __reduce__(self):
+        return TableRows, (self.table.take(self.rows),)
+
+    def column(self, name, default=None):
+        """Values of one field for these rows (see JsonlTable.column)."""
+        return self.table.column(name, default, self.rows)
+
+    def find(self, name, text):
+        """
+        First row whose string field contains text, ignoring case, or None.
+        The lowercased column is decoded on the first search.
+        """
+        if name not in self._lowered:
+            self._lowered[name] = [value.lower() if isinstance(value, str) else ""
+                                   for value in self.column(name)]
+        for position, value in enumerate(self._lowered[name]):
+            if text in value:
+                return self[position]
+        return None
+
+    def index_by(self, name):
+        """Mapping of each value of a field to its row (see RowIndex)."""
+        return RowIndex(self, name)
+
+
+class RowIndex(Mapping):
+    """Rows of a TableRows by the value of one field, decoded on access."""
+    def __init__(self, rows, name):
+        self._rows = rows
+        self._positions = {key: position for position, key in enumerate(rows.column(name))}
+
+    def __getitem__(self, key):
+        return self._rows[self._positions[key]]
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+def load_table(path, fields=None, cache=True):
+    """
+    Load a JSONL file as a JsonlTable, using the on-disk cache if it is fresh.
+    The cache always holds every field, so tools loading different fields
+    of the same file share it.
+    Args:
+        path: str or Path. JSONL file.
+        fields: iterable of str. Columns to load (default: all keys).
+        cache: bool. Read and write <path>.cache.npz.
+    Returns:
+        table: JsonlTable.
+    """
+    path = Path(path)
+    fields = None if fields is None else list(fields)
+    stat = path.stat()
+    key = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    cache_path = path.with_name(path.name + CACHE_SUFFIX)
+    if not cache:
+        return JsonlTable.from_records(load_jsonl(path, fields=fields), fields=fields)
+
+    if cache_path.exists():
+        try:
+            table, meta = JsonlTable.load(cache_path, fields)
+            if meta.get("version") == CACHE_VERSION and all(meta.get(k) == v for k, v in key.items()):
+                return table
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable cache, rebuild it
+
+    table = JsonlTable.from_records(load_jsonl(path))
+    try:
+        table.save(cache_path, key)
+    except OSError:
+        pass  # read-only location, work without a cache
+    if fields is not None:
+        table = table.select(name for name in fields if name in table.kinds)
+    return table
+
+
+def _column_kind(values):
+    kind = None
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            return JSON
+        value_kind = INT if isinstance(value, int) else STR
+        if kind is None:
+            kind = value_kind
+        elif kind != value_kind:
+            return JSON
+    return kind or STR
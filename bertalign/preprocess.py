@@ -0,0 +1,138 @@
+"""
+Text preprocessing for Bertalign: cleaning, language detection and
+sentence splitting of a source and target text.
+
+Sequences of sentences are passed through untouched, so their indices
+stay one-to-one with the caller's records.
+
+Splitting never joins sentences across a line break, so a cleaned text
+can be cut into batches of paragraphs, split in worker processes and
+concatenated back without changing the result.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bertalign.splitters import DEFAULT_SPLITTER, get_sentence_splitter, split_text
+from bertalign.utils import LANG, clean_text, detect_lang, normalize_lang
+
+# Texts shorter than this are split in-process:
+# starting a pool costs more than it saves.
+PARALLEL_MIN_CHARS = 200000
+
+# Batches per worker, so that uneven paragraphs still balance out.
+BATCHES_PER_WORKER = 4
+
+
+def preprocess(src, tgt, is_split=False, workers=None, min_chars=PARALLEL_MIN_CHARS,
+               splitter=DEFAULT_SPLITTER, src_lang=None, tgt_lang=None):
+    """
+    Clean both texts, detect their languages and split them into sentences.
+    Languages given by the caller are used as is, skipping detection.
+    A side given as a sequence of sentences is not cleaned or split.
+    Large texts are split in a process pool, with the source and target
+    batches running concurrently.
+    Args:
+        src: str or sequence of str. Source text or sentences.
+        tgt: str or sequence of str. Target text or sentences.
+        is_split: bool. The texts already have one sentence per line.
+        workers: int. Worker processes for large texts (default: CPU count).
+        min_chars: int. Texts shorter than this are split in-process.
+        splitter: str. Sentence splitter backend (see bertalign.splitters).
+        src_lang: str. ISO 639-1 source language code (default: detected).
+        tgt_lang: str. ISO 639-1 target language code (default: detected).
+    Returns:
+        src_sents: sequence of str. Source sentences.
+        tgt_sents: sequence of str. Target sentences.
+        src_lang: str. Source language code.
+        tgt_lang: str. Target language code.
+    """
+    sents = [None, None]
+    langs = [src_lang, tgt_lang]
+    to_split = []
+    for side, text in enumerate((src, tgt)):
+        if isinstance(text, str):
+            text = clean_text(text)
+            langs[side] = _resolve_lang(text, langs[side])
+            if is_split:
+                sents[side] = text.splitlines()
+            else:
+                to_split.append((side, text))
+        else:
+            sents[side] = text
+            if langs[side] is None:
+                langs[side] = detect_lang(_sample_sents(text))
+            else:
+                langs[side] = _resolve_lang(None, langs[side])
+
+    if to_split:
+        split = split_texts([(text, langs[side]) for side, text in to_split],
+                            workers=workers, min_chars=min_chars, splitter=splitter)
+        for (side, _), side_sents in zip(to_split, split):
+            sents[side] = side_sents
+    return sents[0], sents[1], langs[0], langs[1]
+
+
+def split_texts(texts, workers=None, min_chars=PARALLEL_MIN_CHARS, splitter=DEFAULT_SPLITTER):
+    """
+    Sentence-split several cleaned texts, in parallel where it pays off.
+    Args:
+        texts: list of (text, lang) tuples.
+        workers: int. Worker processes (default: CPU count).
+        min_chars: int. Texts shorter than this are split in-process.
+        splitter: str. Sentence splitter backend (see bertalign.splitters).
+    Returns:
+        sents: list with one list of sentences per text.
+    """
+    get_sentence_splitter(splitter)  # fail early on an unknown name
+    if workers is None:
+        workers = os.cpu_count() or 1
+    large = [len(text) >= min_chars for text, _ in texts]
+    if workers <= 1 or not any(large):
+        return [split_text(text, lang, splitter) for text, lang in texts]
+
+    # spawn: a fork of a process that runs threads (main.py --pipeline)
+    # can inherit locks held by another thread and deadlock
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Submit every batch of every text before waiting on any of them.
+        futures = []
+        for (text, lang), is_large in zip(texts, large):
+            paragraphs = text.splitlines()
+            num_batches = workers * BATCHES_PER_WORKER if is_large else 1
+            futures.append([pool.submit(_split_batch, batch, lang, splitter)
+                            for batch in _make_batches(paragraphs, num_batches)])
+        return [[sent for future in text_futures for sent in future.result()]
+                for text_futures in futures]
+
+
+def _resolve_lang(text, lang):
+    if lang is None:
+        return detect_lang(text)
+    lang = normalize_lang(lang)
+    if lang not in LANG.ISO:
+        raise ValueError("Unknown language code {!r}".format(lang))
+    return lang
+
+
+def _sample_sents(sents, max_len=200):
+    """Leading sentences, enough to fill the language detection sample."""
+    sample = []
+    length = 0
+    for sent in sents:
+        if length >= max_len:
+            break
+        if sent.strip():
+            sample.append(sent.strip())
+            length += len(sent)
+    return " ".join(sample)
+
+
+def _make_batches(paragraphs, num_batches):
+    size = max(1, -(-len(paragraphs) // num_batches))
+    return [paragraphs[i:i + size] for i in range(0, len(paragraphs), size)]
+
+
+def _split_batch(paragraphs, lang, splitter):
+    return split_text("\n".join(paragraphs), lang, splitter)
@@ -0,0 +1,144 @@
+"""
+Sentence splitter backends.
+
+A backend is a callable (text, lang) -> list of sentences, registered
+under a name with register_splitter. Backends never join sentences
+across a line break.
+
+    sentence_splitter  The sentence_splitter package (and _split_zh for
+                       Chinese). Most accurate, limited to LANG.SPLITTER.
+    regex              RegexSplitter: compiled rules with abbreviation
+                       lists. Much faster and works for any script.
+    auto               sentence_splitter where supported, regex elsewhere.
+"""
+
+import re
+
+from bertalign.utils import LANG, split_sents
+
+SPLITTERS = {}
+
+DEFAULT_SPLITTER = "auto"
+
+# Abbreviations that do not end a sentence, lower-cased and without the final period.
+DEFAULT_ABBREVIATIONS = {
+    'en': ['mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e',
+           'no', 'vol', 'ch', 'fig', 'approx', 'inc', 'ltd', 'co', 'jan', 'feb', 'mar',
+           'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec'],
+    'it': ['sig', 'sigg', 'sig.ra', 'dott', 'dott.ssa', 'prof', 'avv', 'ing', 'on', 'gen',
+           'cap', 'ecc', 'es', 'pag', 'pagg', 'cfr', 'vol', 'n', 'art', 'sec', 'ca'],
+    'de': ['z.b', 'd.h', 'u.a', 'usw', 'bzw', 'ca', 'dr', 'prof', 'hr', 'fr', 'nr', 'st',
+           'vgl', 'evtl', 'ggf', 'inkl', 'jh', 's', 'm.ü.m', 'mio', 'mrd'],
+    'fr': ['m', 'mm', 'mme', 'mlle', 'dr', 'prof', 'st', 'ste', 'etc', 'cf', 'p', 'vol',
+           'env', 'n°', 'av', 'apr', 'j.-c'],
+    'es': ['sr', 'sra', 'srta', 'dr', 'dra', 'prof', 'etc', 'pág', 'vol', 'núm', 'ej',
+           'ud', 'uds', 'av'],
+    'pt': ['sr', 'sra', 'dr', 'dra', 'prof', 'etc', 'pág', 'vol', 'nº', 'av'],
+    'nl': ['dhr', 'mevr', 'dr', 'prof', 'bijv', 'enz', 'o.a', 'ca', 'nr', 'blz'],
+}
+
+# Sentence-final punctuation of scripts that separate sentences with spaces,
+# and of CJK scripts that do not.
+_SPACED_ENDS = '.!?…؟։।॥።჻'
+_CJK_ENDS = '。！？'
+_CLOSERS = '"\'”’»)\\]）」』'
+
+_BOUNDARY = re.compile(
+    r'[{spaced}]+[{closers}]*\s+(?=\S)|[{cjk}]+[{closers}]*'.format(
+        spaced=re.escape(_SPACED_ENDS), cjk=_CJK_ENDS, closers=_CLOSERS))
+_LAST_TOKEN = re.compile(r'(\S+)$')
+
+
+def register_splitter(name):
+    """Decorator registering a splitter backend under name."""
+    def decorator(splitter):
+        SPLITTERS[name] = splitter
+        return splitter
+    return decorator
+
+
+def get_sentence_splitter(name):
+    try:
+        return SPLITTERS[name]
+    except KeyError:
+        raise ValueError("Unknown splitter {!r}, choose from {}".format(name, sorted(SPLITTERS)))
+
+
+def split_text(text, lang, splitter=DEFAULT_SPLITTER):
+    """
+    Split text into sentences with the named backend.
+    Args:
+        text: str. Cleaned text, one paragraph per line.
+        lang: str. ISO 639-1 language code.
+        splitter: str. Backend name (see SPLITTERS).
+    Returns:
+        sents: list of str.
+    """
+    return get_sentence_splitter(splitter)(text, lang)
+
+
+class RegexSplitter:
+    """
+    Rule-based splitter for any script.
+
+    A line is split after sentence-final punctuation (plus closing quotes
+    and brackets) followed by whitespace, or after a CJK full stop. A
+    period does not end a sentence after a known abbreviation or a single
+    letter, or when the next word starts in lower case.
+    Args:
+        abbreviations: dict of language code -> iterable of abbreviations
+                       (default: DEFAULT_ABBREVIATIONS).
+    """
+    def __init__(self, abbreviations=None):
+        if abbreviations is None:
+            abbreviations = DEFAULT_ABBREVIATIONS
+        self.abbreviations = {lang: frozenset(a.lower().rstrip('.') for a in words)
+                              for lang, words in abbreviations.items()}
+
+    def __call__(self, text, lang):
+        abbreviations = self.abbreviations.get(lang, frozenset())
+        sents = []
+        for line in text.splitlines():
+            sents.extend(self._split_line(line, abbreviations))
+        return sents
+
+    def _split_line(self, line, abbreviations):
+        sents = []
+        start = 0
+        for match in _BOUNDARY.finditer(line):
+            end = match.end()
+            if match.group()[0] == '.' and not self._ends_sentence(line, start, match, abbreviations):
+                continue
+            sent = line[start:end].strip()
+            if sent:
+                sents.append(sent)
+            start = end
+        sent = line[start:].strip()
+        if sent:
+            sents.append(sent)
+        return sents
+
+    @staticmethod
+    def _ends_sentence(line, start, match, abbreviations):
+        if match.end() < len(line) and line[match.end()].islower():
+            return False
+        if match.group().startswith('..'):  # ellipsis
+            return True
+        token = _LAST_TOKEN.search(line, start, match.start())
+        if token is None:
+            return True
+        word = token.group(1).lower().lstrip(_CLOSERS + '(¿¡«“‘')
+        if len(word) == 1 and word.isalpha():  # initials
+            return False
+        return word not in abbreviations
+
+
+register_splitter('sentence_splitter')(split_sents)
+register_splitter('regex')(RegexSplitter())
+
+
+@register_splitter('auto')
+def _split_auto(text, lang):
+    if lang in LANG.SPLITTER:
+        return split_sents(text, lang)
+    return SPLITTERS['regex'](text, lang)
@@ -0,0 +1,317 @@
+"""
+Binary alignment store with random access.
+
+A store is a directory of .npy arrays, opened memory-mapped, so that a
+point query touches only the pages it needs instead of parsing a whole
+alignment JSONL file:
+
+    part                    int32 per bead, index into meta["parts"]
+    src_ids, tgt_ids        chunk_ids of every bead, concatenated
+    src_indices, ...        bead indices, aligned with the chunk_ids
+    src_ids.offsets, ...    start of each bead in those arrays (plus the end)
+    src_text, tgt_text      UTF-8 blobs of the bead texts, with .offsets
+    extra                   UTF-8 JSON of the remaining keys of each record
+                            (chunks, validation...), with .offsets
+    chunk_bead, chunk_side  bead and side (0 src, 1 tgt) of each chunk_id,
+                            -1 where a chunk_id is in no bead
+    validated               bool per bead, its validation_success
+    src_validated_bead, ... per chunk_id, the bead of the highest chunk_id at
+                            or below it on that side whose bead passed
+                            validation, -1 if there is none
+    part_beads              bead ids grouped by part, cut by meta["part_offsets"]
+
+Beads keep the order of the JSONL file, so bead i is line i. Lookups by
+bead id, chunk_id and part, and of the nearest validated bead below a
+chunk_id, are all O(1).
+
+Convert a JSONL file (full or compact) with:
+
+    python -m bertalign.store alignment_results.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from bertalign.beads import chunk_ids, iter_alignments
+
+STORE_SUFFIX = ".store"
+STORE_VERSION = 2
+
+# Keys stored in their own arrays, in the order of a full record.
+_BEAD_KEYS = ('part', 'src_indices', 'tgt_indices', 'src_text', 'tgt_text')
+
+
+class AlignmentStore:
+    """
+    Read-only, memory-mapped view of a store directory (see build_store).
+    Args:
+        path: str or Path. Store directory.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError("Unsupported alignment store version in {}".format(self.path))
+        self.parts = self.meta["parts"]
+        self._part_index = {part: i for i, part in enumerate(self.parts)}
+        self._arrays = {}
+
+    def __len__(self):
+        return self.meta["num_beads"]
+
+    def __iter__(self):
+        for bead in range(len(self)):
+            yield self.bead(bead)
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.load(self.path / (name + ".npy"), mmap_mode='r')
+            self._arrays[name] = array
+        return array
+
+    def _span(self, name, bead):
+        offsets = self._array(name + ".offsets")
+        return int(offsets[bead]), int(offsets[bead + 1])
+
+    def _string(self, name, bead):
+        start, end = self._span(name, bead)
+        return self._array(name)[start:end].tobytes().decode('utf-8')
+
+    def _check(self, bead):
+        if not 0 <= bead < len(self):
+            raise IndexError("Bead {} out of range ({} beads)".format(bead, len(self)))
+
+    def part(self, bead):
+        self._check(bead)
+        return self.parts[int(self._array("part")[bead])]
+
+    def chunk_ids(self, bead, side='src'):
+        """chunk_ids of one side ('src' or 'tgt') of a bead."""
+        self._check(bead)
+        start, end = self._span(side + "_ids", bead)
+        return self._array(side + "_ids")[start:end].tolist()
+
+    def indices(self, bead, side='src'):
+        """Bead indices of one side, as in src_indices / tgt_indices."""
+        self._check(bead)
+        start, end = self._span(side + "_ids", bead)
+        return self._array(side + "_indices")[start:end].tolist()
+
+    def text(self, bead, side='src'):
+        """Text of one side of a bead."""
+        self._check(bead)
+        return self._string(side + "_text", bead)
+
+    def extra(self, bead):
+        """Keys of the record not held in their own arrays (chunks, validation...)."""
+        self._check(bead)
+        return json.loads(self._string("extra", bead))
+
+    def bead(self, bead):
+        """Full alignment record of a bead."""
+        src_ids = self.chunk_ids(bead, 'src')
+        tgt_ids = self.chunk_ids(bead, 'tgt')
+        record = {
+            'part': self.part(bead),
+            'src_indices': self.indices(bead, 'src'),
+            'tgt_indices': self.indices(bead, 'tgt'),
+            'src_text': self.text(bead, 'src'),
+            'tgt_text': self.text(bead, 'tgt'),
+        }
+        extra = self.extra(bead)
+        if 'alignment_type' not in extra:
+            extra['alignment_type'] = f"{len(src_ids)}-{len(tgt_ids)}"
+        record.update(extra)
+        return record
+
+    def bead_for_chunk(self, chunk_id, side=None):
+        """
+        Bead holding a chunk, or None if it is in no bead (or, when side
+        is given, is on the other side).
+        """
+        chunk_bead = self._array("chunk_bead")
+        if not 0 <= chunk_id < len(chunk_bead) or chunk_bead[chunk_id] < 0:
+            return None
+        if side is not None and self._array("chunk_side")[chunk_id] != (side == 'tgt'):
+            return None
+        return int(chunk_bead[chunk_id])
+
+    def validated(self, bead):
+        """Whether the bead passed validation (validation_success)."""
+        self._check(bead)
+        return bool(self._array("validated")[bead])
+
+    def validated_bead_at_or_below(self, chunk_id, side='src'):
+        """
+        Bead of the highest chunk_id <= chunk_id on one side ('src' or
+        'tgt') whose bead passed validation, or None if there is none.
+        """
+        nearest = self._array(side + "_validated_bead")
+        if chunk_id < 0 or len(nearest) == 0:
+            return None
+        bead = int(nearest[min(chunk_id, len(nearest) - 1)])
+        return bead if bead >= 0 else None
+
+    def part_beads(self, part):
+        """Bead ids of a part, in file order (empty if the part is unknown)."""
+        index = self._part_index.get(part)
+        if index is None:
+            return []
+        offsets = self.meta["part_offsets"]
+        return self._array("part_beads")[offsets[index]:offsets[index + 1]].tolist()
+
+
+def _is_store(path):
+    return (Path(path) / "meta.json").is_file()
+
+
+def open_store(path):
+    """Open a store directory, or None if path is not one."""
+    return AlignmentStore(path) if _is_store(path) else None
+
+
+class _Blob:
+    """UTF-8 strings concatenated into one buffer, with start offsets."""
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = [0]
+
+    def append(self, text):
+        self.data += text.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+
+class _Ragged:
+    """Integer lists concatenated into one array, with start offsets."""
+    def __init__(self):
+        self.values = []
+        self.offsets = [0]
+
+    def append(self, values):
+        self.values.extend(values)
+        self.offsets.append(len(self.values))
+
+
+def build_store(jsonl_path, store_path=None, chunks_path=None):
+    """
+    Convert an alignment JSONL file, full or compact, into a store.
+    Args:
+        jsonl_path: str or Path. Alignment JSONL file.
+        store_path: str or Path. Store directory (default: the JSONL path
+                    with a .store suffix). Replaced if it exists.
+        chunks_path: str or Path. Input chunks file, for compact records
+                     (see bertalign.beads.iter_alignments).
+    Returns:
+        store: AlignmentStore.
+    """
+    jsonl_path = Path(jsonl_path)
+    if store_path is None:
+        store_path = jsonl_path.with_suffix(STORE_SUFFIX)
+    store_path = Path(store_path)
+
+    parts = {}
+    bead_parts = []
+    ids = {'src': _Ragged(), 'tgt': _Ragged()}
+    indices = {'src': _Ragged(), 'tgt': _Ragged()}
+    texts = {'src': _Blob(), 'tgt': _Blob()}
+    extra = _Blob()
+    validated = []
+    for record in iter_alignments(jsonl_path, chunks_path=chunks_path):
+        bead_parts.append(parts.setdefault(record['part'], len(parts)))
+        validated.append(bool(record.get('validation', {}).get('validation_success', False)))
+        for side in ('src', 'tgt'):
+            ids[side].append(chunk_ids(record, side))
+            indices[side].append(record[side + '_indices'])
+            texts[side].append(record[side + '_text'])
+        extra.append(json.dumps({key: value for key, value in record.items()
+                                 if key not in _BEAD_KEYS and key not in ('src_ids', 'tgt_ids')},
+                                ensure_ascii=False))
+
+    num_beads = len(bead_parts)
+    bead_parts = np.array(bead_parts, dtype=np.int32)
+    arrays = {"part": bead_parts}
+    for side in ('src', 'tgt'):
+        arrays[side + "_ids"] = np.array(ids[side].values, dtype=np.int64)
+        arrays[side + "_ids.offsets"] = np.array(ids[side].offsets, dtype=np.int64)
+        arrays[side + "_indices"] = np.array(indices[side].values, dtype=np.int64)
+        arrays[side + "_text"] = np.frombuffer(bytes(texts[side].data), dtype=np.uint8)
+        arrays[side + "_text.offsets"] = np.array(texts[side].offsets, dtype=np.int64)
+    arrays["extra"] = np.frombuffer(bytes(extra.data), dtype=np.uint8)
+    arrays["extra.offsets"] = np.array(extra.offsets, dtype=np.int64)
+
+    # chunk_id -> (bead, side), dense over the chunk_id range
+    all_ids = np.concatenate([arrays["src_ids"], arrays["tgt_ids"]])
+    if len(all_ids) and all_ids.min() < 0:
+        raise ValueError("Negative chunk_id in {}".format(jsonl_path))
+    size = int(all_ids.max()) + 1 if len(all_ids) else 0
+    chunk_bead = np.full(size, -1, dtype=np.int64)
+    chunk_side = np.full(size, -1, dtype=np.int8)
+    for side_num, side in enumerate(('src', 'tgt')):
+        side_ids = arrays[side + "_ids"]
+        if len(np.unique(side_ids)) != len(side_ids) or np.any(chunk_bead[side_ids] >= 0):
+            raise ValueError("A chunk_id appears in more than one bead in {}".format(jsonl_path))
+        lengths = np.diff(arrays[side + "_ids.offsets"])
+        chunk_bead[side_ids] = np.repeat(np.arange(num_beads, dtype=np.int64), lengths)
+        chunk_side[side_ids] = side_num
+    arrays["chunk_bead"] = chunk_bead
+    arrays["chunk_side"] = chunk_side
+
+    # Nearest validated chunk_id at or below each chunk_id, per side, by a
+    # running maximum over the chunk_ids of validated beads
+    validated = np.array(validated, dtype=bool)
+    arrays["validated"] = validated
+    for side_num, side in enumerate(('src', 'tgt')):
+        hits = (chunk_side == side_num) & validated[np.maximum(chunk_bead, 0)]
+        nearest = np.maximum.accumulate(np.where(hits, np.arange(size), -1)) if size else np.zeros(0, np.int64)
+        arrays[side + "_validated_bead"] = np.where(nearest >= 0, chunk_bead[np.maximum(nearest, 0)], -1)
+
+    # Beads grouped by part, stable so that each part keeps file order
+    order = np.argsort(bead_parts, kind='stable')
+    part_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(bead_parts, minlength=len(parts)), out=part_offsets[1:])
+    arrays["part_beads"] = order.astype(np.int64)
+
+    meta = {
+        "version": STORE_VERSION,
+        "source": str(jsonl_path),
+        "num_beads": num_beads,
+        "parts": list(parts),
+        "part_offsets": part_offsets.tolist(),
+    }
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    tmp_path.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_path / (name + ".npy"), array)
+    with open(tmp_path / "meta.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    if store_path.exists():
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+    return AlignmentStore(store_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an alignment JSONL file into a binary store")
+    parser.add_argument("input_file", type=Path, help="Alignment JSONL file (full or compact)")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="Store directory (default: input_file with a .store suffix)")
+    parser.add_argument("--chunks-file", type=Path,
+                        help="Input chunks JSONL, for compact alignments "
+                             "(default: the input_file in the experiment's metadata.json)")
+    args = parser.parse_args()
+
+    store = build_store(args.input_file, args.output, args.chunks_file)
+    print(f"Wrote {len(store)} beads in {len(store.parts)} parts to {store.path}")
+
+
+if __name__ == "__main__":
+    main()
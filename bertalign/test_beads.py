@@ -0,0 +1,96 @@
+"""
+Consistency checks for compact alignment records in bertalign.beads.
+"""
+
+import json
+import os
+import tempfile
+
+from bertalign.beads import *
+
+CHUNKS = [
+    {"chunk_id": 10, "language": "en", "part": "001", "page": "1", "text": "One."},
+    {"chunk_id": 11, "language": "en", "part": "001", "text": "Two."},
+    {"chunk_id": 20, "language": "it", "part": "001", "page": "1", "text": "Uno."},
+    {"chunk_id": 21, "language": "it", "part": "001", "page": "2", "text": "Due."},
+]
+
+
+def _write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def _compact_records():
+    src, tgt = CHUNKS[:2], CHUNKS[2:]
+    records = [compact_bead('001', [0, 1], [0], src, tgt), compact_bead('001', [], [1], src, tgt)]
+    records[0]['validation'] = {'validation_success': True, 'confidence': 0.9}
+    return records
+
+
+def test_lazy_record_matches_join():
+    with tempfile.TemporaryDirectory() as tmp:
+        chunks_path = os.path.join(tmp, "chunks.jsonl")
+        _write_jsonl(chunks_path, CHUNKS)
+        joiner = BeadJoiner(chunks_path)
+        for compact in _compact_records():
+            full = joiner.join(compact)
+            lazy = LazyRecord(compact, joiner)
+            assert list(dict(lazy).items()) == list(full.items())
+            assert list(lazy) == list(full) and len(lazy) == len(full)
+            assert 'src_ids' not in lazy and lazy.get('tgt_ids') is None
+            for side in ('src', 'tgt'):
+                assert chunk_ids(lazy, side) == chunk_ids(full, side) == compact[side + '_ids']
+        assert list(full)[-1] == 'alignment_type'
+        assert list(joiner.join(_compact_records()[0]))[-1] == 'validation'
+        # Only the fields that are read get joined
+        lazy = LazyRecord(_compact_records()[0], joiner)
+        assert lazy['validation']['confidence'] == 0.9 and lazy['src_text'] == "One. Two."
+        assert set(lazy._joined) == {'src_text'}
+
+
+def test_iter_alignments_needs_chunks_for_compact_records():
+    with tempfile.TemporaryDirectory() as tmp:
+        chunks_path = os.path.join(tmp, "chunks.jsonl")
+        alignments_path = os.path.join(tmp, "alignment_results.jsonl")
+        _write_jsonl(chunks_path, CHUNKS)
+        _write_jsonl(alignments_path, _compact_records())
+        try:
+            next(iter_alignments(alignments_path))
+        except ValueError as e:
+            assert "no chunks file" in str(e)
+        else:
+            raise AssertionError("compact records were read without a chunks file")
+        joiner = BeadJoiner(chunks_path)
+        expected = [joiner.join(record) for record in _compact_records()]
+        assert [dict(r) for r in iter_alignments(alignments_path, chunks_path=chunks_path)] == expected
+        # The chunks file of metadata.json is used when none is given
+        with open(os.path.join(tmp, "metadata.json"), 'w', encoding='utf-8') as f:
+            json.dump({"input_file": chunks_path}, f)
+        assert [dict(r) for r in iter_alignments(alignments_path)] == expected
+        # Full records pass through as they are
+        _write_jsonl(alignments_path, expected)
+        assert list(iter_alignments(alignments_path)) == expected
+
+
+def test_joiner_needs_integer_chunk_ids():
+    with tempfile.TemporaryDirectory() as tmp:
+        for case, chunks in enumerate(([dict(CHUNKS[0], chunk_id="10"), CHUNKS[1]],
+                                       [{"text": "no id"}, CHUNKS[1]],
+                                       [CHUNKS[0], CHUNKS[0]])):
+            chunks_path = os.path.join(tmp, "chunks{}.jsonl".format(case))
+            _write_jsonl(chunks_path, chunks)
+            try:
+                BeadJoiner(chunks_path)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("chunks {} were accepted".format(chunks))
+
+
+if __name__ == "__main__":
+    test_lazy_record_matches_join()
+    test_iter_alignments_needs_chunks_for_compact_records()
+    test_joiner_needs_integer_chunk_ids()
+    print("OK")
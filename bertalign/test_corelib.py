@@ -0,0 +1,241 @@
+"""
+Consistency checks for the dynamic programming kernels in bertalign.corelib.
+"""
+
+import numpy as np
+
+from bertalign.corelib import *
+
+
+def _random_problem(seed, src_num=150, tgt_num=130, dim=16, max_align=5, win=5):
+    rng = np.random.default_rng(seed)
+    src_vecs = rng.standard_normal((max_align - 1, src_num, dim)).astype(np.float32)
+    tgt_vecs = rng.standard_normal((max_align - 1, tgt_num, dim)).astype(np.float32)
+    src_vecs /= np.linalg.norm(src_vecs, axis=2, keepdims=True)
+    tgt_vecs /= np.linalg.norm(tgt_vecs, axis=2, keepdims=True)
+    src_lens = rng.integers(5, 100, (max_align - 1, src_num))
+    tgt_lens = rng.integers(5, 100, (max_align - 1, tgt_num))
+    anchors = [(i, min(tgt_num, int(i * tgt_num / src_num))) for i in range(10, src_num, 10)]
+    w, path = find_second_search_path(anchors, win, src_num, tgt_num)
+    return src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, get_alignment_types(max_align)
+
+
+def test_linear_memory_second_pass_matches_full_dp():
+    for seed in range(3):
+        src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types = _random_problem(seed)
+        src_num, tgt_num = src_vecs.shape[1], tgt_vecs.shape[1]
+        pointers = second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                     1.0, -0.1, margin=True, len_penalty=True)
+        full = second_back_track(src_num, tgt_num, pointers, path, a_types)
+        for max_rows in (8, 32, 1000):
+            linear = second_pass_align_linear(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                              1.0, -0.1, margin=True, len_penalty=True, max_rows=max_rows)
+            assert sum(len(x) for x, _ in linear) == src_num
+            assert sum(len(y) for _, y in linear) == tgt_num
+            full_score = get_alignment_score(full, src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                             1.0, -0.1, margin=True, len_penalty=True)
+            linear_score = get_alignment_score(linear, src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                               1.0, -0.1, margin=True, len_penalty=True)
+            assert abs(full_score - linear_score) < 1e-4
+
+
+def test_scored_second_pass_matches_direct():
+    for seed in range(2):
+        src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types = _random_problem(seed)
+        src_num, tgt_num = src_vecs.shape[1], tgt_vecs.shape[1]
+        # Cells of the band; the rest of the pointer table is never read.
+        in_band = np.arange(w)[None, :] <= (path[:, 1] - path[:, 0])[:, None]
+        for margin in (False, True):
+            sims, penalties = second_pass_scores(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                                 1.2, margin=margin)
+            for len_penalty in (False, True):
+                for skip in (-0.1, -0.3):
+                    direct = second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                               1.2, skip, margin=margin, len_penalty=len_penalty)
+                    scored = second_pass_align_scored(sims, penalties, w, path, a_types, skip,
+                                                      len_penalty=len_penalty)
+                    assert np.array_equal(direct[in_band], scored[in_band])
+                    assert (second_back_track(src_num, tgt_num, direct, path, a_types)
+                            == second_back_track(src_num, tgt_num, scored, path, a_types))
+
+
+def test_second_pass_rerun_matches_fresh_aligner():
+    from benchmarks.synthetic import align, generate
+    doc = generate(600, seed=1)
+    aligner = align(doc, is_split=True)
+    for params in ({"win": 3}, {"win": 8, "skip": -0.2}, {"win": 8, "skip": -0.05},
+                   {"margin": False}, {"len_penalty": False}, {}):
+        assert aligner.second_pass(**params) == align(doc, is_split=True, **params).result, params
+    aligner.clear_caches()
+    assert aligner.second_pass(win=3) == align(doc, is_split=True, win=3).result
+
+
+def test_beam_search_never_beats_full_dp():
+    src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types = _random_problem(0)
+    src_num, tgt_num = src_vecs.shape[1], tgt_vecs.shape[1]
+    scores = {}
+    for search, beam_size in (("full", 0), ("beam", 4), ("beam", w)):
+        pointers = second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                     1.0, -0.1, margin=True, len_penalty=True,
+                                     search=search, beam_size=max(beam_size, 1))
+        alignment = second_back_track(src_num, tgt_num, pointers, path, a_types)
+        scores[beam_size] = get_alignment_score(alignment, src_vecs, tgt_vecs, src_lens, tgt_lens,
+                                                1.0, -0.1, margin=True, len_penalty=True)
+    assert scores[4] <= scores[0] + 1e-4
+    # A beam as wide as the band is exact.
+    assert abs(scores[w] - scores[0]) < 1e-4
+
+
+def test_adaptive_windows_shrink_confident_band():
+    src_num, tgt_num, win = 150, 130, 5
+    anchors = [(i, int(i * tgt_num / src_num)) for i in range(2, src_num, 2)]
+    _, fixed = find_second_search_path(list(anchors), win, src_num, tgt_num)
+    # A list of equal windows gives the fixed-window path.
+    _, same = find_second_search_path(list(anchors), [win] * len(anchors), src_num, tgt_num)
+    assert np.array_equal(fixed, same)
+    sure = find_adaptive_windows(anchors, np.ones(len(anchors)), win)
+    unsure = find_adaptive_windows(anchors, np.zeros(len(anchors)), win)
+    _, narrow = find_second_search_path(list(anchors), sure, src_num, tgt_num)
+    _, wide = find_second_search_path(list(anchors), unsure, src_num, tgt_num)
+    assert get_band_area(narrow) < get_band_area(fixed) == get_band_area(wide)
+    # Long stretches without anchors widen the window.
+    sparse = find_adaptive_windows(anchors[::5], np.zeros(len(anchors[::5])), win)
+    assert min(sparse[1:]) > win
+    assert all(win // 2 <= w <= 2 * win for w in sure + unsure)
+
+
+def test_unit_bounds_with_and_without_labels():
+    assert find_unit_bounds(45, unit_size=20).tolist() == [0, 20, 40, 45]
+    assert find_unit_bounds(40, unit_size=20).tolist() == [0, 20, 40]
+    assert find_unit_bounds(0, unit_size=20).tolist() == [0]
+    # A unit starts whenever the label changes, even back to an earlier one.
+    labels = ['1', '1', '2', '2', '2', '1', '3']
+    assert find_unit_bounds(7, unit_size=2, labels=labels).tolist() == [0, 2, 5, 6, 7]
+    try:
+        find_unit_bounds(5, labels=labels)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("labels of the wrong length were accepted")
+
+
+def test_pool_unit_vecs_sums_and_normalizes():
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((3, 7, 4)).astype(np.float32)
+    lens = rng.integers(1, 50, (3, 7))
+    bounds = np.array([0, 2, 5, 6, 7])
+    unit_vecs, unit_lens = pool_unit_vecs(vecs, lens, bounds, num_overlaps=3)
+    assert unit_vecs.shape == (3, 4, 4) and unit_lens.shape == (3, 4)
+    for overlap in range(1, 4):
+        for unit in range(overlap - 1, 4):
+            start, end = bounds[unit - overlap + 1], bounds[unit + 1]
+            pooled = vecs[0, start:end].sum(axis=0)
+            assert np.allclose(unit_vecs[overlap - 1, unit], pooled / np.linalg.norm(pooled), atol=1e-5)
+            assert unit_lens[overlap - 1, unit] == lens[0, start:end].sum()
+        # Overlaps that would start before the first unit stay empty.
+        assert not unit_vecs[overlap - 1, :overlap - 1].any()
+    # More overlap levels than units
+    unit_vecs, _ = pool_unit_vecs(vecs, lens, np.array([0, 7]), num_overlaps=3)
+    assert np.allclose(np.linalg.norm(unit_vecs[0, 0]), 1) and not unit_vecs[1:].any()
+
+
+def test_unit_anchors_merge_insertions():
+    src_bounds, tgt_bounds = np.array([0, 3, 6, 9]), np.array([0, 2, 4, 7, 10])
+    # 1-1, an insertion merged into the next bead, a deletion, and a
+    # trailing insertion that find_second_search_path closes.
+    unit_alignment = [([0], [0]), ([], [1]), ([1], [2]), ([2], []), ([], [3])]
+    assert find_unit_anchors(unit_alignment, src_bounds, tgt_bounds) == [(3, 2), (6, 7), (9, 7)]
+    assert find_unit_anchors([([0, 1], [0, 1, 2]), ([2], [3])], src_bounds, tgt_bounds) == [(6, 7), (9, 10)]
+    # No unit bead with source units: one anchor at the end.
+    assert find_unit_anchors([], src_bounds, tgt_bounds) == [(9, 10)]
+    assert find_unit_anchors([([], [0, 1])], src_bounds, tgt_bounds) == [(9, 10)]
+
+
+def test_unit_windows_cover_adjacent_units():
+    tgt_bounds = np.array([0, 2, 4, 14, 16])
+    anchors = [(3, 2), (6, 4), (9, 14), (12, 16)]
+    # Each bead covers the longest unit next to its own anchor and to the previous one.
+    assert find_unit_windows(anchors, tgt_bounds, 1) == [2, 10, 10, 10]
+    assert find_unit_windows(anchors, tgt_bounds, 12) == [12] * 4
+    assert find_unit_windows([(5, 0)], np.array([0]), 3) == [3]
+
+
+def test_hierarchical_band_covers_gold_and_matches_flat():
+    from benchmarks.synthetic import align, generate
+    from bertalign.eval import score_multiple
+    doc = generate(1500, seed=0)
+    flat = align(doc, is_split=True)
+    aligner = align(doc, is_split=True, hierarchical=True)
+    anchors = aligner.first_pass()
+    _, path = aligner._search_path(anchors, None, aligner.win, doc.src_num, doc.tgt_num,
+                                   min_windows=aligner._unit_windows(anchors, aligner.win))
+    # Every gold bead ends on a cell of the band.
+    src_ends = np.cumsum([len(src) for src, _ in doc.gold])
+    tgt_ends = np.cumsum([len(tgt) for _, tgt in doc.gold])
+    assert np.all((path[src_ends, 0] <= tgt_ends) & (tgt_ends <= path[src_ends, 1]))
+    flat_f1 = score_multiple([doc.gold], [flat.result])["f1_strict"]
+    assert score_multiple([doc.gold], [aligner.result])["f1_strict"] == flat_f1 > 0.99
+
+
+def test_workspace_reuse_matches_fresh_buffers():
+    workspace = Workspace()
+    # Shrinking then growing problems reuse the same, dirty buffers.
+    for seed, src_num in ((0, 150), (1, 60), (2, 200)):
+        src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types = _random_problem(seed, src_num=src_num)
+        tgt_num = tgt_vecs.shape[1]
+        results = []
+        for ws in (None, workspace):
+            pointers = second_pass_align(src_vecs, tgt_vecs, src_lens, tgt_lens, w, path, a_types,
+                                         1.0, -0.1, margin=True, len_penalty=True, workspace=ws)
+            D, I = find_top_k_sents(src_vecs[0], tgt_vecs[0], k=3, workspace=ws)
+            first_w, first_path = find_first_search_path(src_num, tgt_num, 10, 0.06, workspace=ws)
+            first = first_pass_align(src_num, tgt_num, first_w, first_path, get_alignment_types(2), D, I,
+                                     workspace=ws)
+            results.append((second_back_track(src_num, tgt_num, pointers, path, a_types),
+                            D.copy(), I.copy(),
+                            first_back_track(src_num, tgt_num, first, first_path, get_alignment_types(2))))
+        assert results[0][0] == results[1][0] and results[0][3] == results[1][3]
+        assert np.array_equal(results[0][1], results[1][1]) and np.array_equal(results[0][2], results[1][2])
+
+
+def test_kernels_recover_planted_synthetic_beads():
+    from benchmarks.synthetic import generate
+    from bertalign.eval import score_multiple
+    doc = generate(2000, dim=32, noise=0.3, drift=0.01, seed=0)
+    first_types, second_types = get_alignment_types(2), get_alignment_types(5)
+    D, I = find_top_k_sents(doc.src_vecs[0], doc.tgt_vecs[0], k=3)
+    first_w, first_path = find_first_search_path(doc.src_num, doc.tgt_num)
+    first_pointers = first_pass_align(doc.src_num, doc.tgt_num, first_w, first_path, first_types, D, I)
+    anchors = first_back_track(doc.src_num, doc.tgt_num, first_pointers, first_path, first_types)
+    w, path = find_second_search_path(anchors, 5, doc.src_num, doc.tgt_num)
+    pointers = second_pass_align(doc.src_vecs, doc.tgt_vecs, doc.src_lens, doc.tgt_lens, w, path,
+                                 second_types, doc.char_ratio, -0.1, margin=True, len_penalty=True)
+    alignment = second_back_track(doc.src_num, doc.tgt_num, pointers, path, second_types)
+    scores = score_multiple(gold_list=[doc.gold], test_list=[alignment])
+    assert scores["f1_strict"] > 0.98
+
+
+def test_kernel_alternatives_match_reference():
+    from benchmarks.kernels import make_case, run
+    cases = [make_case(300, seed) for seed in range(2)]
+    report = run(cases, repeat=1)
+    assert all(row["failures"] == 0 for row in report)
+    assert {row["kernel"] for row in report} == {"find_top_k_sents", "first_pass_align", "first_back_track",
+                                                 "second_pass_align", "second_back_track"}
+
+
+if __name__ == "__main__":
+    test_linear_memory_second_pass_matches_full_dp()
+    test_scored_second_pass_matches_direct()
+    test_second_pass_rerun_matches_fresh_aligner()
+    test_beam_search_never_beats_full_dp()
+    test_adaptive_windows_shrink_confident_band()
+    test_unit_bounds_with_and_without_labels()
+    test_pool_unit_vecs_sums_and_normalizes()
+    test_unit_anchors_merge_insertions()
+    test_unit_windows_cover_adjacent_units()
+    test_hierarchical_band_covers_gold_and_matches_flat()
+    test_workspace_reuse_matches_fresh_buffers()
+    test_kernels_recover_planted_synthetic_beads()
+    test_kernel_alternatives_match_reference()
+    print("OK")
@@ -0,0 +1,101 @@
+"""
+Consistency checks for the vectorized scorer and bead file parser in bertalign.eval.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from bertalign.eval import *
+from bertalign.eval import _BEAD_FILE, _precision, _precision_arrays
+
+
+def _random_beads(rng, num_sents):
+    beads, i, j = [], 0, 0
+    while i < num_sents:
+        src_len, tgt_len = [(1, 1), (1, 2), (2, 1), (0, 1), (1, 0), (0, 0), (2, 2)][rng.integers(7)]
+        src, tgt = list(range(i, i + src_len)), list(range(j, j + tgt_len))
+        if rng.random() < 0.1:
+            src = src[::-1] + src[:1]  # ids that are not a run
+        beads.append((src, tgt))
+        if rng.random() < 0.05:
+            beads.append(beads[rng.integers(len(beads))])
+        i, j = i + src_len + rng.integers(-1, 2), j + tgt_len + rng.integers(-1, 2)
+    return beads
+
+
+def _reference_scores(gold_list, test_list):
+    # ids that are not integers are scored with the reference loops
+    as_str = lambda beads: [([str(x) for x in src], [str(y) for y in tgt]) for src, tgt in beads]
+    return score_multiple([as_str(gold) for gold in gold_list], [as_str(test) for test in test_list])
+
+
+def test_vectorized_scores_match_reference():
+    from benchmarks.synthetic import write_alignments
+    rng = np.random.default_rng(0)
+    for num_sents in (0, 5, 300):
+        gold, test = _random_beads(rng, num_sents), _random_beads(rng, num_sents)
+        for gold_beads, test_beads in ((gold, test), (test, gold), (gold, gold)):
+            counts = _precision_arrays(BeadArrays.from_beads(gold_beads), BeadArrays.from_beads(test_beads))
+            assert np.array_equal(counts, _precision(gold_beads, test_beads))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "beads.txt")
+        write_alignments(test, path)
+        assert read_bead_arrays(path).tolist() == read_alignments(path) == [(list(x), list(y)) for x, y in test]
+
+
+def test_duplicate_ids_within_bead():
+    gold = [([0], [0]), ([1, 2], [1]), ([3], [2, 3]), ([4], [4])]
+    tests = [
+        [([0, 0], [0]), ([1, 2], [1]), ([3], [2, 3, 3]), ([4, 4], [4, 4])],
+        [([0], [0]), ([1, 1, 2], [1]), ([2, 1], [1]), ([3], [2]), ([3], [3]), ([4], [4])],
+        [([1, 2], [1]), ([1, 2], [1]), ([5, 5], [5])],
+    ]
+    for test in tests:
+        for gold_beads, test_beads in ((gold, test), (test, gold), (test, test)):
+            counts = _precision_arrays(BeadArrays.from_beads(gold_beads), BeadArrays.from_beads(test_beads))
+            assert np.array_equal(counts, _precision(gold_beads, test_beads))
+    assert score_multiple([gold] * len(tests), tests) == _reference_scores([gold] * len(tests), tests)
+
+
+def test_recall_ignores_deletion_only_beads():
+    gold = [([0], [0]), ([1], []), ([2], [1]), ([], [2]), ([3, 4], [3])]
+    test = [([0], [0]), ([1], [1]), ([2], []), ([], [2]), ([3, 4], [3])]
+    deletions = [([5], []), ([6, 7], []), ([], [4])]
+    scores = score_multiple([gold], [test])
+    assert scores == _reference_scores([gold], [test])
+    # Beads empty on one side count for precision only
+    with_deletions = score_multiple([gold], [test + deletions])
+    assert with_deletions == _reference_scores([gold], [test + deletions])
+    assert with_deletions['recall_strict'] == scores['recall_strict']
+    assert with_deletions['recall_lax'] == scores['recall_lax']
+    assert with_deletions['precision_strict'] < scores['precision_strict']
+    assert score_multiple([deletions], [deletions]) == _reference_scores([deletions], [deletions])
+
+
+def test_read_bead_arrays_fallback():
+    beads = [([0], [0]), ([1, 2], [1]), ([], [2]), ([3], [])]
+    files = {
+        # CRLF lines are read as LF lines
+        "crlf.txt": "[0]:[0]\r\n[1, 2]:[1]\r\n[]:[2]\r\n[3]:[]\r\n",
+        # Other spacing and extra fields take the line by line parser
+        "spaced.txt": "[0] : [0]\n[1,2]:[1]\n[] :[2]\n [3]:[]",
+        "extra_field.txt": "[0]:[0]:0.9\n[1, 2]:[1]:0.5\n[]:[2]:0.0\n[3]:[]:0.0\n",
+    }
+    assert not _BEAD_FILE.fullmatch(files["spaced.txt"] + "\n")
+    assert not _BEAD_FILE.fullmatch(files["extra_field.txt"])
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, text in files.items():
+            path = os.path.join(tmp, name)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            assert read_bead_arrays(path).tolist() == read_alignments(path) == beads, name
+
+
+if __name__ == "__main__":
+    test_vectorized_scores_match_reference()
+    test_duplicate_ids_within_bead()
+    test_recall_ignores_deletion_only_beads()
+    test_read_bead_arrays_fallback()
+    print("OK")
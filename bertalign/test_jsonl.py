@@ -0,0 +1,88 @@
+"""
+Consistency checks for the columnar JSONL tables in bertalign.jsonl.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+
+from bertalign.jsonl import *
+
+RECORDS = [
+    {"chunk_id": 0, "text": "Già", "page": "1", "tags": ["a"], "score": 0.5},
+    {"chunk_id": 1, "text": "", "flag": True},
+    {"chunk_id": 2, "page": 3, "tags": [], "note": None},
+    {"text": "no id", "page": "4", "meta": {"k": [1, 2]}},
+    {"chunk_id": -7, "text": "emoji 🙂", "flag": False, "score": 2},
+]
+
+
+def _write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def test_missing_fields_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chunks.jsonl")
+        _write_jsonl(path, RECORDS)
+        # Built from the file, then read back from its cache
+        for table in (load_table(path), load_table(path), load_table(path, cache=False)):
+            assert table.records() == RECORDS
+            assert [table.row(i) for i in range(len(table))] == RECORDS
+            assert list(table.rows()) == RECORDS
+            assert list(pickle.loads(pickle.dumps(table.rows([4, 0])))) == [RECORDS[4], RECORDS[0]]
+            for name in table.fields:
+                assert table.present(name).tolist() == [name in record for record in RECORDS]
+                assert [table.get(name, i) for i in range(len(table))] == [r.get(name) for r in RECORDS]
+                assert table.column(name, "-") == [r.get(name, "-") for r in RECORDS]
+            assert table.kinds["chunk_id"] == INT and table.kinds["text"] == STR
+            # Mixed int and str values, and non-scalar values, are kept as JSON
+            assert table.kinds["page"] == JSON and table.kinds["tags"] == JSON
+            assert table.ints("chunk_id").tolist() == [0, 1, 2, 0, -7]
+            assert table.strings("text") == [r.get("text") for r in RECORDS]
+            assert table.column("missing", 0) == [0] * len(RECORDS)
+        subset = load_table(path, fields=["text", "flag", "missing"])
+        assert subset.fields == ["text", "flag"]
+        assert subset.records() == [{k: v for k, v in r.items() if k in ("text", "flag")} for r in RECORDS]
+
+
+def test_cache_follows_file_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chunks.jsonl")
+        cache_path = path + CACHE_SUFFIX
+        _write_jsonl(path, RECORDS[:2])
+        assert load_table(path).records() == RECORDS[:2]
+        assert os.path.exists(cache_path)
+        stat = os.stat(path)
+
+        # Same size and mtime: the cache is trusted, even if stale
+        edited = [dict(RECORDS[0], text="Giù"), RECORDS[1]]
+        _write_jsonl(path, edited)
+        assert os.path.getsize(path) == stat.st_size
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert load_table(path).records() == RECORDS[:2]
+
+        # A new mtime rebuilds it
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert load_table(path).records() == edited
+        stat = os.stat(path)
+
+        # So does a new size, with the mtime unchanged
+        _write_jsonl(path, edited + RECORDS[2:3])
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert load_table(path).records() == edited + RECORDS[2:3]
+        assert load_table(path, fields=["chunk_id"]).ints("chunk_id").tolist() == [0, 1, 2]
+
+        # An unreadable cache is rebuilt
+        with open(cache_path, 'wb') as f:
+            f.write(b"not an npz")
+        assert load_table(path).records() == edited + RECORDS[2:3]
+
+
+if __name__ == "__main__":
+    test_missing_fields_round_trip()
+    test_cache_follows_file_changes()
+    print("OK")
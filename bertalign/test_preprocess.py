@@ -0,0 +1,26 @@
+"""
+Consistency checks for sentence splitting in bertalign.preprocess.
+"""
+
+from bertalign.preprocess import *
+
+
+def _text(num_paragraphs):
+    sentences = ["Dr. Smith arrived at 5 p.m. on Monday.", "Nobody knew why!",
+                 "Was it the train... or the snow?", "\"Stay,\" she said. He left."]
+    return "\n".join(" ".join(sentences[(i + k) % len(sentences)] for k in range(i % 3 + 1))
+                     for i in range(num_paragraphs))
+
+
+def test_parallel_split_matches_serial():
+    texts = [(_text(300), 'en'), (_text(7), 'en'), ("", 'en')]
+    for splitter in ("regex", "auto"):
+        serial = split_texts(texts, workers=1, splitter=splitter)
+        # min_chars=1: every non-empty text goes through the pool
+        assert split_texts(texts, workers=2, min_chars=1, splitter=splitter) == serial
+        assert sum(map(len, serial)) > 300
+
+
+if __name__ == "__main__":
+    test_parallel_split_matches_serial()
+    print("OK")
@@ -0,0 +1,51 @@
+"""
+Consistency checks for the batched encoding in bertalign.utils.
+"""
+
+from unittest import mock
+
+import numpy as np
+
+from bertalign import tracing
+from bertalign.utils import *
+
+
+class _PaddingModel:
+    """
+    Stand-in for a SentenceTransformer: batches texts by length as
+    encode() does, and embeds each text with its length and the length
+    its batch is padded to, so the embeddings depend on the batching.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=None, **kwargs):
+        self.calls.append(len(texts))
+        order = np.argsort([-len(text) for text in texts])
+        vecs = np.zeros((len(texts), 2), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            vecs[batch, 0] = [len(texts[i]) for i in batch]
+            vecs[batch, 1] = max(len(texts[i]) for i in batch)
+        return vecs
+
+
+def test_traced_batches_match_single_call():
+    rng = np.random.default_rng(0)
+    texts = ["x" * length for length in rng.integers(1, 40, size=100)]
+    expected = _PaddingModel().encode(texts, batch_size=8)
+    for num_texts in (0, 5, 8, 100):
+        assert np.array_equal(encode_batches(_PaddingModel(), texts[:num_texts], batch_size=8),
+                              _PaddingModel().encode(texts[:num_texts], batch_size=8))
+    with mock.patch.object(tracing, '_events', []):
+        model = _PaddingModel()
+        vecs = encode_batches(model, texts, batch_size=8)
+        spans = [event for event in tracing._events if event["name"] == "encode_batch"]
+    assert np.array_equal(vecs, expected)
+    assert model.calls == [8] * 12 + [4]
+    assert [span["args"]["texts"] for span in spans] == model.calls
+
+
+if __name__ == "__main__":
+    test_traced_batches_match_single_call()
+    print("OK")
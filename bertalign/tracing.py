@@ -0,0 +1,151 @@
+"""
+Opt-in Chrome trace-event export.
+
+When tracing is enabled, span() records complete ("X") events with the
+process, thread and wall-clock start of each span, and save() writes them
+as a Chrome trace JSON file that Perfetto (ui.perfetto.dev) or
+chrome://tracing opens directly. Each thread gets its own track, so
+stages waiting on each other show up as idle gaps.
+
+    tracing.enable("trace.json")
+    with tracing.tags(part="001"):
+        with tracing.span("first_pass", cat="dp"):
+            ...
+    tracing.save()
+
+Tags apply to every span opened inside them on the same thread, and end
+up in the span's args, as do the values the block adds to the dict that
+span() yields. Worker processes started after enable() trace too: they
+find the trace path in the environment and append their events to a
+per-process fragment on flush(), which save() merges.
+
+When tracing is disabled, span() and tags() do nothing.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_ENV = "BERTALIGN_TRACE"
+OWNER_ENV = "BERTALIGN_TRACE_OWNER"
+
+_events = None  # list of trace events while tracing, None otherwise
+_path = None
+_named_threads = set()
+_local = threading.local()
+
+
+def enable(path):
+    """Start tracing this process, and any worker process it starts, into path."""
+    global _events, _path
+    _path = Path(path)
+    _events = []
+    _named_threads.clear()
+    os.environ[TRACE_ENV] = str(_path)
+    os.environ[OWNER_ENV] = str(os.getpid())
+    for fragment in _path.parent.glob(_path.name + ".*.part"):
+        fragment.unlink()  # left over by an interrupted run
+    _events.append(_metadata("process_name", 0, {"name": "main"}))
+
+
+def enabled():
+    return _events is not None
+
+
+def _now_us():
+    return time.time_ns() / 1000
+
+
+def _metadata(name, tid, args):
+    return {"name": name, "ph": "M", "pid": os.getpid(), "tid": tid, "args": args}
+
+
+def _tags():
+    stack = getattr(_local, "tags", None)
+    if stack is None:
+        stack = _local.tags = [{}]
+    return stack
+
+
+@contextmanager
+def tags(**values):
+    """Add values to the args of every span opened inside, on this thread."""
+    if _events is None:
+        yield
+        return
+    stack = _tags()
+    stack.append(dict(stack[-1], **values))
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+@contextmanager
+def span(name, cat="", **args):
+    """
+    Record the enclosed block as one span named name in category cat.
+    Yields the span's args, which the block can add to.
+    """
+    if _events is None:
+        yield args
+        return
+    thread = threading.current_thread()
+    tid = thread.ident
+    if tid not in _named_threads:
+        _named_threads.add(tid)
+        _events.append(_metadata("thread_name", tid, {"name": thread.name}))
+    start = _now_us()
+    try:
+        yield args
+    finally:
+        event_args = dict(_tags()[-1], **args)
+        _events.append({"name": name, "cat": cat, "ph": "X", "ts": start, "dur": _now_us() - start,
+                        "pid": os.getpid(), "tid": tid, "args": event_args})
+
+
+def _fragment_path(pid):
+    return _path.with_name("{}.{}.part".format(_path.name, pid))
+
+
+def flush():
+    """
+    In a worker process, append the events recorded so far to its
+    fragment file. Does nothing in the process that called enable().
+    """
+    global _events
+    if _events is None or os.environ.get(OWNER_ENV) == str(os.getpid()):
+        return
+    events, _events = _events, []
+    with open(_fragment_path(os.getpid()), 'a', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def save():
+    """
+    Write the trace of this process and its workers' fragments as a
+    Chrome trace JSON file. Returns its path, or None if tracing is off.
+    """
+    if _events is None:
+        return None
+    events = list(_events)
+    for fragment in sorted(_path.parent.glob(_path.name + ".*.part")):
+        with open(fragment, 'r', encoding='utf-8') as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+        fragment.unlink()
+    for pid in {event["pid"] for event in events} - {os.getpid()}:
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                       "args": {"name": "worker {}".format(pid)}})
+    with open(_path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return _path
+
+
+# Worker processes inherit the trace path through the environment.
+if os.environ.get(TRACE_ENV) and os.environ.get(OWNER_ENV) != str(os.getpid()):
+    _path = Path(os.environ[TRACE_ENV])
+    _events = []
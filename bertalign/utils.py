@@ -1,25 +1,26 @@
 import re
-import json
-from langdetect import detect
+import sys
+from functools import lru_cache
+import numpy as np
+from langdetect import DetectorFactory, detect
 from sentence_splitter import SentenceSplitter
 
+from bertalign import jsonl, tracing
 
-def load_jsonl(jsonl_path):
-    """Load and parse the JSONL file."""
-    print(f"Loading data from {jsonl_path}...")
-    data = []
-    with open(jsonl_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            try:
-                entry = json.loads(line.strip())
-                data.append(entry)
-            except json.JSONDecodeError as e:
-                print(f"Warning: Could not parse line {line_num}: {e}", file=sys.stderr)
 
+def load_jsonl(jsonl_path, fields=None):
+    """Load and parse the JSONL file, optionally keeping only some fields."""
+    def warn(line_num, e):
+        print(f"Warning: Could not parse line {line_num}: {e}", file=sys.stderr)
+
+    print(f"Loading data from {jsonl_path}...")
+    data = jsonl.load_jsonl(jsonl_path, fields=fields, on_error=warn)
     print(f"Loaded {len(data)} entries")
     return data
 
 
+_WHITESPACE = re.compile(r'\s+')
+
 def clean_text(text):
     clean_text = []
     text = text.strip()
@@ -27,14 +28,25 @@ def clean_text(text):
     for line in lines:
         line = line.strip()
         if line:
-            line = re.sub('\s+', ' ', line)
+            line = _WHITESPACE.sub(' ', line)
             clean_text.append(line)
     return "\n".join(clean_text)
     
+# langdetect is randomized; a fixed seed makes detection reproducible.
+DetectorFactory.seed = 0
+
 def detect_lang(text):
     max_len = 200
     chunk = text[0 : min(max_len, len(text))]
-    lang = detect(chunk)
+    return _detect_chunk(chunk)
+
+@lru_cache(maxsize=1024)
+def _detect_chunk(chunk):
+    return normalize_lang(detect(chunk))
+
+def normalize_lang(lang):
+    """Map a language code to the codes used by Bertalign (e.g. zh-cn -> zh)."""
+    lang = lang.lower()
     if lang.startswith('zh'):
         lang = 'zh'
     return lang
@@ -44,12 +56,17 @@ def split_sents(text, lang):
         if lang == 'zh':
             sents = _split_zh(text)
         else:
-            splitter = SentenceSplitter(language=lang)
+            splitter = get_splitter(lang)
             sents = splitter.split(text=text) 
             sents = [sent.strip() for sent in sents]
         return sents
     else:
         raise Exception('The language {} is not suppored yet.'.format(LANG.ISO[lang]))
+
+@lru_cache(maxsize=None)
+def get_splitter(lang):
+    """One SentenceSplitter per language, built on first use."""
+    return SentenceSplitter(language=lang)
     
 def _split_zh(text, limit=1000):
         sent_list = []
@@ -91,7 +108,30 @@ def _preprocess_line(line):
     if len(line) == 0:
         line = 'BLANK_LINE'
     return line
-    
+
+def encode_batches(model, texts, batch_size=32, **kwargs):
+    """
+    SentenceTransformer model.encode(texts), one tracing span per batch.
+
+    While tracing, the texts are encoded one batch at a time, grouped by
+    length as encode() groups them, so every batch pads to the same length
+    and the embeddings are those of a single call.
+    """
+    if not tracing.enabled() or len(texts) <= batch_size:
+        with tracing.span("encode_batch", cat="encoder", texts=len(texts)):
+            return model.encode(texts, batch_size=batch_size, **kwargs)
+    kwargs["show_progress_bar"] = False
+    order = np.argsort([-len(text) for text in texts])
+    vecs = None
+    for start in range(0, len(texts), batch_size):
+        batch = order[start:start + batch_size]
+        with tracing.span("encode_batch", cat="encoder", texts=len(batch)):
+            batch_vecs = model.encode([texts[i] for i in batch], batch_size=batch_size, **kwargs)
+        if vecs is None:
+            vecs = np.empty((len(texts),) + batch_vecs.shape[1:], dtype=batch_vecs.dtype)
+        vecs[batch] = batch_vecs
+    return vecs
+
 class LANG:
     SPLITTER = {
         'ca': 'Catalan',
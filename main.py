@@ -1,16 +1,28 @@
 import os, sys
+import argparse
 import json
 import gc
+import hashlib
+import itertools
+import multiprocessing
+import queue
+import shutil
+import threading
+import time
+import tracemalloc
 import numpy as np
 import psutil
 import torch
-from typing import List, Dict
+from typing import List, Dict, Optional
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
-from bertalign import Bertalign
-from bertalign.utils import load_jsonl
+from bertalign import Bertalign, tracing
+from bertalign.beads import COMPACT, FULL, compact_bead, iter_alignments
+from bertalign.corelib import Workspace, find_unit_bounds
+from bertalign.jsonl import iter_jsonl, load_table
 
 
 def get_memory_usage():
@@ -20,19 +32,109 @@ def get_memory_usage():
     return mem_info.rss / (1024 ** 3)  # Convert bytes to GB
 
 
+def get_total_memory_usage():
+    """Get memory usage in GB of this process and all its worker processes."""
+    process = psutil.Process(os.getpid())
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total / (1024 ** 3)
+
+
+def unit_labels(data: List[Dict], unit_field: str) -> List[tuple]:
+    """Coarse unit of each chunk in hierarchical mode: its (part, unit_field) pair."""
+    return [(item.get('part'), item.get(unit_field)) for item in data]
+
+
+def _part_memory_terms(num_src: int, num_tgt: int, bert_config: Dict, embedding_dim: int = 768,
+                       unit_bounds: Optional[tuple] = None) -> tuple:
+    """
+    Bytes of aligning one part, as (transient, workspace): the arrays
+    freed with the part, and the top-k outputs and DP tables, which stay
+    in the Workspace of the process (see estimate_part_memory).
+    """
+    max_align, win = bert_config['max_align'], bert_config['win']
+    num_overlaps = max_align - 1
+    embeddings = 2 * num_overlaps * (num_src + num_tgt) * embedding_dim * 4
+    lengths = num_overlaps * (num_src + num_tgt) * 8
+    # Adaptive windows range up to twice the fixed one
+    max_win = 2 * win if bert_config['adaptive_win'] else win
+    gap = max_align
+    first_src, first_tgt = num_src, num_tgt
+    units = 0
+    if unit_bounds is not None:
+        # The first pass and a second pass run on the pooled units, then the
+        # sentence band spans the sentences of up to max_align units, with
+        # windows as wide as the target units next to each anchor
+        src_bounds, tgt_bounds = unit_bounds
+        first_src, first_tgt = len(src_bounds) - 1, len(tgt_bounds) - 1
+        max_unit_len = max(int(np.diff(src_bounds).max(initial=1)), int(np.diff(tgt_bounds).max(initial=1)))
+        gap = max_align * max_unit_len
+        max_win = max(max_win, int(np.diff(tgt_bounds).max(initial=1)))
+        # float32 unit embeddings, plus the float64 cumulative sums they are pooled from
+        units = (num_overlaps * 4 + 2 * 8) * (first_src + first_tgt) * embedding_dim
+    first_w = max(bert_config['min_win_size'], int(max(first_src, first_tgt) * bert_config['percent']))
+    # float32 cost + uint8 pointers per cell, float32 scores + int64 ids per candidate
+    first_pass = (first_src + 1) * (2 * first_w + 1) * 5 + first_src * bert_config['top_k'] * 12
+    second_w = 2 * max_win + gap + 1
+    second_pass = (num_src + 1) * second_w * 5
+    # A Workspace buffer grows by half its size at a time, so it can end
+    # up half again as large as the table it holds
+    workspace = int(1.5 * (first_pass + second_pass))
+    return embeddings + lengths + units, workspace
+
+
+def estimate_part_memory(num_src: int, num_tgt: int, bert_config: Dict, embedding_dim: int = 768,
+                         unit_bounds: Optional[tuple] = None) -> float:
+    """
+    Estimate the peak memory in GB of aligning one part.
+
+    Counts the overlap embeddings (held twice while encoding), the
+    first-pass top-k matrices and DP tables, and the second-pass DP tables,
+    whose width grows with the window size (up to 2 * win with
+    adaptive_win) and max_align. In hierarchical mode, pass the
+    (src_bounds, tgt_bounds) of the units from find_unit_bounds: the first
+    pass then runs on the units, and the second-pass band spans whole units.
+    """
+    transient, workspace = _part_memory_terms(num_src, num_tgt, bert_config, embedding_dim, unit_bounds)
+    return (transient + workspace) / (1024 ** 3)
+
+
+def estimate_workspace_memory(num_src: int, num_tgt: int, bert_config: Dict, embedding_dim: int = 768,
+                              unit_bounds: Optional[tuple] = None) -> float:
+    """
+    Estimate the memory in GB that aligning one part leaves in the
+    Workspace of its process: the DP and top-k buffers only grow, so a
+    worker keeps the tables of the largest part it has aligned.
+    """
+    return _part_memory_terms(num_src, num_tgt, bert_config, embedding_dim, unit_bounds)[1] / (1024 ** 3)
+
+
 def aggressive_cleanup():
-    """Perform aggressive memory cleanup."""
-    # Force garbage collection multiple times
-    for _ in range(3):
-        gc.collect()
+    """
+    Release the memory of a finished part. Its DP tables and top-k outputs
+    stay in the shared workspace for the next part, so one collection is
+    enough for the rest.
+    """
+    gc.collect()
 
     # Clear PyTorch cache if using GPU
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
-        torch.cuda.synchronize()
 
-    # Additional garbage collection
-    gc.collect()
+
+_workspace = None
+
+
+def get_workspace() -> Workspace:
+    """DP and top-k buffers shared by all the parts aligned in this process."""
+    global _workspace
+    if _workspace is None:
+        _workspace = Workspace()
+    return _workspace
 
 
 def json_serializable(obj):
@@ -50,7 +152,7 @@ def extract_alignments_with_metadata(
     aligner: Bertalign,
     src_data: List[Dict],
     tgt_data: List[Dict],
-    part: str
+    part: Optional[str]
 ) -> List[Dict]:
     """
     Extract alignments from Bertalign result with full metadata preserved.
@@ -59,7 +161,8 @@ def extract_alignments_with_metadata(
         aligner: Bertalign instance with alignment results
         src_data: Original source data with metadata
         tgt_data: Original target data with metadata
-        part: Part identifier
+        part: Part identifier. If None, each bead takes the part of its
+            first chunk (used when a whole book is aligned at once).
 
     Returns:
         List of dictionaries with aligned chunks and their metadata
@@ -86,8 +189,14 @@ def extract_alignments_with_metadata(
             chunk_meta = tgt_data[idx].copy()
             tgt_chunks.append(chunk_meta)
 
+        if part is None:
+            first_chunk = src_chunks[0] if src_chunks else tgt_chunks[0]
+            bead_part = first_chunk.get('part', '001')
+        else:
+            bead_part = part
+
         alignment = {
-            'part': part,
+            'part': bead_part,
             'src_indices': list(src_indices),
             'tgt_indices': list(tgt_indices),
             'src_text': src_text,
@@ -102,20 +211,512 @@ def extract_alignments_with_metadata(
     return alignments
 
 
-def save_alignments(alignments: List[Dict], output_path: str):
-    """Save alignments to JSONL file."""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for alignment in alignments:
-            f.write(json.dumps(alignment, ensure_ascii=False, default=json_serializable) + '\n')
-    print(f"Saved {len(alignments)} total alignments to {output_path}")
+def extract_compact_alignments(
+    aligner: Bertalign,
+    src_data: List[Dict],
+    tgt_data: List[Dict],
+    part: Optional[str]
+) -> List[Dict]:
+    """
+    Extract alignments from Bertalign result as compact records, which
+    reference chunks by chunk_id instead of copying them (see bertalign.beads).
+
+    Args: as extract_alignments_with_metadata
+    """
+    alignments = []
+    for src_indices, tgt_indices in aligner.result:
+        if part is None:
+            first_chunk = src_data[src_indices[0]] if src_indices else tgt_data[tgt_indices[0]]
+            bead_part = first_chunk.get('part', '001')
+        else:
+            bead_part = part
+        alignments.append(compact_bead(bead_part, src_indices, tgt_indices, src_data, tgt_data))
+    return alignments
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <absolute_input_path.jsonl>")
-        sys.exit(1)
+class AlignmentStats:
+    """Running counts of alignments per bead part and alignment type."""
+
+    def __init__(self, by_part: Optional[Dict[str, Dict[str, int]]] = None):
+        self.by_part = {}
+        if by_part:
+            self.merge(by_part)
+
+    def add(self, alignment: Dict):
+        types = self.by_part.setdefault(alignment['part'], {})
+        atype = alignment['alignment_type']
+        types[atype] = types.get(atype, 0) + 1
+
+    def merge(self, by_part: Dict[str, Dict[str, int]]):
+        for part, types in by_part.items():
+            own = self.by_part.setdefault(part, {})
+            for atype, count in types.items():
+                own[atype] = own.get(atype, 0) + count
+
+    @property
+    def total(self) -> int:
+        return sum(sum(types.values()) for types in self.by_part.values())
+
+    def overall_types(self) -> Dict[str, int]:
+        overall = defaultdict(int)
+        for types in self.by_part.values():
+            for atype, count in types.items():
+                overall[atype] += count
+        return dict(sorted(overall.items()))
+
+    def part_statistics(self) -> Dict[str, Dict]:
+        return {
+            part: {'total_alignments': sum(types.values()), 'alignment_types': types}
+            for part, types in sorted(self.by_part.items())
+        }
+
+
+def prepare_part(part: str, src_data: List[Dict], tgt_data: List[Dict],
+                 bert_config: Dict, unit_field: str = 'page') -> Bertalign:
+    """
+    Encode the EN and IT chunks of one part.
+
+    Returns:
+        Bertalign instance, ready for align_sents()
+    """
+    print(f"\n{'='*60}")
+    print(f"Processing part {part}")
+    print(f"{'='*60}")
+    print(f"  EN chunks: {len(src_data)}")
+    print(f"  IT chunks: {len(tgt_data)}")
+
+    # One sentence per chunk, so that bead indices map straight back
+    # to src_data / tgt_data
+    src_texts = [item["text"] for item in src_data]
+    tgt_texts = [item["text"] for item in tgt_data]
+
+    print(f"  EN chars: {sum(len(text) for text in src_texts)}")
+    print(f"  IT chars: {sum(len(text) for text in tgt_texts)}")
+
+    unit_kwargs = {}
+    if bert_config['hierarchical']:
+        unit_kwargs = {
+            'hierarchical': True,
+            'src_units': unit_labels(src_data, unit_field),
+            'tgt_units': unit_labels(tgt_data, unit_field),
+        }
+
+    # Run alignment
+    with tracing.tags(part=part):
+        aligner = Bertalign(
+            src_texts, tgt_texts,
+            max_align=bert_config['max_align'],
+            min_win_size=bert_config['min_win_size'],
+            percent=bert_config['percent'],
+            win=bert_config['win'],
+            top_k=bert_config['top_k'],
+            is_split=bert_config['is_split'],
+            adaptive_win=bert_config['adaptive_win'],
+            src_lang='en',
+            tgt_lang='it',
+            workspace=get_workspace(),
+            **unit_kwargs
+        )
+    return aligner
+
+
+def finish_part(part: str, aligner: Bertalign, src_data: List[Dict], tgt_data: List[Dict],
+                bert_config: Dict, compact: bool = False) -> Dict:
+    """
+    Align an encoded part (see prepare_part).
+
+    Returns:
+        Dict with the part, its alignments (see extract_alignments_with_metadata,
+        or extract_compact_alignments if compact), the second-pass band statistics
+        and the aligner's per-stage statistics
+    """
+    with tracing.tags(part=part):
+        aligner.align_sents()
+
+    print(f"  Alignments found: {len(aligner.result)}")
+    print(f"  DP band: {aligner.band_stats['band_area']} cells "
+          f"(fixed window: {aligner.band_stats['fixed_band_area']})")
+
+    # Extract alignments with metadata
+    bead_part = None if bert_config['hierarchical'] else part
+    extract = extract_compact_alignments if compact else extract_alignments_with_metadata
+    with tracing.span("extract_beads", cat="part", part=part):
+        part_alignments = extract(aligner, src_data, tgt_data, bead_part)
+
+    # Print alignment statistics for this part
+    alignment_types = {}
+    for alignment in part_alignments:
+        atype = alignment['alignment_type']
+        alignment_types[atype] = alignment_types.get(atype, 0) + 1
 
-    input_path = sys.argv[1]  # Absolute path
+    print(f"  Alignment types: {dict(sorted(alignment_types.items()))}")
+
+    stage_stats = aligner.stage_stats
+    print("  Stages: " + ", ".join(f"{name} {stats['seconds']:.2f}s" for name, stats in stage_stats.items()))
+
+    return {
+        'part': part,
+        'alignments': part_alignments,
+        'band_stats': aligner.band_stats,
+        'stage_stats': stage_stats,
+    }
+
+
+def align_part(part: str, src_data: List[Dict], tgt_data: List[Dict],
+               bert_config: Dict, unit_field: str = 'page', compact: bool = False) -> Dict:
+    """Encode and align one part (see prepare_part and finish_part)."""
+    aligner = prepare_part(part, src_data, tgt_data, bert_config, unit_field)
+    return finish_part(part, aligner, src_data, tgt_data, bert_config, compact)
+
+
+def _align_part_job(job):
+    """Worker entry point for run_parts_parallel."""
+    print(f"[worker {os.getpid()}] Starting part {job[0]}")
+    try:
+        return align_part(*job)
+    finally:
+        tracing.flush()
+
+
+def run_parts_pipelined(jobs: List[tuple], sink, queue_size: int = 1) -> Dict[str, float]:
+    """
+    Align parts in a three-stage pipeline: an encoder thread prepares part
+    N+1 while part N is aligned in this thread, and a writer thread hands
+    finished parts to sink in part order.
+
+    Both queues hold at most queue_size parts, so no more than
+    2 * queue_size + 2 parts are in memory at once. The numba kernels
+    release the GIL, so encoding and alignment really overlap.
+
+    Args:
+        jobs: (part, src_data, tgt_data, bert_config, unit_field, compact) tuples in part order
+        sink: Callable receiving each align_part result
+        queue_size: Parts buffered between stages
+
+    Returns:
+        Busy time in seconds of each stage, and the wall time
+    """
+    encoded = queue.Queue(maxsize=queue_size)
+    finished = queue.Queue(maxsize=queue_size)
+    timings = {'encode': 0.0, 'align': 0.0, 'write': 0.0}
+    stop = threading.Event()
+    writer_errors = []
+
+    def encode_stage():
+        try:
+            for job in jobs:
+                if stop.is_set():
+                    return
+                start = time.perf_counter()
+                aligner = prepare_part(*job[:5])
+                timings['encode'] += time.perf_counter() - start
+                encoded.put((job, aligner))
+            encoded.put(None)
+        except BaseException as e:
+            encoded.put(e)
+
+    def write_stage():
+        while True:
+            result = finished.get()
+            if result is None:
+                return
+            if writer_errors:
+                continue  # keep draining so the align stage never blocks
+            try:
+                start = time.perf_counter()
+                sink(result)
+                timings['write'] += time.perf_counter() - start
+            except BaseException as e:
+                writer_errors.append(e)
+
+    wall_start = time.perf_counter()
+    encoder = threading.Thread(target=encode_stage, name="encoder", daemon=True)
+    writer = threading.Thread(target=write_stage, name="writer", daemon=True)
+    encoder.start()
+    writer.start()
+    try:
+        while not writer_errors:
+            item = encoded.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            (part, src_data, tgt_data, bert_config, _, compact), aligner = item
+            del item
+            start = time.perf_counter()
+            result = finish_part(part, aligner, src_data, tgt_data, bert_config, compact)
+            timings['align'] += time.perf_counter() - start
+            del aligner
+            finished.put(result)
+            del result
+    finally:
+        stop.set()
+        # Unblock the encoder if it is waiting on a full queue
+        while encoder.is_alive():
+            try:
+                encoded.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        finished.put(None)
+        writer.join()
+    if writer_errors:
+        raise writer_errors[0]
+    timings['wall'] = time.perf_counter() - wall_start
+    return timings
+
+
+def run_parts_parallel(jobs: List[tuple], workers: int, memory_budget: float, worker_overhead: float):
+    """
+    Align parts in a pool of worker processes.
+
+    A part is started only while the projected memory use stays under the
+    budget: the larger of the measured RSS of this process and its workers
+    and the memory already committed to running parts, plus the estimate
+    for the new part (and the overhead of a new worker, which loads its own
+    encoder). Each worker keeps the DP tables of the largest part it has
+    aligned in its Workspace, so every worker is charged for the largest
+    tables of any part started so far. One part is always allowed to run
+    so the run cannot stall.
+
+    Args:
+        jobs: (part, src_data, tgt_data, bert_config, unit_field, compact) tuples in part order
+        workers: Maximum number of worker processes
+        memory_budget: Memory budget in GB
+        worker_overhead: Memory of one idle worker with the encoder loaded, in GB
+
+    Yields:
+        align_part results, in the order of jobs
+    """
+    base_memory = get_memory_usage()
+    estimates, workspaces = [], []
+    for part, src_data, tgt_data, bert_config, unit_field, _ in jobs:
+        unit_bounds = None
+        if bert_config['hierarchical']:
+            unit_bounds = (find_unit_bounds(len(src_data), labels=unit_labels(src_data, unit_field)),
+                           find_unit_bounds(len(tgt_data), labels=unit_labels(tgt_data, unit_field)))
+        estimates.append(estimate_part_memory(len(src_data), len(tgt_data), bert_config,
+                                              unit_bounds=unit_bounds))
+        workspaces.append(estimate_workspace_memory(len(src_data), len(tgt_data), bert_config,
+                                                    unit_bounds=unit_bounds))
+    max_workspace = 0.0
+    pending = list(range(len(jobs)))
+    running = {}
+    finished = {}
+    next_index = 0
+    num_workers = 0
+
+    # spawn: workers must not inherit the parent's torch/CUDA state
+    context = multiprocessing.get_context("spawn")
+    # Workers trace allocations whenever this process does
+    initializer = tracemalloc.start if tracemalloc.is_tracing() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer) as pool:
+        while pending or running:
+            while pending and len(running) < workers:
+                index = pending[0]
+                new_worker = len(running) >= num_workers
+                committed = (base_memory + num_workers * (worker_overhead + max_workspace)
+                             + sum(estimates[i] - workspaces[i] for i in running.values()))
+                projected = (max(get_total_memory_usage(), committed) + estimates[index]
+                             + (worker_overhead if new_worker else 0.0))
+                if running and projected > memory_budget:
+                    break
+                if projected > memory_budget:
+                    print(f"Warning: part {jobs[index][0]} may exceed the memory budget "
+                          f"({projected:.2f} GB > {memory_budget:.2f} GB)")
+                print(f"Starting part {jobs[index][0]} (estimated {estimates[index]:.2f} GB, "
+                      f"projected {projected:.2f} / {memory_budget:.2f} GB)")
+                running[pool.submit(_align_part_job, jobs[index])] = index
+                num_workers += new_worker
+                max_workspace = max(max_workspace, workspaces[index])
+                pending.pop(0)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[running.pop(future)] = future.result()
+
+            # Hand results back in part order
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """
+    Per-part results of an experiment run, so that it can be resumed.
+
+    Each finished part is streamed to parts/part_<part>.jsonl, then recorded
+    in manifest.json with its alignment counts, together with the run key
+    (input hash and config).
+    Both files are replaced atomically, so a crash leaves either the old
+    or the new state, never a truncated one.
+    """
+
+    def __init__(self, output_dir: Path, run_key: Dict):
+        self.output_dir = Path(output_dir)
+        self.parts_dir = self.output_dir / "parts"
+        self.manifest_path = self.output_dir / "manifest.json"
+        self.run_key = run_key
+        self.manifest = {"run_key": run_key, "parts": {}}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("run_key") != run_key:
+                raise ValueError(f"{self.output_dir} was created from another input file or config")
+            self.manifest = manifest
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def matches(output_dir: Path, run_key: Dict) -> bool:
+        """Whether output_dir holds a checkpoint of the run run_key."""
+        manifest_path = Path(output_dir) / "manifest.json"
+        if not manifest_path.exists():
+            return False
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("run_key") == run_key
+
+    def completed_parts(self) -> List[str]:
+        return list(self.manifest["parts"])
+
+    def part_path(self, part: str) -> Path:
+        return self.parts_dir / f"part_{part}.jsonl"
+
+    def save_part(self, result: Dict):
+        """Write one align_part result and record it in the manifest."""
+        part = result['part']
+        with tracing.span("save_part", cat="io", part=part):
+            path = self.part_path(part)
+            tmp_path = path.with_name(path.name + ".tmp")
+            stats = AlignmentStats()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for alignment in result['alignments']:
+                    f.write(json.dumps(alignment, ensure_ascii=False, default=json_serializable) + '\n')
+                    stats.add(alignment)
+            os.replace(tmp_path, path)
+
+            self.manifest["parts"][part] = {
+                "file": str(path.relative_to(self.output_dir)),
+                "total_alignments": stats.total,
+                "alignment_statistics": stats.by_part,
+                "band_stats": result['band_stats'],
+                "stage_stats": result['stage_stats'],
+            }
+            tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2, default=json_serializable)
+            os.replace(tmp_path, self.manifest_path)
+
+    def part_stats(self, part: str) -> Dict[str, Dict[str, int]]:
+        """Alignment counts of a finished part, per bead part and type."""
+        entry = self.manifest["parts"][part]
+        if "alignment_statistics" in entry:
+            return entry["alignment_statistics"]
+        # Checkpoints written before counts were recorded
+        stats = AlignmentStats()
+        for alignment in iter_jsonl(self.part_path(part)):
+            stats.add(alignment)
+        return stats.by_part
+
+    def band_stats(self, part: str) -> Optional[Dict]:
+        return self.manifest["parts"][part]["band_stats"]
+
+    def stage_stats(self, part: str) -> Optional[Dict]:
+        return self.manifest["parts"][part].get("stage_stats")
+
+
+def find_resumable_run(experiments_dir: Path, run_key: Dict) -> Optional[Path]:
+    """Most recent experiment directory whose checkpoint matches run_key."""
+    if not experiments_dir.exists():
+        return None
+    candidates = sorted((d for d in experiments_dir.iterdir() if d.is_dir()),
+                        key=lambda d: d.stat().st_mtime, reverse=True)
+    for candidate in candidates:
+        if RunCheckpoint.matches(candidate, run_key):
+            return candidate
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Align EN/IT chunks with Bertalign")
+    parser.add_argument("input_path", help="Absolute path to the input JSONL file")
+    parser.add_argument(
+        "--hierarchical",
+        action="store_true",
+        help="Align the whole book in one pass: units (pages) first, then chunks"
+    )
+    parser.add_argument(
+        "--unit-field",
+        default="page",
+        help="Chunk field defining the coarse units in hierarchical mode (default: page)"
+    )
+    parser.add_argument(
+        "--adaptive-win",
+        action="store_true",
+        help="Size each second-pass window from the first-pass anchor confidence"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write compact beads referencing chunk_ids instead of copying chunks and texts"
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        metavar="EXPERIMENT_DIR",
+        help="Resume an interrupted run, skipping finished parts "
+             "(default: the latest run with the same input and config)"
+    )
+    parser.add_argument(
+        "--trace-malloc",
+        action="store_true",
+        help="Record per-stage Python allocations with tracemalloc (slower)"
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="TRACE_JSON",
+        help="Write a Chrome trace of the run, for Perfetto (default: trace.json in the experiment directory)"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Encode the next part while the current one is aligned"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Align up to this many parts concurrently in worker processes (default: 1)"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        help="Memory budget in GB for parallel parts (default: 80%% of available memory)"
+    )
+    parser.add_argument(
+        "--worker-overhead",
+        type=float,
+        default=2.0,
+        help="Memory in GB of one worker with the encoder loaded (default: 2.0)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    input_path = args.input_path  # Absolute path
+    if args.trace_malloc:
+        tracemalloc.start()
 
     # BERT aligner configuration
     bert_config = {
@@ -124,19 +725,47 @@ def main():
         "percent": 0.15,       # 15% of text length for window
         "win": 20,             # Strict monotonicity window
         "top_k": 10,           # Consider more candidates
-        "is_split": True       # Preserves chunk boundaries
+        "is_split": True,      # Preserves chunk boundaries
+        "hierarchical": args.hierarchical,  # Coarse-to-fine over the whole book
+        "adaptive_win": args.adaptive_win   # Per-anchor second-pass windows
     }
 
     # Generate experiment ID based on config and timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     config_id = f"ma{bert_config['max_align']}_p{int(bert_config['percent']*100)}_w{bert_config['win']}_k{bert_config['top_k']}"
+    if bert_config['hierarchical']:
+        config_id += "_h"
+    if bert_config['adaptive_win']:
+        config_id += "_a"
     experiment_id = f"exp_{config_id}_{timestamp}"
 
     # Create experiments folder in input directory
     input_dir = Path(input_path).parent
     experiments_dir = input_dir / "experiments"
     output_dir = experiments_dir / experiment_id
+
+    # A checkpoint is only reused for the same input file and config
+    run_key = {
+        "input_sha256": file_sha256(input_path),
+        "bert_config": bert_config,
+        "unit_field": args.unit_field,
+        "output_format": COMPACT if args.compact else FULL,
+    }
+    if args.resume:
+        if args.resume == "latest":
+            resume_dir = find_resumable_run(experiments_dir, run_key)
+            if resume_dir is None:
+                print("No run to resume with this input and config, starting a new one")
+        else:
+            resume_dir = Path(args.resume)
+        if resume_dir is not None:
+            output_dir = resume_dir
+            experiment_id = output_dir.name
+
     output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = RunCheckpoint(output_dir, run_key)
+    if args.trace is not None:
+        tracing.enable(args.trace or output_dir / "trace.json")
 
     # Define output paths
     output_path = output_dir / "alignment_results.jsonl"
@@ -147,161 +776,149 @@ def main():
 
     # Load data
     print(f"Loading data from {input_path}...")
-    data = load_jsonl(input_path)
-    print(f"Loaded {len(data)} total chunks")
-
-    # Group by part and language
-    by_part = defaultdict(lambda: {'en': [], 'it': []})
-    for item in data:
-        part = item.get('part', '001')
-        lang = item.get('language', 'en')
-        by_part[part][lang].append(item)
+    with tracing.span("load_input", cat="io"):
+        table = load_table(input_path)
+    print(f"Loaded {len(table)} total chunks")
+
+    # Group row numbers by part and language from the columns; the chunks
+    # of each group are decoded lazily, when its part is aligned
+    row_groups = defaultdict(lambda: {'en': [], 'it': []})
+    for row, (part, lang) in enumerate(zip(table.column('part', '001'), table.column('language', 'en'))):
+        row_groups[part][lang].append(row)
+    by_part = {part: {lang: table.rows(rows) for lang, rows in langs.items()}
+               for part, langs in row_groups.items()}
 
     parts = sorted(by_part.keys())
     print(f"\nFound {len(parts)} parts: {parts[:10]}{'...' if len(parts) > 10 else ''}")
 
+    # In hierarchical mode the whole book is aligned as a single job,
+    # with (part, unit) labels replacing the manual part boundaries.
+    if bert_config['hierarchical']:
+        by_part = {'all': {
+            lang: table.rows([row for part in parts for row in row_groups[part][lang]])
+            for lang in ('en', 'it')
+        }}
+        parts = ['all']
+
     # Print initial memory usage
     initial_memory = get_memory_usage()
     print(f"Initial memory usage: {initial_memory:.2f} GB")
 
-    all_alignments = []
-
-    # Process each part
-    for part_idx, part in enumerate(parts, 1):
+    all_parts = []
+    jobs = []
+    done_parts = set(checkpoint.completed_parts())
+    for part in parts:
         src_data = by_part[part]['en']
         tgt_data = by_part[part]['it']
-
         if not src_data or not tgt_data:
             print(f"\nSkipping part {part}: missing data (en={len(src_data)}, it={len(tgt_data)})")
             continue
-
-        print(f"\n{'='*60}")
-        print(f"Processing part {part}")
-        print(f"{'='*60}")
-        print(f"  EN chunks: {len(src_data)}")
-        print(f"  IT chunks: {len(tgt_data)}")
-
-        # Extract texts
-        src_texts = [item["text"] for item in src_data]
-        tgt_texts = [item["text"] for item in tgt_data]
-
-        src_str = "\n".join(src_texts)
-        tgt_str = "\n".join(tgt_texts)
-
-        print(f"  EN chars: {len(src_str)}")
-        print(f"  IT chars: {len(tgt_str)}")
-
-        # Run alignment
-        aligner = Bertalign(
-            src_str, tgt_str,
-            max_align=bert_config['max_align'],
-            min_win_size=bert_config['min_win_size'],
-            percent=bert_config['percent'],
-            win=bert_config['win'],
-            top_k=bert_config['top_k'],
-            is_split=bert_config['is_split']
-        )
-
-        aligner.align_sents()
-
-        print(f"  Alignments found: {len(aligner.result)}")
-
-        # Extract alignments with metadata
-        part_alignments = extract_alignments_with_metadata(aligner, src_data, tgt_data, part)
-        all_alignments.extend(part_alignments)
-
-        # Print alignment statistics for this part
-        alignment_types = {}
-        for alignment in part_alignments:
-            atype = alignment['alignment_type']
-            alignment_types[atype] = alignment_types.get(atype, 0) + 1
-
-        print(f"  Alignment types: {dict(sorted(alignment_types.items()))}")
-
-        # Memory before cleanup
-        mem_before_cleanup = get_memory_usage()
-
-        # Explicitly delete large arrays before deleting aligner
-        if hasattr(aligner, 'src_vecs'):
-            del aligner.src_vecs
-        if hasattr(aligner, 'tgt_vecs'):
-            del aligner.tgt_vecs
-        if hasattr(aligner, 'src_lens'):
-            del aligner.src_lens
-        if hasattr(aligner, 'tgt_lens'):
-            del aligner.tgt_lens
-
-        # Clean up aligner to free memory
-        del aligner
-
-        # Perform aggressive memory cleanup
-        aggressive_cleanup()
-
-        # Memory after cleanup
-        mem_after_cleanup = get_memory_usage()
-        print(f"  Memory: {mem_before_cleanup:.2f} GB -> {mem_after_cleanup:.2f} GB (freed {mem_before_cleanup - mem_after_cleanup:.2f} GB)")
-        print(f"  Progress: {part_idx}/{len(parts)} parts processed")
+        all_parts.append(part)
+        if part in done_parts:
+            print(f"Part {part} already aligned, skipping")
+            continue
+        jobs.append((part, src_data, tgt_data, bert_config, args.unit_field, args.compact))
+
+    if args.workers > 1 and len(jobs) > 1:
+        memory_budget = args.memory_budget
+        if memory_budget is None:
+            memory_budget = 0.8 * psutil.virtual_memory().available / (1024 ** 3)
+        print(f"Aligning {len(jobs)} parts with up to {args.workers} workers "
+              f"(memory budget {memory_budget:.2f} GB)")
+        results = run_parts_parallel(jobs, args.workers, memory_budget, args.worker_overhead)
+        for part_idx, result in enumerate(results, 1):
+            checkpoint.save_part(result)
+            print(f"  Progress: {part_idx}/{len(jobs)} parts processed")
+    elif args.pipeline:
+        def collect(result):
+            checkpoint.save_part(result)
+            print(f"  Progress: {len(checkpoint.completed_parts()) - len(done_parts)}/{len(jobs)} parts processed")
+
+        timings = run_parts_pipelined(jobs, collect)
+        print(f"\nPipeline: encode {timings['encode']:.1f}s, align {timings['align']:.1f}s, "
+              f"write {timings['write']:.1f}s, wall {timings['wall']:.1f}s")
+    else:
+        # Process each part
+        for part_idx, job in enumerate(jobs, 1):
+            result = align_part(*job)
+            checkpoint.save_part(result)
+
+            # Memory before cleanup
+            mem_before_cleanup = get_memory_usage()
+
+            # Drop the part's results (the aligner and its arrays are gone
+            # with align_part's frame)
+            del result
+
+            # Perform aggressive memory cleanup
+            aggressive_cleanup()
+
+            # Memory after cleanup
+            mem_after_cleanup = get_memory_usage()
+            print(f"  Memory: {mem_before_cleanup:.2f} GB -> {mem_after_cleanup:.2f} GB (freed {mem_before_cleanup - mem_after_cleanup:.2f} GB, "
+                  f"workspace {get_workspace().nbytes / (1024 ** 2):.1f} MB)")
+            print(f"  Progress: {part_idx}/{len(jobs)} parts processed")
+
+    # Reassemble the run from the per-part files, in part order. Parts are
+    # copied as is and counted from the manifest, so memory does not grow
+    # with the length of the book.
+    stats = AlignmentStats()
+    band_stats = {}
+    stage_stats = {}
+    with tracing.span("assemble", cat="io"), open(output_path, 'w', encoding='utf-8') as out:
+        for part in all_parts:
+            with open(checkpoint.part_path(part), 'r', encoding='utf-8') as f:
+                shutil.copyfileobj(f, out)
+            stats.merge(checkpoint.part_stats(part))
+            band_stats[part] = checkpoint.band_stats(part)
+            stage_stats[part] = checkpoint.stage_stats(part)
+    overall_types = stats.overall_types()
 
     # Print overall statistics
     print(f"\n{'='*60}")
     print(f"OVERALL STATISTICS")
     print(f"{'='*60}")
-    print(f"Total alignments: {len(all_alignments)}")
-
-    overall_types = {}
-    by_part_count = defaultdict(int)
-    for alignment in all_alignments:
-        atype = alignment['alignment_type']
-        overall_types[atype] = overall_types.get(atype, 0) + 1
-        by_part_count[alignment['part']] += 1
+    print(f"Total alignments: {stats.total}")
 
     print(f"\nAlignment type distribution:")
-    for atype, count in sorted(overall_types.items()):
+    for atype, count in overall_types.items():
         print(f"  {atype}: {count}")
 
     print(f"\nAlignments by part:")
-    for part, count in sorted(by_part_count.items()):
-        print(f"  Part {part}: {count}")
-
-    # Save results
-    print()
-    save_alignments(all_alignments, str(output_path))
-
-    # Build metadata
-    alignment_stats = {}
-    for part, count in sorted(by_part_count.items()):
-        alignment_stats[part] = {
-            'total_alignments': count,
-            'alignment_types': {}
-        }
+    for part, part_stats in stats.part_statistics().items():
+        print(f"  Part {part}: {part_stats['total_alignments']}")
 
-    for alignment in all_alignments:
-        part = alignment['part']
-        atype = alignment['alignment_type']
-        if 'alignment_types' not in alignment_stats[part]:
-            alignment_stats[part]['alignment_types'] = {}
-        alignment_stats[part]['alignment_types'][atype] = alignment_stats[part]['alignment_types'].get(atype, 0) + 1
+    print(f"\nSaved {stats.total} total alignments to {output_path}")
 
     metadata = {
         "experiment_id": experiment_id,
         "timestamp": timestamp,
         "input_file": input_path,
         "output_file": str(output_path),
-        "total_alignments": len(all_alignments),
+        "total_alignments": stats.total,
         "bert_aligner_config": bert_config,
-        "alignment_statistics": alignment_stats,
-        "overall_alignment_types": dict(sorted(overall_types.items()))
+        "output_format": run_key["output_format"],
+        "alignment_statistics": stats.part_statistics(),
+        "band_statistics": band_stats,
+        "stage_statistics": stage_stats,
+        "tracemalloc": tracemalloc.is_tracing(),
+        "resumed_parts": sorted(done_parts & set(all_parts)),
+        "overall_alignment_types": overall_types
     }
 
     with open(metadata_path, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
 
     print(f"Saved metadata to {metadata_path}")
+    trace_path = tracing.save()
+    if trace_path is not None:
+        print(f"Saved trace to {trace_path}")
     print(f"Experiment directory: {output_dir}")
 
     # Print examples
     print(f"\nFirst 3 alignments:")
-    for i, alignment in enumerate(all_alignments[:3]):
+    examples = iter_alignments(output_path, chunks_path=input_path)
+    for i, alignment in enumerate(itertools.islice(examples, 3)):
         print(f"\n--- Alignment {i+1} (Part {alignment['part']}, {alignment['alignment_type']}) ---")
         print(f"EN [{alignment['src_indices']}]: {alignment['src_text'][:80]}...")
         print(f"IT [{alignment['tgt_indices']}]: {alignment['tgt_text'][:80]}...")
@@ -8,6 +8,7 @@ import sys
 from pathlib import Path
 import logging
 
+from bertalign import tracing
 from retrieval.config import IndexConfig
 from retrieval.indexer import AlignmentIndexer
 
@@ -56,6 +57,13 @@ Examples:
         help="Output directory for index files (default: data/indices)"
     )
 
+    parser.add_argument(
+        "--chunks-file",
+        type=Path,
+        help="Input chunks JSONL, to join compact alignments "
+             "(default: the input_file in the experiment's metadata.json)"
+    )
+
     parser.add_argument(
         "--text-field",
         default="src_text",
@@ -115,6 +123,13 @@ Examples:
         help="Don't show progress bars"
     )
 
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        metavar="TRACE_JSON",
+        help="Write a Chrome trace of the build (load, embed, FAISS, save) to this file"
+    )
+
     args = parser.parse_args()
 
     # Validate input file
@@ -146,6 +161,9 @@ Examples:
     logger.info(f"Normalize embeddings: {config.normalize_embeddings}")
     logger.info("=" * 80)
 
+    if args.trace:
+        tracing.enable(args.trace)
+
     try:
         # Create indexer
         indexer = AlignmentIndexer(config=config)
@@ -154,7 +172,8 @@ Examples:
         stats = indexer.build_index(
             jsonl_path=args.input_file,
             text_field=args.text_field,
-            show_progress=not args.no_progress
+            show_progress=not args.no_progress,
+            chunks_path=args.chunks_file
         )
 
         # Save index
@@ -175,6 +194,10 @@ Examples:
         logger.info(f"Index saved to: {args.output_dir}")
         logger.info("=" * 80)
 
+        trace_path = tracing.save()
+        if trace_path:
+            logger.info(f"Trace saved to: {trace_path}")
+
     except Exception as e:
         logger.error(f"Error building index: {e}", exc_info=True)
         sys.exit(1)
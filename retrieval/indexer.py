@@ -18,7 +18,9 @@ try:
 except ImportError:
     raise ImportError("sentence-transformers is required. Install with: pip install sentence-transformers")
 
-
+from bertalign import tracing
+from bertalign.beads import iter_alignments
+from bertalign.jsonl import load_jsonl
 from retrieval.config import IndexConfig
 
 logging.basicConfig(level=logging.INFO)
@@ -56,27 +58,26 @@ class AlignmentIndexer:
 
         logger.info(f"Model loaded. Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
 
-    def load_alignments(self, jsonl_path: Path) -> List[Dict[str, Any]]:
+    def load_alignments(self, jsonl_path: Path, chunks_path: Optional[Path] = None) -> List[Dict[str, Any]]:
         """
-        Load alignments from JSONL file.
+        Load alignments from JSONL file, full or compact.
 
         Args:
             jsonl_path: Path to alignment JSONL file
+            chunks_path: Input chunks file, to join compact alignments
+                (default: the input_file of the experiment's metadata.json)
 
         Returns:
-            List of alignment records
+            List of alignment records. Compact ones are LazyRecord views,
+            whose texts and chunks are joined when first read.
         """
         logger.info(f"Loading alignments from: {jsonl_path}")
 
-        alignments = []
-        with open(jsonl_path, 'r', encoding='utf-8') as f:
-            for i, line in enumerate(f):
-                try:
-                    record = json.loads(line.strip())
-                    alignments.append(record)
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Skipping invalid JSON at line {i+1}: {e}")
-                    continue
+        def warn(line_num, e):
+            logger.warning(f"Skipping invalid JSON at line {line_num}: {e}")
+
+        with tracing.span("load_alignments", cat="io"):
+            alignments = list(iter_alignments(jsonl_path, chunks_path=chunks_path, on_error=warn))
 
         logger.info(f"Loaded {len(alignments)} alignments")
         return alignments
@@ -97,13 +98,15 @@ class AlignmentIndexer:
 
         logger.info(f"Embedding {len(texts)} texts...")
 
-        embeddings = self.model.encode(
-            texts,
-            batch_size=self.config.batch_size,
-            show_progress_bar=show_progress,
-            normalize_embeddings=self.config.normalize_embeddings,
-            convert_to_numpy=True
-        )
+        with tracing.span("embed", cat="encoder", num_texts=len(texts), batch_size=self.config.batch_size):
+            embeddings = encode_batches(
+                self.model,
+                texts,
+                batch_size=self.config.batch_size,
+                show_progress_bar=show_progress,
+                normalize_embeddings=self.config.normalize_embeddings,
+                convert_to_numpy=True
+            )
 
         logger.info(f"Generated embeddings with shape: {embeddings.shape}")
         return embeddings
@@ -124,6 +127,18 @@ class AlignmentIndexer:
         logger.info(f"Building FAISS index (type: {self.config.index_type})")
         logger.info(f"Dimension: {dimension}, Vectors: {num_vectors}")
 
+        with tracing.span("build_faiss_index", cat="faiss", index_type=self.config.index_type,
+                          num_vectors=num_vectors):
+            index = self._create_faiss_index(embeddings)
+
+        logger.info(f"Index built. Total vectors: {index.ntotal}")
+
+        return index
+
+    def _create_faiss_index(self, embeddings: np.ndarray) -> faiss.Index:
+        """Create, train (IVF) and fill the index configured in self.config."""
+        dimension = embeddings.shape[1]
+
         # Build index based on configuration
         if self.config.index_type == "IndexFlatIP":
             # Inner product (use with normalized embeddings)
@@ -155,15 +170,14 @@ class AlignmentIndexer:
         logger.info("Adding vectors to index...")
         index.add(embeddings.astype(np.float32))
 
-        logger.info(f"Index built. Total vectors: {index.ntotal}")
-
         return index
 
     def build_index(
         self,
         jsonl_path: Path,
         text_field: str = "src_text",
-        show_progress: bool = True
+        show_progress: bool = True,
+        chunks_path: Optional[Path] = None
     ) -> Dict[str, Any]:
         """
         Build complete index from alignment JSONL file.
@@ -172,12 +186,13 @@ class AlignmentIndexer:
             jsonl_path: Path to alignment JSONL file
             text_field: Field name containing text to embed (default: "src_text")
             show_progress: Show progress bars
+            chunks_path: Input chunks file for compact alignments (see load_alignments)
 
         Returns:
             Dictionary with build statistics
         """
         # Load alignments
-        alignments = self.load_alignments(jsonl_path)
+        alignments = self.load_alignments(jsonl_path, chunks_path)
 
         if not alignments:
             raise ValueError("No alignments loaded")
@@ -243,6 +258,14 @@ class AlignmentIndexer:
         output_dir = output_dir or self.config.output_dir
         output_dir.mkdir(parents=True, exist_ok=True)
 
+        with tracing.span("save_index", cat="io"):
+            self._write_index(output_dir)
+
+        logger.info(f"Index saved successfully to: {output_dir}")
+
+    def _write_index(self, output_dir: Path):
+        """Write the index, its metadata and its configuration into output_dir."""
+
         # Save FAISS index
         index_path = output_dir / self.config.index_filename
         logger.info(f"Saving FAISS index to: {index_path}")
@@ -273,8 +296,6 @@ class AlignmentIndexer:
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config_dict, f, indent=2, ensure_ascii=False)
 
-        logger.info(f"Index saved successfully to: {output_dir}")
-
     def load_saved_index(self, index_dir: Path):
         """
         Load a previously saved index.
@@ -306,10 +327,7 @@ class AlignmentIndexer:
             raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
 
         logger.info(f"Loading metadata...")
-        self.metadata = []
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                self.metadata.append(json.loads(line.strip()))
+        self.metadata = load_jsonl(metadata_path)
 
         # Load model (if needed for querying)
         if saved_config.get("model_name"):
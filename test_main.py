@@ -0,0 +1,196 @@
+"""
+Checks of the run checkpointing and parallel scheduling of main.py, with the
+alignment of a part replaced by a stand-in that needs no encoder.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import main
+from bertalign.beads import compact_bead
+
+PARTS = ['001', '002', '003', '004']
+
+
+def _write_input(path, suffix=""):
+    with open(path, 'w', encoding='utf-8') as f:
+        chunk_id = 0
+        for part in PARTS:
+            for lang in ('en', 'it'):
+                for i in range(3):
+                    f.write(json.dumps({"chunk_id": chunk_id, "part": part, "language": lang,
+                                        "page": str(i), "text": f"{lang} {part} {i}{suffix}"}) + '\n')
+                    chunk_id += 1
+
+
+def _fake_align_part(calls, fail_after=None):
+    """align_part pairing the chunks of a part one to one, recording the parts it is called for."""
+    def align_part(part, src_data, tgt_data, bert_config, unit_field='page', compact=False):
+        if fail_after is not None and len(calls) >= fail_after:
+            raise KeyboardInterrupt
+        calls.append(part)
+        alignments = []
+        for i in range(min(len(src_data), len(tgt_data))):
+            if compact:
+                alignments.append(compact_bead(part, [i], [i], src_data, tgt_data))
+            else:
+                alignments.append({'part': part, 'src_indices': [i], 'tgt_indices': [i],
+                                   'src_text': src_data[i]['text'], 'tgt_text': tgt_data[i]['text'],
+                                   'src_chunks': [src_data[i]], 'tgt_chunks': [tgt_data[i]],
+                                   'alignment_type': '1-1'})
+        return {'part': part, 'alignments': alignments, 'band_stats': {'band_area': len(alignments)},
+                'stage_stats': {}}
+    return align_part
+
+
+class _Clock:
+    """datetime stand-in whose now() moves on a second per call, so experiment ids never collide."""
+    def __init__(self):
+        self.time = datetime(2025, 1, 1)
+
+    def now(self):
+        self.time += timedelta(seconds=1)
+        return self.time
+
+
+def _run(input_path, *args, calls, fail_after=None, clock):
+    with mock.patch.object(sys, 'argv', ['main.py', str(input_path), *args]), \
+            mock.patch.object(main, 'align_part', _fake_align_part(calls, fail_after)), \
+            mock.patch.object(main, 'datetime', clock):
+        main.main()
+
+
+def _experiments(input_path):
+    return sorted((Path(input_path).parent / "experiments").iterdir())
+
+
+def test_resume_reruns_only_missing_parts():
+    clock = _Clock()
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_input, input_path = Path(tmp) / "ref" / "book.jsonl", Path(tmp) / "run" / "book.jsonl"
+        for path in (reference_input, input_path):
+            path.parent.mkdir()
+            _write_input(path)
+        calls = []
+        _run(reference_input, calls=calls, clock=clock)
+        assert calls == PARTS
+        reference = (_experiments(reference_input)[0] / "alignment_results.jsonl").read_bytes()
+
+        # Interrupted after two parts: both are checkpointed, nothing is assembled
+        calls = []
+        try:
+            _run(input_path, calls=calls, fail_after=2, clock=clock)
+        except KeyboardInterrupt:
+            pass
+        else:
+            raise AssertionError("the run was not interrupted")
+        [run_dir] = _experiments(input_path)
+        assert calls == PARTS[:2] and not (run_dir / "alignment_results.jsonl").exists()
+        with open(run_dir / "manifest.json", encoding='utf-8') as f:
+            assert list(json.load(f)["parts"]) == PARTS[:2]
+
+        calls = []
+        _run(input_path, "--resume", calls=calls, clock=clock)
+        assert calls == PARTS[2:] and _experiments(input_path) == [run_dir]
+        assert (run_dir / "alignment_results.jsonl").read_bytes() == reference
+        with open(run_dir / "metadata.json", encoding='utf-8') as f:
+            assert json.load(f)["resumed_parts"] == PARTS[:2]
+
+        # Nothing left to align
+        calls = []
+        _run(input_path, "--resume", calls=calls, clock=clock)
+        assert calls == [] and (run_dir / "alignment_results.jsonl").read_bytes() == reference
+
+
+def test_changed_config_or_input_is_not_resumed():
+    clock = _Clock()
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = Path(tmp) / "book.jsonl"
+        _write_input(input_path)
+        try:
+            _run(input_path, calls=[], fail_after=2, clock=clock)
+        except KeyboardInterrupt:
+            pass
+        [run_dir] = _experiments(input_path)
+
+        # Another config starts over in a new directory
+        for args in (["--adaptive-win"], ["--compact"], ["--unit-field", "section"]):
+            calls = []
+            _run(input_path, "--resume", *args, calls=calls, clock=clock)
+            assert calls == PARTS, args
+        assert len(_experiments(input_path)) == 4
+
+        # So does another input file at the same path
+        _write_input(input_path, suffix=" (revised)")
+        calls = []
+        _run(input_path, "--resume", calls=calls, clock=clock)
+        assert calls == PARTS
+        assert len(_experiments(input_path)) == 5
+
+        # Resuming a given directory of another run is refused
+        try:
+            _run(input_path, "--resume", str(run_dir), calls=[], clock=clock)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a checkpoint of another input file was resumed")
+
+
+BERT_CONFIG = {"max_align": 4, "min_win_size": 1, "percent": 0.15, "win": 20, "top_k": 10,
+               "is_split": True, "hierarchical": False, "adaptive_win": False}
+
+
+class _ThreadPool(ThreadPoolExecutor):
+    """ProcessPoolExecutor stand-in running the jobs in threads of this process."""
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        super().__init__(max_workers=max_workers, initializer=initializer)
+
+
+def test_parallel_parts_stay_in_order_and_budget():
+    sizes = [3000, 500, 2000, 1000, 2500, 200, 1500]
+    durations = [0.3, 0.05, 0.2, 0.01, 0.1, 0.02, 0.05]
+    jobs = [(f"{i:03d}", [{}] * size, [{}] * size, BERT_CONFIG, 'page', False) for i, size in enumerate(sizes)]
+    estimates = [main.estimate_part_memory(size, size, BERT_CONFIG) for size in sizes]
+    overhead = 0.01
+    # Room for the two largest parts next to each other, not for three of them
+    budget = sum(sorted(estimates)[-2:]) + 2 * overhead + 0.05
+    lock = threading.Lock()
+    running, peaks, finished = set(), [], []
+
+    def align_part_job(job):
+        index = int(job[0])
+        with lock:
+            running.add(index)
+            peaks.append((sum(estimates[i] for i in running) + overhead * len(running), len(running)))
+        time.sleep(durations[index])
+        with lock:
+            running.discard(index)
+            finished.append(index)
+        return {'part': job[0]}
+
+    with mock.patch.object(main, '_align_part_job', align_part_job), \
+            mock.patch.object(main, 'ProcessPoolExecutor', _ThreadPool), \
+            mock.patch.object(main, 'get_memory_usage', lambda: 0.0), \
+            mock.patch.object(main, 'get_total_memory_usage', lambda: 0.0):
+        results = list(main.run_parts_parallel(jobs, 4, budget, overhead))
+
+    assert [result['part'] for result in results] == [job[0] for job in jobs]
+    # Parts did finish out of order, and did run side by side
+    assert finished != sorted(finished)
+    assert max(count for _, count in peaks) > 1
+    assert all(memory <= budget for memory, _ in peaks), (peaks, budget)
+
+
+if __name__ == "__main__":
+    test_resume_reruns_only_missing_parts()
+    test_changed_config_or_input_is_not_resumed()
+    test_parallel_parts_stay_in_order_and_budget()
+    print("OK")
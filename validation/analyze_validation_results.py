@@ -11,21 +11,23 @@ from pathlib import Path
 from typing import Dict, List, Any
 from collections import defaultdict, Counter
 
+# Make the bertalign package importable when run from this directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bertalign.jsonl import load_jsonl
+from bertalign.store import open_store
+
 
 def load_validated_jsonl(file_path: Path) -> List[Dict[str, Any]]:
-    """Load records from validated JSONL file."""
-    records = []
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for i, line in enumerate(f, 1):
-            try:
-                record = json.loads(line.strip())
-                records.append(record)
-            except json.JSONDecodeError as e:
-                print(f"Warning: Skipping invalid JSON at line {i}: {e}", file=sys.stderr)
-                continue
-
-    return records
+    """Load records from validated JSONL file (or an alignment store built from one)."""
+    store = open_store(file_path)
+    if store is not None:
+        return list(store)
+
+    def warn(line_num, e):
+        print(f"Warning: Skipping invalid JSON at line {line_num}: {e}", file=sys.stderr)
+
+    return load_jsonl(file_path, on_error=warn)
 
 
 def analyze_validation_results(records: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -10,9 +10,17 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from openai import OpenAI
 
+# Make the bertalign package importable when run from this directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bertalign import tracing
+from bertalign.beads import BeadJoiner, find_chunks_file, is_compact
+from bertalign.jsonl import iter_jsonl
+from bertalign.store import open_store
+
 
 def load_env_variables() -> Dict[str, str]:
     """Load environment variables from .env file."""
@@ -81,14 +89,15 @@ def validate_alignment(
     prompt = create_validation_prompt(src_text, tgt_text, src_lang, tgt_lang)
 
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+        with tracing.span("llm_request", cat="llm", model=model_name):
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
 
         response_text = response.choices[0].message.content.strip()
 
@@ -132,9 +141,15 @@ def process_jsonl_file(
     src_lang: str = "en",
     tgt_lang: str = "it",
     max_records: int = None,
-    verbose: bool = False
+    verbose: bool = False,
+    chunks_path: Optional[Path] = None
 ) -> Dict[str, Any]:
-    """Process JSONL file and validate each alignment."""
+    """
+    Process JSONL file (or alignment store) and validate each alignment.
+
+    Compact records get their texts from the chunks file (default: the
+    input_file of the experiment's metadata.json) and stay compact in the output.
+    """
     stats = {
         "total_processed": 0,
         "valid_alignments": 0,
@@ -144,20 +159,32 @@ def process_jsonl_file(
     }
 
     confidences = []
+    joiner = None
+
+    def warn(line_num, e):
+        print(f"Warning: Skipping invalid JSON at line {line_num}", file=sys.stderr)
 
-    with open(input_path, 'r') as infile, open(output_path, 'w') as outfile:
-        for i, line in enumerate(infile):
+    store = open_store(input_path)
+    records = iter(store) if store is not None else iter_jsonl(input_path, on_error=warn)
+
+    with open(output_path, 'w') as outfile:
+        for i, record in enumerate(records):
             if max_records and i >= max_records:
                 break
 
-            try:
-                record = json.loads(line.strip())
-            except json.JSONDecodeError:
-                print(f"Warning: Skipping invalid JSON at line {i+1}", file=sys.stderr)
-                continue
-
-            src_text = record.get("src_text", "")
-            tgt_text = record.get("tgt_text", "")
+            if is_compact(record):
+                if joiner is None:
+                    chunks_path = chunks_path or find_chunks_file(input_path)
+                    if chunks_path is None:
+                        print("Error: compact alignments need --chunks-file", file=sys.stderr)
+                        sys.exit(1)
+                    with tracing.span("load_chunks", cat="io"):
+                        joiner = BeadJoiner(chunks_path)
+                src_text = joiner.text(record["src_ids"])
+                tgt_text = joiner.text(record["tgt_ids"])
+            else:
+                src_text = record.get("src_text", "")
+                tgt_text = record.get("tgt_text", "")
 
             if not src_text or not tgt_text:
                 print(f"Warning: Missing text at line {i+1}", file=sys.stderr)
@@ -166,14 +193,15 @@ def process_jsonl_file(
             if verbose:
                 print(f"Processing record {i+1}...", file=sys.stderr)
 
-            validation_result = validate_alignment(
-                client=client,
-                src_text=src_text,
-                tgt_text=tgt_text,
-                model_name=model_name,
-                src_lang=src_lang,
-                tgt_lang=tgt_lang
-            )
+            with tracing.tags(record=i, part=record.get("part")):
+                validation_result = validate_alignment(
+                    client=client,
+                    src_text=src_text,
+                    tgt_text=tgt_text,
+                    model_name=model_name,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang
+                )
 
             # Add validation results to the record
             record["validation"] = validation_result
@@ -211,13 +239,19 @@ def main():
     parser.add_argument(
         "input_file",
         type=Path,
-        help="Input JSONL file containing alignments"
+        help="Input JSONL file or alignment store containing alignments"
     )
     parser.add_argument(
         "-o", "--output",
         type=Path,
         help="Output JSONL file with validation results (default: input_file with .validated.jsonl suffix)"
     )
+    parser.add_argument(
+        "--chunks-file",
+        type=Path,
+        help="Input chunks JSONL, for compact alignments "
+             "(default: the input_file in the experiment's metadata.json)"
+    )
     parser.add_argument(
         "--host",
         default="localhost",
@@ -249,6 +283,12 @@ def main():
         action="store_true",
         help="Enable verbose output"
     )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        metavar="TRACE_JSON",
+        help="Write a Chrome trace of the run (one span per LLM request) to this file"
+    )
 
     args = parser.parse_args()
 
@@ -274,6 +314,9 @@ def main():
         print(f"Languages: {args.src_lang} -> {args.tgt_lang}", file=sys.stderr)
         print("-" * 80, file=sys.stderr)
 
+    if args.trace:
+        tracing.enable(args.trace)
+
     # Create vLLM client
     client = create_vllm_client(host=args.host, port=args.port)
 
@@ -286,7 +329,8 @@ def main():
         src_lang=args.src_lang,
         tgt_lang=args.tgt_lang,
         max_records=args.max_records,
-        verbose=args.verbose
+        verbose=args.verbose,
+        chunks_path=args.chunks_file
     )
 
     # Print summary
@@ -301,6 +345,10 @@ def main():
     print(f"\nOutput written to: {output_path}", file=sys.stderr)
     print("=" * 80, file=sys.stderr)
 
+    trace_path = tracing.save()
+    if trace_path:
+        print(f"Trace written to: {trace_path}", file=sys.stderr)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file